@@ -1,21 +1,23 @@
 import streamlit as st
 import pandas as pd
 import os
-import re
+import hashlib
 import json
-import time
 from utils.file_handler import load_file, export_excel
-from utils.prompt_builder import build_prompt
-from utils.text_gen import generate_text
-from utils.validator import (
-    validate_brand, 
-    check_duplication, 
-    calculate_seo_score, 
-    fix_acronyms, 
-    remove_filler_words,
-    remove_punctuation
+from utils.job_runner import get_job_manager, QUEUED, DONE, CANCELLED, STOP_DEADLINE
+from utils.pipeline import FINGERPRINT_SETTINGS, OVERGENERATION_FACTOR, row_keys_for
+from utils.prompt_builder import compile_product_sections
+from utils.results_store import ResultsStore, SCORE_BANDS, RESULT_COLUMNS, ROW_ID_COLUMN
+from utils.settings import (
+    CONCURRENCY_RANGE, CROSS_ROW_DEDUP_OPTIONS, MODE_OPTIONS, MODEL_OPTIONS, NUM_TITLES_RANGE, POSITION_OPTIONS,
+    SettingsStore
 )
-from utils.title_history import TitleHistoryManager
+from utils.terms import ACRONYM, BRAND, SPAM, STOPWORD, get_terms, load_terms, set_thread_terms
+from utils.text_gen import get_limiter
+from utils.title_history import DEFAULT_HISTORY_DB, TitleHistoryManager, get_shared_history
+
+# Must be the first Streamlit command of the script run
+st.set_page_config(page_title="Title Genie 标题精灵", page_icon="🧞", layout="wide")
 
 # Load environment variables (Local dev)
 try:
@@ -29,33 +31,439 @@ class MockLocalStorage:
     def getItem(self, key): return None
     def setItem(self, key, value): pass
 
-try:
-    from streamlit_local_storage import LocalStorage
-    localStorage = LocalStorage()
-except ImportError:
-    localStorage = MockLocalStorage()
-
-# --- Helper Functions for Config Persistence (Browser LocalStorage) ---
-LOCAL_STORAGE_KEY = "title_genie_config"
+localStorage = MockLocalStorage()
 
-def load_config_from_browser():
-    """Load config from browser localStorage"""
+def mount_local_storage():
+    """
+    Mount the browser localStorage component. The component blocks until the browser
+    answers, so main() calls this only after the page header has been sent.
+    """
+    global localStorage
     try:
-        data = localStorage.getItem(LOCAL_STORAGE_KEY)
-        if data:
-            return json.loads(data) if isinstance(data, str) else data
+        from streamlit_local_storage import LocalStorage
+        localStorage = LocalStorage()
+    except ImportError:
+        localStorage = MockLocalStorage()
+
+def browser_storage():
+    """The mounted localStorage component, or None when it is unavailable."""
+    return None if isinstance(localStorage, MockLocalStorage) else localStorage
+
+# --- Settings (loaded once per session, saved write-behind; see utils.settings) ---
+def get_settings_store():
+    if 'settings_store' not in st.session_state:
+        st.session_state['settings_store'] = SettingsStore()
+    return st.session_state['settings_store']
+
+def server_api_key():
+    """API key configured on the server (secrets or environment); never saved to the browser."""
+    try:
+        key = st.secrets.get("DASHSCOPE_API_KEY", "")
     except Exception:
-        pass
-    return {}
+        key = ""
+    return key or os.getenv("DASHSCOPE_API_KEY", "")
+
+# --- Background Job Polling ---
+def sync_job_results(job):
+    """
+    Copy results completed since the last poll from the job into this session.
+    The session keeps every result (the results table and the fingerprint cache),
+    so its memory grows with the rows received; only the job's memory is bounded.
+    """
+    new_rows, st.session_state['job_row_cursor'] = job.rows_since(st.session_state.get('job_row_cursor', 0))
+    new_results = [result for _, results in new_rows for result in results]
+    st.session_state['results_store'].append(new_results)
+
+    # Cache each finished row's results under its content fingerprint
+    result_cache = st.session_state['result_cache']
+    for index, results in new_rows:
+        if index in job.row_keys:
+            result_cache[job.row_keys[index]] = results
+
+    # Browser history can only be written from a script run (see JobManager._run_row)
+    if new_results and job.history_manager.local_storage:
+        job.history_manager.save_history()
+
+def show_job_summary(job):
+    """Final status message for a finished job."""
+    progress = job.progress()
+    if job.status == DONE and progress['stop_reason']:
+        limit = "时间预算" if progress['stop_reason'] == STOP_DEADLINE else "Token 预算"
+        st.warning(f"已达到{limit}，任务提前结束: 已按优先级完成 {progress['done']}/{progress['total']} 行"
+                   f" (用时 {int(progress['elapsed'])} 秒，{progress['tokens']} tokens)，剩余行可点击继续生成。")
+    elif job.status == DONE:
+        st.success(f"生成完成！共处理 {progress['done']} 行，用时 {int(progress['elapsed'])} 秒。")
+    elif job.status == CANCELLED:
+        st.warning(f"任务已停止 (已完成 {progress['done']}/{progress['total']} 行)，可点击继续生成。")
+    else:
+        st.error(f"任务失败: {progress['error']}")
+    if job.row_errors:
+        st.warning(f"{len(job.row_errors)} 行生成失败，点击继续生成可重试: " + "; ".join(f"第 {i + 1} 行: {e}" for i, e in job.row_errors[:5]))
+    if job.writer and os.path.exists(job.writer.xlsx_path):
+        st.caption(f"本次任务的结果已同步保存在服务器: {job.writer.xlsx_path}")
+    if job.profile:
+        # Kept in the session so the report survives reruns (e.g. its download button)
+        st.session_state['job_profile'] = {**job.profile, 'job_id': job.id}
+
+def show_job_profile(profile):
+    """CPU hotspots and allocation sites recorded for the last profiled job (see utils.profiling)."""
+    with st.expander(f"🔬 性能剖析 (内存峰值 {profile['peak_kb'] / 1024:.1f} MB)", expanded=False):
+        st.markdown("**CPU 热点** (按函数自身耗时，含所有工作线程)")
+        st.dataframe(pd.DataFrame(profile['hotspots']).rename(columns={
+            'function': '函数', 'calls': '调用次数', 'own_seconds': '自身耗时 (秒)', 'total_seconds': '累计耗时 (秒)'
+        }), hide_index=True, use_container_width=True)
+        st.markdown("**内存分配位置** (按任务期间的增长)")
+        st.dataframe(pd.DataFrame(profile['allocations']).rename(columns={
+            'location': '代码位置', 'size_kb': '当前占用 (KB)', 'growth_kb': '增长 (KB)', 'blocks': '内存块数'
+        }), hide_index=True, use_container_width=True)
+        if profile['profile_path'] and os.path.exists(profile['profile_path']):
+            with open(profile['profile_path'], 'rb') as f:
+                st.download_button("📥 下载原始剖析文件 (.prof，可用 snakeviz / pstats 打开)", f.read(),
+                                   file_name=f"title_genie_{profile['job_id']}.prof", key="profile_download")
+
+def results_from_cache(row_keys, dedup_action):
+    """
+    Results store for the current sheet from cached results (row ids follow the current row order).
+    The cache keeps every title, so the cross-row near-duplicate pass is applied again.
+    """
+    result_cache = st.session_state['result_cache']
+    store = ResultsStore()
+    store.append(
+        {**result, ROW_ID_COLUMN: index + 1}
+        for index, key in row_keys.items()
+        for result in result_cache.get(key, [])
+    )
+    if dedup_action != "off" and len(store) > 1:
+        store.mark_near_duplicates()
+    return store
+
+# --- Row Scheduling ---
+PRIORITY_FILE_ORDER = "文件顺序"
+PRIORITY_REPORT = "效果报表曝光量 (按主词匹配)"
+
+def prioritize_rows(pending_rows, df, source, perf_file):
+    """Orders pending rows by the chosen priority signal, highest first (ties keep file order)."""
+    if source == PRIORITY_FILE_ORDER:
+        return pending_rows
+    if source == PRIORITY_REPORT:
+        from utils.analyzer import load_performance_report, keyword_traffic
+        perf_file.seek(0)
+        try:
+            report = load_performance_report(perf_file)
+        except ValueError as e:
+            st.warning(f"效果报表无法用于排序，按文件顺序处理: {e}")
+            return pending_rows
+        priority = pd.Series(keyword_traffic(df['Main Keyword'].tolist(), report), index=df.index)
+    else:
+        priority = pd.to_numeric(df[source], errors='coerce').fillna(float('-inf'))
+    return sorted(pending_rows, key=lambda item: -priority[item[0]])
+
+# --- Prompt Compilation (cached across reruns) ---
+def cached_product_sections(file_id, df, starred_fields):
+    """compile_product_sections of the uploaded sheet, compiled again only when the file or starred fields change."""
+    key = (file_id, tuple(starred_fields))
+    cached = st.session_state.get('product_sections')
+    if cached is None or cached[0] != key:
+        cached = st.session_state['product_sections'] = (key, compile_product_sections(df, starred_fields))
+    return cached[1]
+
+def cached_row_keys(file_id, perf_file_id, df, config):
+    """
+    row_keys_for the uploaded sheet, computed again only when the file, the performance
+    report or a setting that shapes fingerprints changes (not on every widget interaction).
+    """
+    key = json.dumps([file_id, perf_file_id] + [config.get(name) for name in FINGERPRINT_SETTINGS],
+                     ensure_ascii=False, default=str)
+    cached = st.session_state.get('row_keys')
+    if cached is None or cached[0] != key:
+        cached = st.session_state['row_keys'] = (key, row_keys_for(df.iterrows(), config))
+    return cached[1]
+
+# --- Cross-row Dedup ---
+def run_cross_row_dedup(results_store, action):
+    """Runs the job-wide near-duplicate pass on the results and reports the outcome."""
+    if action == "off" or len(results_store) < 2:
+        return
+    with st.spinner("正在跨行查重..."):
+        changed = results_store.mark_near_duplicates()
+    if changed:
+        verb = "从结果表和导出中删除" if action == "drop" else "标记"
+        st.info(f"跨行查重: 已{verb} {changed} 条近似重复标题 (每组保留得分最高的一条)。")
+
+# --- Results Table ---
+RESULTS_PAGE_SIZES = [50, 100, 200, 500]
+
+def apply_results_edits(results_store, page_ids, editor_key):
+    """data_editor on_change: apply the change set to the store, then reset the editor."""
+    results_store.apply_edits(page_ids, st.session_state[editor_key])
+    st.session_state['results_editor_version'] = st.session_state.get('results_editor_version', 0) + 1
+
+def render_results_table(results_store, hide_cross_row=False):
+    """
+    Filtered, sorted, paginated view over the results store. Only one page is rendered.
+    hide_cross_row: Leave out cross-row near-duplicates (dedup action "drop").
+    """
+    col_f1, col_f2, col_f3, col_f4, col_f5 = st.columns([1, 1, 1, 2, 1])
+    with col_f1:
+        row_filter = st.number_input("原行号 (0=全部)", min_value=0, value=0, step=1, key="results_row_filter")
+    with col_f2:
+        band_label = st.selectbox("SEO 得分", list(SCORE_BANDS), key="results_score_filter")
+    with col_f3:
+        dup_label = st.selectbox("疑似重复", ["全部", "仅重复", "排除重复"], key="results_dup_filter")
+    with col_f4:
+        sort_by = st.selectbox("排序", ["(生成顺序)"] + RESULT_COLUMNS, key="results_sort_by")
+    with col_f5:
+        descending = st.toggle("降序", key="results_sort_desc")
+
+    ids = results_store.query(
+        row_id=row_filter or None,
+        score_band=SCORE_BANDS[band_label],
+        duplicates={"全部": None, "仅重复": True, "排除重复": False}[dup_label],
+        sort_by=None if sort_by == "(生成顺序)" else sort_by,
+        ascending=not descending,
+        hide_cross_row=hide_cross_row
+    )
+
+    col_p1, col_p2, col_p3 = st.columns([1, 1, 3])
+    with col_p1:
+        page_size = st.selectbox("每页行数", RESULTS_PAGE_SIZES, index=1, key="results_page_size")
+    page_count = max(1, -(-len(ids) // page_size))
+    if st.session_state.get('results_page', 1) > page_count:
+        st.session_state['results_page'] = 1
+    with col_p2:
+        page_no = st.number_input(f"页码 (共 {page_count} 页)", min_value=1, max_value=page_count, value=1, step=1, key="results_page")
+    with col_p3:
+        st.write("")
+        hidden = f" (已删除 {results_store.cross_row_count()} 条跨行近似重复)" if hide_cross_row and results_store.cross_row_count() else ""
+        st.caption(f"筛选结果 {len(ids)} 条 / 共 {len(results_store)} 条{hidden}")
+
+    page_df, page_ids = results_store.page(ids, page_no - 1, page_size)
+    editor_key = f"results_editor_{st.session_state.get('results_editor_version', 0)}"
+    st.data_editor(
+        page_df,
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        height=400,
+        key=editor_key,
+        on_change=apply_results_edits,
+        args=(results_store, page_ids, editor_key)
+    )
+
+# --- Catalog Audit ---
+# Worst-scoring rows shown on the page; the full report is downloadable
+AUDIT_PREVIEW_ROWS = 1000
+
+# --- Dry Run ---
+def format_duration(seconds):
+    """Human-readable duration, e.g. '2 小时 5 分钟'."""
+    minutes = int(round(seconds / 60))
+    if minutes < 1:
+        return "< 1 分钟"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} 小时 {minutes} 分钟" if hours else f"{minutes} 分钟"
+
+def render_dry_run_estimate():
+    """Projected tokens, wall time and cost of the current upload per model, without calling the API."""
+    dry_run = st.session_state.get('dry_run')
+    if not dry_run:
+        st.caption("上传产品资料表后，可在此预估各模型的 Token 用量、耗时与费用。")
+        return
+
+    df, row_keys, config = dry_run['df'], dry_run['row_keys'], dry_run['config']
+    result_cache = st.session_state['result_cache']
+    pending_rows = [(index, row) for index, row in df.iterrows() if row_keys[index] not in result_cache]
+    if not st.button(f"📊 预估生成 {len(pending_rows)} 行的用量、耗时与费用 (不调用 API)", key="dry_run_btn"):
+        return
+
+    from utils.estimator import estimate_job
+    with st.spinner("正在构建全部提示词..."):
+        estimates = estimate_job(pending_rows, config)
+    st.dataframe(pd.DataFrame([{
+        '模型': e['model'],
+        'API 调用': e['calls'],
+        '输入 Tokens': e['input_tokens'],
+        '输出 Tokens': e['output_tokens'],
+        '预计耗时': format_duration(e['seconds']),
+        '预计费用 (¥)': round(e['cost'], 2),
+        '依据': f"最近 {e['measured_jobs']} 个任务实测" if e['measured_jobs'] else "默认值",
+    } for e in estimates]), hide_index=True, use_container_width=True)
+    st.caption(f"按每任务并发 {config['concurrency']} 行估算，含预计的润色调用；Token 为按字符数的近似值，费用按官方标价、未计缓存折扣。")
+
+# --- Performance Insights ---
+def load_performance_insights(perf_file):
+    """
+    Summary text and KeywordIndex of a performance report, built once per uploaded file.
+    The index is None when the report cannot be used (the summary says why).
+    """
+    cache = st.session_state.get('performance_cache')
+    if not cache or cache['file_id'] != perf_file.file_id:
+        from utils.analyzer import KeywordIndex, analyze_performance, load_performance_report
+        summary = analyze_performance(perf_file)
+        perf_file.seek(0)
+        try:
+            keyword_index = KeywordIndex(load_performance_report(perf_file))
+        except Exception:
+            keyword_index = None
+        cache = st.session_state['performance_cache'] = {
+            'file_id': perf_file.file_id, 'summary': summary, 'keyword_index': keyword_index
+        }
+    return cache['summary'], cache['keyword_index']
 
-def save_config_to_browser(config):
-    """Save config to browser localStorage"""
+# Weeks shown by the keyword store's window selector (None: all stored weeks)
+KEYWORD_STORE_WINDOWS = {"近 4 周": 4, "近 12 周": 12, "近 26 周": 26, "全部": None}
+KEYWORD_STORE_ORDERS = {"点击率": 'ctr', "点击量": 'clicks', "曝光量": 'impressions'}
+
+def render_keyword_store(perf_file):
+    """Merges weekly reports into the local keyword performance store and shows its top keywords."""
+    from utils.keyword_store import MIN_RANK_IMPRESSIONS, get_keyword_store
     try:
-        localStorage.setItem(LOCAL_STORAGE_KEY, json.dumps(config))
-    except Exception:
-        pass
+        store = get_keyword_store()
+    except Exception as e:
+        st.caption(f"关键词效果库不可用: {e}")
+        return
+
+    st.markdown("**🗂️ 关键词效果库** (每周报表累计合并，无需重复上传历史报表)")
+    if perf_file:
+        col_day, col_merge = st.columns([2, 1])
+        with col_day:
+            report_day = st.date_input("报表所属周 (任选该周一天)", key="perf_report_day")
+        with col_merge:
+            st.write("")
+            merge = st.button("合并到效果库", key="perf_merge_btn", use_container_width=True)
+        if merge:
+            from utils.analyzer import load_performance_report
+            perf_file.seek(0)
+            try:
+                result = store.merge_report(load_performance_report(perf_file), report_day, perf_file.name)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if result['duplicate']:
+                    st.info(f"该报表已合并过 ({result['week']} 周)，未重复计入。")
+                else:
+                    st.success(f"已合并 {result['products']} 个产品、{result['keywords']} 个关键词到 {result['week']} 周。")
+
+    reports = store.reports()
+    if reports.empty:
+        st.caption("效果库暂无数据。")
+        return
+    col_window, col_order = st.columns(2)
+    with col_window:
+        window = st.selectbox("时间范围", list(KEYWORD_STORE_WINDOWS), key="keyword_store_window")
+    with col_order:
+        order = st.selectbox("排序", list(KEYWORD_STORE_ORDERS), key="keyword_store_order")
+    top = store.top_keywords(KEYWORD_STORE_WINDOWS[window], order=KEYWORD_STORE_ORDERS[order])
+    top['ctr'] = top['ctr'] * 100
+    st.dataframe(
+        top.rename(columns={'keyword': '关键词', 'impressions': '曝光', 'clicks': '点击', 'ctr': '点击率',
+                            'products': '产品数', 'weeks': '周数'}),
+        hide_index=True, use_container_width=True,
+        column_config={'点击率': st.column_config.NumberColumn(format="%.2f%%")}
+    )
+    st.caption(f"已合并 {len(reports)} 份报表，覆盖 {reports['week'].nunique()} 周"
+               + (f"；按点击率排序时只计曝光不少于 {MIN_RANK_IMPRESSIONS} 的关键词。" if order == "点击率" else "。"))
 
-st.set_page_config(page_title="Title Genie 标题精灵", page_icon="🧞", layout="wide")
+def render_catalog_audit():
+    """Scores an exported listing file without generating anything (see utils.audit)."""
+    from utils.audit import (
+        audit_catalog, regeneration_rows, DEFAULT_REGENERATE_BELOW, SCORE_COLUMN, REGENERATE_COLUMN
+    )
+
+    st.write("上传后台导出的在线商品表 (需含 title/标题 列，可含 Brand / Main Keyword / Core Keyword 列)，批量计算 SEO 得分，找出值得重新生成的标题。")
+    listing_file = st.file_uploader("上传商品标题表", type=["xlsx", "csv"], key="audit_file")
+    regenerate_below = st.slider("低于此得分建议重新生成", min_value=1, max_value=100, value=DEFAULT_REGENERATE_BELOW, key="audit_below")
+    if not listing_file:
+        return
+
+    # Score once per uploaded file; the threshold only re-derives the flag and downloads
+    cache = st.session_state.get('audit_cache')
+    if not cache or cache['file_id'] != listing_file.file_id:
+        try:
+            with st.spinner("正在批量评分..."):
+                report = audit_catalog(load_file(listing_file))
+        except ValueError as e:
+            st.error(f"评分失败: {e}")
+            return
+        cache = st.session_state['audit_cache'] = {'file_id': listing_file.file_id, 'report': report, 'downloads': {}}
+
+    report = cache['report']
+    report[REGENERATE_COLUMN] = report[SCORE_COLUMN] < regenerate_below
+    to_regenerate = regeneration_rows(report)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("标题总数", len(report))
+    col2.metric("平均得分", f"{report[SCORE_COLUMN].mean():.1f}" if len(report) else "-")
+    col3.metric("满分标题", int((report[SCORE_COLUMN] == 100).sum()))
+    col4.metric("建议重新生成", len(to_regenerate))
+
+    st.dataframe(report.head(AUDIT_PREVIEW_ROWS), use_container_width=True, hide_index=True, height=400)
+    if len(report) > AUDIT_PREVIEW_ROWS:
+        st.caption(f"仅显示得分最低的 {AUDIT_PREVIEW_ROWS} 行，完整报告请下载。")
+
+    downloads = cache['downloads'].get(regenerate_below)
+    if downloads is None:
+        downloads = cache['downloads'][regenerate_below] = (
+            report.to_csv(index=False).encode('utf-8-sig'),
+            export_excel(to_regenerate)
+        )
+    col_d1, col_d2, _ = st.columns([1, 1, 2])
+    with col_d1:
+        st.download_button("📥 下载体检报告 (CSV)", data=downloads[0], file_name="title_audit_report.csv", mime="text/csv")
+    with col_d2:
+        st.download_button(
+            "📥 下载待重新生成行 (Excel)",
+            data=downloads[1],
+            file_name="title_audit_regenerate.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            help="可直接作为产品资料表上传，重新生成这些标题"
+        )
+
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id):
+    """Polls a running job. Only this fragment reruns, the rest of the page stays responsive."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return
+    sync_job_results(job)
+
+    progress = job.progress()
+    if progress['status'] == QUEUED:
+        st.info(f"任务排队中，前面还有 {get_job_manager().queue_position(job)} 个任务…")
+    else:
+        st.progress(progress['done'] / progress['total'] if progress['total'] else 1.0)
+        st.markdown(f"**正在处理 ({progress['done']}/{progress['total']})**: `{progress['current']}`")
+        if progress['eta'] is not None:
+            st.caption(f"预计剩余时间: {int(progress['eta'] // 60)}分 {int(progress['eta'] % 60)}秒")
+        if progress['tokens']:
+            st.caption(f"已用 Token: {progress['tokens']:,}")
+        adaptive = progress['concurrency']
+        if adaptive:
+            rate = f"{adaptive['calls_per_minute']:.0f} 次/分钟" if adaptive['calls_per_minute'] else "测量中"
+            latency = f"{adaptive['latency']:.1f} 秒" if adaptive['latency'] else "-"
+            st.caption(f"自动并发: 上限 {adaptive['limit']} · 进行中 {adaptive['in_flight']} · 吞吐 {rate} · "
+                       f"平均响应 {latency} · 限流降速 {adaptive['decreases']} 次")
+    if progress['errors']:
+        st.caption(f"⚠️ {progress['errors']} 行生成失败")
+
+    # Results are streamed to disk as rows finish; the part written so far can be downloaded any time
+    if job.writer:
+        if st.button("📄 导出已完成部分 (CSV)", key=f"partial_export_{job_id}"):
+            job.writer.flush()
+            with open(job.writer.csv_path, 'rb') as f:
+                st.session_state['partial_export'] = (job_id, f.read())
+        partial = st.session_state.get('partial_export')
+        if partial and partial[0] == job_id:
+            st.download_button("📥 下载已完成部分", data=partial[1], file_name=f"title_genie_partial_{job_id}.csv",
+                               mime="text/csv", key=f"partial_download_{job_id}",
+                               on_click=lambda: st.session_state.pop('partial_export', None))
+
+    if st.button("⏹️ 停止任务", key=f"cancel_job_{job_id}"):
+        job.cancel()
+        st.toast("正在停止，进行中的行完成后结束")
+
+    if job.finished:
+        st.rerun()
 
 def main():
     st.title("🧞 Title Genie 标题精灵 (Beta)")
@@ -69,82 +477,172 @@ def main():
 
 @st.dialog("⚙️ 设置 (Configuration)", width="large")
 def show_settings_dialog(history_manager):
+    store = get_settings_store()
+    settings = store.settings
+
     # API Key Management
-    local_config = load_config_from_browser()
-    
     st.subheader("🔑 API 设置")
     api_key_input = st.text_input(
         "DashScope API Key (通义千问)", 
-        value=st.session_state.get('api_key', ''),
+        value=settings.api_key,
         type="password",
         help="请从阿里云 DashScope 控制台获取 API Key",
+        placeholder="使用服务器配置的 API Key" if server_api_key() else "",
         key="api_key_dialog"
     )
     
-    # Update session state & auto-save to browser localStorage on change
-    if api_key_input != st.session_state.get('api_key'):
-        st.session_state['api_key'] = api_key_input
-        local_config["api_key"] = api_key_input
-        save_config_to_browser(local_config)
-        st.toast("API Key 已保存", icon="💾")
+    # Settings are kept in the session and saved to browser localStorage shortly after;
+    # the API key is written at once, so closing the tab right away doesn't lose it
+    if store.update(api_key=api_key_input.strip()):
+        storage = browser_storage()
+        if not storage:
+            st.toast("API Key 已更新 (仅在本次会话中有效)", icon="🔑")
+        elif store.flush(storage, force=True):
+            st.toast("API Key 已保存", icon="💾")
+        else:
+            st.toast("API Key 将稍后保存到浏览器", icon="⏳")
 
     # Model Selection
     model_name = st.selectbox(
         "选择模型 (Model)",
-        options=["qwen-flash", "qwen-plus", "qwen-turbo", "qwen-max"],
-        index=["qwen-flash", "qwen-plus", "qwen-turbo", "qwen-max"].index(st.session_state.get('model_name', 'qwen-flash')),
+        options=MODEL_OPTIONS,
+        index=MODEL_OPTIONS.index(settings.model_name),
         help="推荐使用 qwen-flash 以获得最快的生成速度。",
         key="model_dialog"
     )
-    st.session_state['model_name'] = model_name
+    store.update(model_name=model_name)
+    render_dry_run_estimate()
 
     # Keyword Positioning
     st.divider()
     st.subheader("📍 关键词位置设置")
-    pos_options = ["前 (Front)", "中 (Middle)", "尾 (End)"]
     
     col_p1, col_p2, col_p3 = st.columns(3)
     with col_p1:
-        st.session_state['pos_brand'] = st.selectbox("品牌词", pos_options, 
-                                                    index=pos_options.index(st.session_state.get('pos_brand', "前 (Front)")), 
-                                                    key="brand_pos_dialog")
+        store.update(pos_brand=st.selectbox("品牌词", POSITION_OPTIONS,
+                                            index=POSITION_OPTIONS.index(settings.pos_brand),
+                                            key="brand_pos_dialog"))
     with col_p2:
-        st.session_state['pos_main'] = st.selectbox("主词", pos_options, 
-                                                   index=pos_options.index(st.session_state.get('pos_main', "前 (Front)")), 
-                                                   key="main_pos_dialog")
+        store.update(pos_main=st.selectbox("主词", POSITION_OPTIONS,
+                                           index=POSITION_OPTIONS.index(settings.pos_main),
+                                           key="main_pos_dialog"))
     with col_p3:
-        st.session_state['pos_core'] = st.selectbox("核心词", pos_options, 
-                                                   index=pos_options.index(st.session_state.get('pos_core', "尾 (End)")), 
-                                                   key="core_pos_dialog")
+        store.update(pos_core=st.selectbox("核心词", POSITION_OPTIONS,
+                                           index=POSITION_OPTIONS.index(settings.pos_core),
+                                           key="core_pos_dialog"))
 
     # Strategy Selection
     st.divider()
     st.subheader("🤖 生成策略设置")
-    mode_index = 1 if st.session_state.get('selected_mode_label', "Mode B (营销模式)") == "Mode B (营销模式)" else 0
     mode = st.radio(
         "选择生成模式",
-        ("Mode A (严格模式)", "Mode B (营销模式)"),
-        index=mode_index,
+        MODE_OPTIONS,
+        index=MODE_OPTIONS.index(settings.selected_mode_label),
         help="选择 'Mode A' 进行严格格式化，或选择 'Mode B' 以获得更好的点击率。",
         key="mode_dialog"
     )
-    st.session_state['selected_mode_label'] = mode
+    store.update(selected_mode_label=mode)
     
     # Generation Count
-    num_titles = st.slider("每个产品生成标题数量", 1, 10, st.session_state.get('num_titles', 5), key="num_titles_dialog")
-    st.session_state['num_titles'] = num_titles
+    num_titles = st.slider("每个产品生成标题数量", *NUM_TITLES_RANGE, settings.num_titles, key="num_titles_dialog")
+    store.update(num_titles=num_titles)
+    store.update(overgenerate=st.checkbox(
+        "一次多生成候选，本地择优",
+        value=settings.overgenerate,
+        help=f"每行一次请求 {OVERGENERATION_FACTOR} 倍数量的候选标题，在本地评分、查重并挑选得分高且互不相似的标题，不再逐条调用 AI 润色。请求次数更少、速度更快，输出 Token 略多。",
+        key="overgenerate_dialog"
+    ))
+
+    # Parallel Requests
+    adaptive = st.checkbox(
+        "自动调节并发",
+        value=settings.adaptive_concurrency,
+        help="根据响应时间和限流自动增减同时发出的请求数，在不触发限流的前提下找到最快的并发数。同一 API Key 的所有任务共用这一上限。",
+        key="adaptive_concurrency_dialog"
+    )
+    store.update(adaptive_concurrency=adaptive)
+    concurrency = st.slider("并发处理行数", *CONCURRENCY_RANGE, settings.concurrency, 
+                            help="同时向模型发送请求的产品行数。遇到限流时请调低。",
+                            disabled=adaptive,
+                            key="concurrency_dialog")
+    store.update(concurrency=concurrency)
+
+    # Cross-row near-duplicates
+    dedup_options = list(CROSS_ROW_DEDUP_OPTIONS)
+    store.update(cross_row_dedup=st.radio(
+        "跨行近似重复处理 (任务完成后)",
+        dedup_options,
+        index=dedup_options.index(settings.cross_row_dedup),
+        horizontal=True,
+        help="对整个任务的全部标题做一次近似重复聚类（如同款不同色的变体），每组保留得分最高的一条。删除只作用于结果表和导出，缓存与历史库中仍保留这些标题。",
+        key="cross_row_dedup_dialog"
+    ))
+
+    # Profiling (slows generation down; for diagnosing slow runs or memory growth)
+    store.update(profile_jobs=st.checkbox(
+        "记录任务性能剖析 (CPU / 内存)",
+        value=settings.profile_jobs,
+        help="为之后启动的任务记录 CPU 热点和内存分配位置，任务结束后可查看并下载原始剖析文件。会使生成变慢，仅在排查问题时开启。",
+        key="profile_jobs_dialog"
+    ))
+    store.flush(browser_storage())
 
     # History Management
     st.divider()
     st.subheader("🔍 历史库管理")
     stats = history_manager.get_stats()
-    st.caption(f"当前历史库已有标题: {stats['total_titles']} 条")
+    shared = "（多用户共享库）" if stats['storage_mode'] == 'shared' else ""
+    st.caption(f"当前历史库已有标题: {stats['total_titles']} 条{shared}")
+
+    history_file = st.file_uploader("导入历史标题 (Excel/CSV，需含 title/标题 列)", type=["xlsx", "csv"], key="history_import_dialog")
+    if history_file and st.button("导入到历史库", key="history_import_btn"):
+        import_bar = st.progress(0.0)
+
+        def _import_progress(rows_read, total_rows):
+            fraction = min(rows_read / total_rows, 1.0) if total_rows else 0.0
+            import_bar.progress(fraction, text=f"已读取 {rows_read} 行")
+
+        try:
+            report = history_manager.import_titles(history_file, progress_callback=_import_progress)
+        except ValueError as e:
+            st.error(f"导入失败: {e}")
+        else:
+            import_bar.progress(1.0, text=f"已读取 {report['rows_read']} 行")
+            history_manager.save_history()
+            st.success(f"导入 {report['imported']} 条，跳过重复 {report['duplicates']} 条，拒绝 {report['rejected']} 条。")
+            if report['rejected_rows']:
+                st.dataframe(pd.DataFrame(report['rejected_rows']), use_container_width=True, height=200)
+
     if st.button("清除历史库 (Clear History)", type="secondary", key="clear_history_dialog"):
             history_manager.clear_history()
             history_manager.save_history()
             st.toast("历史库已清空")
             st.rerun()
 
+    # Term Dictionary
+    st.divider()
+    st.subheader("📚 术语词典")
+    session_terms = st.session_state.get('terms')
+    terms = session_terms or get_terms()
+    st.caption(
+        f"缩写 {len(terms.terms(ACRONYM))} 个 · 品牌写法 {len(terms.terms(BRAND))} 个 · "
+        f"违禁词 {len(terms.terms(SPAM))} 个 · 停用词 {len(terms.terms(STOPWORD))} 个"
+        + ("（含本次会话导入的术语，仅对本次会话生效，刷新页面后失效）" if session_terms else "")
+    )
+    terms_file = st.file_uploader(
+        "导入术语 (Excel/CSV，需含 term 与 category 列；category 取 acronym / brand / spam / stopword)",
+        type=["xlsx", "csv"], key="terms_import_dialog"
+    )
+    if terms_file and st.button("导入到术语词典", key="terms_import_btn"):
+        try:
+            terms, report = load_terms(terms_file, session_terms)
+        except ValueError as e:
+            st.error(f"导入失败: {e}")
+        else:
+            st.session_state['terms'] = terms
+            set_thread_terms(terms)
+            st.success(f"导入 {report['added']} 个术语，跳过 {report['skipped']} 行（仅对本次会话生效）。")
+
 def main():
     # 0. Hide default Streamlit elements for a cleaner UI
     st.markdown(
@@ -164,60 +662,60 @@ def main():
         """,
         unsafe_allow_html=True
     )
+    # Terms uploaded in this session apply to its checks only (see utils.terms)
+    set_thread_terms(st.session_state.get('terms'))
 
-    # 1. Load config from browser localStorage early
-    local_config = load_config_from_browser()
-
-    # 2. Initialize History Manager early
-    history_manager = TitleHistoryManager(local_storage=localStorage)
-
-    # 3. Handle Header with Settings button
+    # 1. Draw the header first so the page paints before any browser round trip
     col_title, col_settings = st.columns([8, 1])
     with col_title:
         st.title("🧞 Title Genie 标题精灵 (Beta)")
         st.markdown("阿里国际站标题自动化生成工具")
+
+    # 2. Settings: read from browser localStorage once per session; changes made in
+    #    the settings dialog are written back shortly after (write-behind)
+    mount_local_storage()
+    storage = browser_storage()
+    settings_store = get_settings_store()
+    if settings_store.load(storage) and settings_store.settings.api_key:
+        st.toast("已从浏览器自动加载 API Key", icon="🔐")
+    settings_store.flush(storage)
+    settings = settings_store.settings
+
+    # 3. History Manager. Loading is deferred until the history is actually used, and
+    #    the loaded history is kept across reruns: browser history belongs to one user,
+    #    so it lives in the session; the history file (or shared store) is shared by
+    #    all sessions of the process.
+    if storage and not DEFAULT_HISTORY_DB:
+        if 'history_manager' not in st.session_state:
+            st.session_state['history_manager'] = TitleHistoryManager(local_storage=storage, lazy_load=True)
+        history_manager = st.session_state['history_manager']
+        history_manager.local_storage = storage  # The component is re-created every run
+    else:
+        history_manager = get_shared_history()
+
+    # Settings button (needs the history manager)
     with col_settings:
         st.write("") # Padding
         if st.button("⚙️ 设置", use_container_width=True):
             show_settings_dialog(history_manager)
 
-    # 4. Initialize session state defaults
-    if 'model_name' not in st.session_state: st.session_state['model_name'] = "qwen-flash"
-    if 'pos_brand' not in st.session_state: st.session_state['pos_brand'] = "前 (Front)"
-    if 'pos_main' not in st.session_state: st.session_state['pos_main'] = "前 (Front)"
-    if 'pos_core' not in st.session_state: st.session_state['pos_core'] = "尾 (End)"
-    if 'selected_mode_label' not in st.session_state: st.session_state['selected_mode_label'] = "Mode B (营销模式)"
-    if 'num_titles' not in st.session_state: st.session_state['num_titles'] = 5
-
-    # 5. API Key Initial Sync (Browser -> Session State)
-    if 'api_key' not in st.session_state or not st.session_state['api_key']:
-        # 1. Try browser storage
-        saved_key = local_config.get("api_key", "")
-        if saved_key:
-            st.session_state['api_key'] = saved_key
-            st.toast("已从浏览器自动加载 API Key", icon="🔐")
-        else:
-            # 2. Try Secrets / ENV
-            env_key = ""
-            try:
-                env_key = st.secrets.get("DASHSCOPE_API_KEY", "")
-            except Exception: pass
-            if not env_key:
-                env_key = os.getenv("DASHSCOPE_API_KEY", "")
-            
-            # 3. Final default to empty string
-            st.session_state['api_key'] = env_key if env_key else ""
-
-    # Derived values for logic
-    keyword_positions = {
-        "Brand": st.session_state['pos_brand'],
-        "Main Keyword": st.session_state['pos_main'],
-        "Core Keyword": st.session_state['pos_core']
-    }
-    selected_mode = "Mode A" if "Mode A" in st.session_state['selected_mode_label'] else "Mode B"
-    num_titles = st.session_state['num_titles']
-    api_key_input = st.session_state['api_key']
-    model_name = st.session_state['model_name']
+    # Re-attach to a job started from this page before a reload / reconnect
+    job_param = st.query_params.get('job')
+    if job_param and 'job_id' not in st.session_state and get_job_manager().get(job_param):
+        st.session_state['job_id'] = job_param
+        st.session_state['job_row_cursor'] = 0
+        st.session_state['result_cache'] = {}
+        st.session_state['results_store'] = ResultsStore()
+
+    # Derived values for logic (a key saved in the browser wins over the server's)
+    keyword_positions = settings.keyword_positions
+    selected_mode = settings.mode
+    num_titles = settings.num_titles
+    api_key_input = settings.api_key or server_api_key()
+    model_name = settings.model_name
+
+    # Background job started from this session (polled below)
+    active_job = get_job_manager().get(st.session_state.get('job_id', ''))
 
     # --- Main Content ---
     
@@ -227,17 +725,26 @@ def main():
     st.divider()
 
     # 2. Performance Data (Optional)
-    performance_context = ""
+    keyword_index = None
     with st.expander("📈 智能数据分析 (可选)", expanded=False):
         st.write("上传阿里后台的“商品分析”报表 (Excel)，AI 将自动分析高点击词并在生成新标题时参考。")
         perf_file = st.file_uploader("上传效果报表", type=["xlsx"], key="perf")
         
         if perf_file:
-            from utils.analyzer import analyze_performance
             with st.spinner("正在分析历史表现数据..."):
-                performance_context = analyze_performance(perf_file)
-                st.info(performance_context)
+                performance_summary, keyword_index = load_performance_insights(perf_file)
+            st.info(performance_summary)
+            if keyword_index:
+                from utils.analyzer import ROW_KEYWORD_LIMIT
+                st.caption(f"生成时每行只附带与其主词/核心词相关的高点击词 (最多 {ROW_KEYWORD_LIMIT} 个)，而不是整份关键词列表。")
+        render_keyword_store(perf_file)
+
+    # 3. Catalog Audit (Optional)
+    with st.expander("🩺 标题体检 (批量评分现有标题)", expanded=False):
+        render_catalog_audit()
     
+    # Rows and settings the settings dialog's dry run estimates (set again below while a file is loaded)
+    st.session_state['dry_run'] = None
     if uploaded_file:
         try:
             df = load_file(uploaded_file)
@@ -255,12 +762,11 @@ def main():
                 st.error(f"缺少必要列: {', '.join(missing_cols)}")
                 return
 
-            # --- Resume / Checkpoint Logic ---
-            if 'processed_indices' not in st.session_state:
-                st.session_state['processed_indices'] = set()
-                st.session_state['results_list'] = []
+            # --- Resume / Checkpoint Logic (results are cached per row fingerprint) ---
+            if 'result_cache' not in st.session_state:
+                st.session_state['result_cache'] = {}
+                st.session_state['results_store'] = ResultsStore()
 
-            processed_count = len(st.session_state['processed_indices'])
             total_rows = len(df)
             
             # --- Starred Fields Selection ---
@@ -281,193 +787,143 @@ def main():
             )
 
             
+            # --- Scheduling & Budget ---
+            with st.expander("⏱️ 处理顺序与预算 (可选)", expanded=False):
+                numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+                priority_options = [PRIORITY_FILE_ORDER] + ([PRIORITY_REPORT] if perf_file else []) + numeric_cols
+                priority_source = st.selectbox(
+                    "处理顺序", priority_options, key="priority_source",
+                    help="按优先级从高到低处理：效果报表中与主词匹配的产品曝光量，或表中的数值列 (如销量、曝光)。"
+                )
+                col_b1, col_b2 = st.columns(2)
+                with col_b1:
+                    deadline_minutes = st.number_input("时间预算 (分钟，0=不限)", min_value=0, value=0, step=5, key="deadline_minutes")
+                with col_b2:
+                    token_budget = st.number_input("Token 预算 (0=不限)", min_value=0, value=0, step=100_000, key="token_budget")
+                st.caption("达到预算时不再开始新行，已完成的是优先级最高的行，剩余行可稍后继续生成。")
+
+            gen_config = {
+                'mode': selected_mode,
+                'keyword_positions': keyword_positions,
+                'starred_fields': starred_fields,
+                'num_titles': num_titles,
+                'api_key': api_key_input,
+                'model_name': model_name,
+                'extra_context': "",
+                'keyword_index': keyword_index,
+                # With adaptive concurrency the limit reached so far is the best estimate of the next job's
+                'concurrency': get_limiter(api_key_input, model_name).limit if settings.adaptive_concurrency else settings.concurrency,
+                'adaptive_concurrency': settings.adaptive_concurrency,
+                'deadline_seconds': deadline_minutes * 60,
+                'token_budget': token_budget,
+                'overgenerate': settings.overgenerate,
+                'profile': settings.profile_jobs,
+                # Product sections of every row's prompt, compiled once per file and starred fields
+                'product_sections': cached_product_sections(uploaded_file.file_id, df, starred_fields),
+                # Term dictionary with this session's uploaded terms (None: the process-wide one)
+                'terms': st.session_state.get('terms')
+            }
+
+            # Fingerprint every row: unchanged rows reuse cached results even if rows moved,
+            # edited rows and rows affected by changed settings are generated again.
+            # Identical rows share a fingerprint and are generated together as one group.
+            row_keys = cached_row_keys(uploaded_file.file_id, perf_file.file_id if keyword_index else None, df, gen_config)
+            result_cache = st.session_state['result_cache']
+            st.session_state['dry_run'] = {'df': df, 'row_keys': row_keys, 'config': gen_config}
+            results_view = hashlib.sha1("".join(row_keys.values()).encode()).hexdigest()
+            if not active_job and st.session_state.get('results_view') != results_view:
+                st.session_state['results_store'] = results_from_cache(row_keys, settings.dedup_action)
+                st.session_state['results_view'] = results_view
+
             # --- Generation Trigger ---
-            btn_label = "开始生成标题" if processed_count == 0 else f"继续生成 (已完成 {processed_count}/{total_rows})"
-            
-            if st.button(btn_label, type="primary"):
-                if not api_key_input:
-                    st.error("请提供 API Key。")
-                    return
-                
-                progress_bar = st.progress(processed_count / total_rows)
-                status_text = st.empty()
-                time_estimator = st.empty()
-                
-                start_time = time.time()
-                
-                # Iterate
-                for index, row in df.iterrows():
-                    if index in st.session_state['processed_indices']:
-                        continue # Skip already processed
-                    
-                    # Estimate remaining time
-                    processed_in_session = len(st.session_state['processed_indices']) - processed_count + 1 # simplistic
-                    elapsed = time.time() - start_time
-                    if processed_in_session > 1:
-                        avg_time = elapsed / (processed_in_session - 1)
-                        remaining = (total_rows - len(st.session_state['processed_indices'])) * avg_time
-                        time_estimator.caption(f"预计剩余时间: {int(remaining // 60)}分 {int(remaining % 60)}秒")
-
-                    main_kw_display = row.get('Main Keyword', '未知产品')
-                    if pd.isna(main_kw_display): main_kw_display = '未知产品'
-                    
-                    status_text.markdown(f"**正在处理 ({index + 1}/{total_rows})**: `{main_kw_display}`")
-                    
-                    # Build Prompt
-                    role_instruction = "Role: You are an Alibaba International Station SEO expert specializing in high-converting product titles for global markets."
-                    prompt = build_prompt(
-                        row, 
-                        selected_mode, 
-                        extra_context=performance_context,
-                        keyword_positions=keyword_positions,
-                        starred_fields=starred_fields
-                    )
-                    full_prompt = f"{prompt}\n\nTask: Generate {num_titles} distinct, professional titles for this product. Output them as a numbered list (1. Title...)."
-                    
-                    # Call API
-                    generated_content = generate_text(full_prompt, api_key_input, model_name)
-                    
-                    # Parse Content
-                    lines = generated_content.split('\n')
-                    generated_titles_for_this_row = [] 
-                    
-                    for line in lines:
-                        line = line.strip()
-                        if not line: continue
-                        
-                        clean_title = re.sub(r'^\d+\.?\s*', '', line)
-                        if len(clean_title) < 10: continue
-
-                        # 0. Post-AI Cleanup & Normalization
-                        clean_title = remove_punctuation(clean_title)  # Remove commas/periods FIRST
-                        clean_title = remove_filler_words(clean_title)
-                        clean_title = fix_acronyms(clean_title)
-
-                        # 1. Brand Validation
-                        clean_title, fixed = validate_brand(clean_title, row.get('Brand', ''))
-                        
-                        # 2. Duplicate Detection (Batch + History)
-                        # Check batch dupes
-                        is_dup_batch, _ = check_duplication(clean_title, generated_titles_for_this_row)
-                        if is_dup_batch: continue
-                        
-                        # Check history dupes (Cross-Library)
-                        is_dup_hist, score_hist, sim_title = history_manager.check_similarity(clean_title, threshold=0.8)
-                        
-                        # Note: We might still want to show it but flag it? Or filter it?
-                        # For now, let's filter if it's a strong match > 0.9, otherwise just warn in notes
-                        dup_note = ""
-                        if is_dup_hist:
-                             if score_hist > 0.95:
-                                 continue # Skip identicals
-                             dup_note = f" (与历史标题相似度 {score_hist:.0%})"
-
-                        generated_titles_for_this_row.append(clean_title)
-
-                        # 3. SEO Scoring
-                        seo_score, seo_notes = calculate_seo_score(
-                            clean_title, 
-                            row.get('Brand', ''), 
-                            row.get('Main Keyword', ''), 
-                            row.get('Core Keyword', '')
+            if not active_job:
+                processed_count = sum(1 for key in row_keys.values() if key in result_cache)
+                btn_label = "开始生成标题" if processed_count == 0 else f"继续生成 (已完成 {processed_count}/{total_rows})"
+                if 0 < processed_count < total_rows:
+                    st.caption(f"{processed_count} 行内容与设置未变，沿用已有结果；{total_rows - processed_count} 行新增或已修改，待生成。")
+
+                if st.button(btn_label, type="primary"):
+                    if not api_key_input:
+                        st.error("请提供 API Key。")
+                        return
+
+                    pending_rows = [
+                        (index, row) for index, row in df.iterrows()
+                        if row_keys[index] not in result_cache
+                    ]
+                    if not pending_rows:
+                        st.info("所有行均已生成。")
+                    else:
+                        pending_rows = prioritize_rows(pending_rows, df, priority_source, perf_file)
+                        # Browser history can only be read in a script run, not by the job's worker
+                        history_manager.ensure_loaded()
+                        job = get_job_manager().submit(
+                            pending_rows, gen_config, history_manager,
+                            row_keys={index: row_keys[index] for index, _ in pending_rows}
                         )
-                        
-                        # --- AI Polishing Loop (Self-Correction) ---
-                        attempts = 0
-                        max_attempts = 2
-                        while seo_score < 100 and attempts < max_attempts:
-                            attempts += 1
-                            polish_prompt = f"""
-{role_instruction}
-The following title needs optimization to reach a perfect SEO score (100).
-Current Title: "{clean_title}"
-Current Character Count: {len(clean_title)}
-REQUIRED Character Count: 80 - 120 (STRICT HARD LIMIT: DO NOT EXCEED 120)
-Faults Identified: {seo_notes}
-Mandatory Keywords: "{row.get('Brand', '')}", "{row.get('Main Keyword', '')}", "{row.get('Core Keyword', '')}"
-
-Task: Rewrite the title to fix all faults. 
-If it's too long, you MUST REMOVE non-essential descriptive words or specifications.
-The new title MUST:
-1. Start with "{row.get('Brand', '')} {row.get('Main Keyword', '')}"
-2. Include "{row.get('Core Keyword', '')}"
-3. Be between 80 - 120 characters total.
-Output ONLY the new title.
-"""
-                            polished_title = generate_text(polish_prompt, api_key_input, model_name).strip()
-                            polished_title = re.sub(r'^["\']|["\']$', '', polished_title) # Remove quotes
-                            
-                            # Re-Validate
-                            new_score, new_notes = calculate_seo_score(
-                                polished_title, 
-                                row.get('Brand', ''), 
-                                row.get('Main Keyword', ''), 
-                                row.get('Core Keyword', '')
-                            )
-                            
-                            if new_score >= seo_score:
-                                clean_title = polished_title
-                                seo_score = new_score
-                                seo_notes = f"[Polished V{attempts}] {new_notes}"
-                                if seo_score == 100:
-                                    break
-
-                        result_row = {
-                            "原行号 (Row ID)": index + 1,
-                            "品牌 (Brand)": row.get('Brand', ''),
-                            "主词 (Main Keyword)": row.get('Main Keyword', ''),
-                            "核心词 (Core Keyword)": row.get('Core Keyword', ''),
-                            "AI 生成标题 (AI Suggestions)": clean_title,
-                            "SEO 得分": seo_score,
-                            "扣分原因": seo_notes + dup_note
-                        }
-                        st.session_state['results_list'].append(result_row)
-                        
-                        # ** Add to History Immediately **
-                        history_manager.add_title(clean_title, brand=row.get('Brand', ''), product_id=f"Row-{index+1}")
-
-                    # Mark as processed
-                    st.session_state['processed_indices'].add(index)
-                    progress_bar.progress(len(st.session_state['processed_indices']) / total_rows)
-                    
-                    # Auto-save history every row (safer)
-                    history_manager.save_history()
-                
-                status_text.success("生成完成！")
-                time_estimator.empty()
+                        st.session_state['job_id'] = job.id
+                        st.session_state['job_row_cursor'] = 0
+                        # Lets a reopened tab re-attach to the running job
+                        st.query_params['job'] = job.id
+                        st.rerun()
                 
         except Exception as e:
             st.error(f"发生错误: {e}")
             st.exception(e)
 
+    # --- Running Job ---
+    if active_job:
+        sync_job_results(active_job)
+        if active_job.finished:
+            show_job_summary(active_job)
+            run_cross_row_dedup(st.session_state['results_store'], settings.dedup_action)
+            st.session_state.pop('job_id', None)
+            st.query_params.pop('job', None)
+        else:
+            render_job_progress(active_job.id)
+    if st.session_state.get('job_profile'):
+        show_job_profile(st.session_state['job_profile'])
+
     # --- Results & Export ---
-    if 'results_list' in st.session_state and st.session_state['results_list']:
+    results_store = st.session_state.get('results_store')
+    if results_store is not None and len(results_store):
         st.divider()
         st.subheader("生成结果")
+        # "Drop" hides cross-row near-duplicates from the table and export; the cache and history keep them
+        hide_cross_row = settings.dedup_action == "drop"
+        render_results_table(results_store, hide_cross_row)
         
-        # Convert list to DF for logic
-        results_df = pd.DataFrame(st.session_state['results_list'])
-        
-        edited_df = st.data_editor(
-            results_df,
-            num_rows="dynamic",
-            use_container_width=True,
-            height=400
-        )
-        
-        col1, col2 = st.columns([1, 4])
+        col1, col2, col3 = st.columns([1, 1, 3])
         with col1:
-             # Download
-            st.download_button(
-                label="📥 下载结果 (Excel)",
-                data=export_excel(edited_df),
-                file_name="title_genie_results.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # The workbook is built only on request and reused until the results change
+            export_version = (id(results_store), results_store.version, hide_cross_row)
+            export = st.session_state.get('results_export')
+            if export is None or export[0] != export_version:
+                if st.button("📦 准备导出 (Excel)"):
+                    with st.spinner("正在生成 Excel..."):
+                        export = (export_version, export_excel(results_store.to_frame(hide_cross_row)))
+                    st.session_state['results_export'] = export
+            if export is not None and export[0] == export_version:
+                st.download_button(
+                    label="📥 下载结果 (Excel)",
+                    data=export[1],
+                    file_name="title_genie_results.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
         with col2:
+            if st.button("🔍 跨行查重", help="对全部结果做一次近似重复聚类，标记每组中得分较低的标题"):
+                action = settings.dedup_action
+                run_cross_row_dedup(results_store, "flag" if action == "off" else action)
+        with col3:
             if st.button("🗑️ 清空当前任务结果", help="清除页面缓存和进度，开始新任务"):
-                st.session_state['results_list'] = []
-                st.session_state['processed_indices'] = set()
+                active_job = get_job_manager().get(st.session_state.pop('job_id', ''))
+                if active_job:
+                    active_job.cancel()
+                    st.query_params.pop('job', None)
+                st.session_state['results_store'] = ResultsStore()
+                st.session_state['result_cache'] = {}
+                st.session_state.pop('results_view', None)
+                st.session_state.pop('results_export', None)
                 st.rerun()
 
 if __name__ == "__main__":
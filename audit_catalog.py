@@ -0,0 +1,64 @@
+"""
+Catalog audit: SEO-score every title of an exported listing file, without generating anything.
+
+Writes a report sorted by score (worst first) with the fault reasons of each title,
+and optionally a product sheet of the rows worth regenerating (re-upload it to the app).
+
+Examples:
+  python audit_catalog.py listings.xlsx
+  python audit_catalog.py listings.csv --output report.csv --regenerate-output to_regenerate.xlsx --below 80
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from utils.audit import DEFAULT_REGENERATE_BELOW, SCORE_COLUMN, audit_catalog, regeneration_rows
+from utils.file_handler import load_file
+
+
+def write_table(df, path):
+    """Write a DataFrame as CSV or Excel, depending on the file extension."""
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    else:
+        df.to_excel(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("listing", help="Exported listing file (.xlsx or .csv) with a title column")
+    parser.add_argument("--title-column", default="title", help="Name of the title column (default: title)")
+    parser.add_argument("--below", type=int, default=DEFAULT_REGENERATE_BELOW,
+                        help=f"Mark titles scoring below this for regeneration (default: {DEFAULT_REGENERATE_BELOW})")
+    parser.add_argument("--output", help="Report file (.csv or .xlsx; default: <listing>_audit.csv)")
+    parser.add_argument("--regenerate-output", help="Also write the rows to regenerate as a product sheet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.listing, "rb") as f:
+        df = load_file(f)
+    loaded = time.perf_counter()
+
+    try:
+        report = audit_catalog(df, title_column=args.title_column, regenerate_below=args.below)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    scored = time.perf_counter()
+
+    output = args.output or os.path.splitext(args.listing)[0] + "_audit.csv"
+    write_table(report, output)
+
+    scores = report[SCORE_COLUMN]
+    to_regenerate = regeneration_rows(report)
+    print(f"Titles: {len(report)} | load {loaded - start:.1f}s | score {scored - loaded:.1f}s")
+    print(f"Mean score {scores.mean():.1f} | perfect (100): {(scores == 100).sum()} | below {args.below}: {len(to_regenerate)}")
+    print(f"Report written to {output}")
+    if args.regenerate_output:
+        write_table(to_regenerate, args.regenerate_output)
+        print(f"Rows to regenerate written to {args.regenerate_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Startup-time benchmark for Title Genie (source and frozen builds).
+
+Measures, each in fresh processes and reported as median / min over --repeat runs:
+  imports    time to import the modules app.py loads at startup, plus the slowest imports
+  first-run  time for the first script run of app.py (Streamlit AppTest, no browser)
+  server     time from process start until the Streamlit server answers its health check
+
+Examples:
+  python bench_startup.py                                   # imports + first-run + server (source)
+  python bench_startup.py --only server --exe dist/TitleGenie.exe
+  python bench_startup.py --history-titles 100000           # with a large title history file
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Modules app.py imports before the first paint
+STARTUP_MODULES = [
+    "streamlit",
+    "pandas",
+    "utils.file_handler",
+    "utils.job_runner",
+    "utils.results_store",
+    "utils.title_history",
+]
+
+FIRST_RUN_SNIPPET = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+assert not at.exception, [e.value for e in at.exception]
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(code, env=None):
+    """Run `code` in a fresh interpreter from the repo root and return its stdout/stderr."""
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    return proc.stdout, proc.stderr
+
+
+def bench_imports(repeat, env):
+    code = "import time; s = time.perf_counter(); import " + ", ".join(STARTUP_MODULES) + "; print(time.perf_counter() - s)"
+    times = [float(run_python(code, env)[0]) for _ in range(repeat)]
+
+    # Slowest individual imports (cumulative microseconds from -X importtime)
+    _, importtime = run_python("import " + ", ".join(STARTUP_MODULES), dict(env, PYTHONPROFILEIMPORTTIME="1"))
+    slowest = []
+    for line in importtime.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = [p.strip() for p in line[len("import time:"):].split("|")]
+            if cumulative.isdigit():
+                slowest.append((int(cumulative), name))
+    slowest.sort(reverse=True)
+    return times, slowest[:10]
+
+
+def bench_first_run(repeat, env):
+    code = FIRST_RUN_SNIPPET.format(app=os.path.join(ROOT, "app.py"))
+    return [float(run_python(code, env)[0].strip().splitlines()[-1]) for _ in range(repeat)]
+
+
+def bench_server(repeat, env, exe, port, timeout):
+    command = [exe] if exe else [sys.executable, os.path.join(ROOT, "launcher.py")]
+    url = f"http://127.0.0.1:{port}/_stcore/health"
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, cwd=ROOT, env=dict(env, STREAMLIT_SERVER_PORT=str(port)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"Server not ready after {timeout}s")
+                if proc.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {proc.returncode}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as resp:
+                        if resp.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.05)
+            times.append(time.perf_counter() - start)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return times
+
+
+def write_history(path, count):
+    titles = [{"title": f"Benchmark Brand Product {i} Industrial Grade Widget", "brand": "", "product_id": "",
+               "created_at": "2026-01-01T00:00:00"} for i in range(count)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"total_count": count, "titles": titles}, f)
+
+
+def summarize(label, times):
+    print(f"{label:<10} median {statistics.median(times):7.2f}s   min {min(times):7.2f}s   (n={len(times)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["imports", "first-run", "server"], help="Run a single measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--exe", help="Frozen build to start instead of launcher.py (server measurement)")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--history-titles", type=int, default=0,
+                        help="Use a temporary title history file with this many titles")
+    args = parser.parse_args()
+
+    env = dict(os.environ, STREAMLIT_BROWSER_GATHER_USAGE_STATS="false")
+    if args.history_titles:
+        history_path = os.path.join(tempfile.mkdtemp(), "title_history.json")
+        write_history(history_path, args.history_titles)
+        env["TITLE_GENIE_HISTORY_PATH"] = history_path
+
+    print(f"Python {sys.version.split()[0]} | {'frozen: ' + args.exe if args.exe else 'source build'}"
+          f" | history titles: {args.history_titles}")
+
+    if args.only in (None, "imports") and not args.exe:
+        times, slowest = bench_imports(args.repeat, env)
+        summarize("imports", times)
+        for micros, name in slowest:
+            print(f"    {micros / 1e6:6.3f}s  {name}")
+    if args.only in (None, "first-run") and not args.exe:
+        summarize("first-run", bench_first_run(args.repeat, env))
+    if args.only in (None, "server"):
+        summarize("server", bench_server(args.repeat, env, args.exe, args.port, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,5 @@
 import sys
 import os
-# Ensure we can find the streamlit module even if frozen
-from streamlit.web import cli as stcli
 
 def resolve_path(path):
     """
@@ -10,19 +8,25 @@ def resolve_path(path):
     """
     if getattr(sys, "frozen", False):
         # If the application is run as a bundle, the PyInstaller bootloader
-        # extends the sys module by a flag frozen=True and sets the app 
+        # extends the sys module by a flag frozen=True and sets the app
         # path into variable _MEIPASS'.
         basedir = sys._MEIPASS
     else:
         basedir = os.path.dirname(__file__)
-        
+
     return os.path.join(basedir, path)
 
 if __name__ == "__main__":
-    # 1. Set the environment variable to stop Streamlit from trying to watch files in prod
+    # 1. Set the environment variables before Streamlit is imported, so its config picks them up:
+    #    no file watching (scanning the bundle is slow), no usage-stats request at startup
     os.environ["STREAMLIT_SERVER_HEADLESS"] = "true"
     os.environ["STREAMLIT_GLOBAL_DEVELOPMENT_MODE"] = "false"
-    
+    os.environ["STREAMLIT_SERVER_FILE_WATCHER_TYPE"] = "none"
+    os.environ["STREAMLIT_BROWSER_GATHER_USAGE_STATS"] = "false"
+
+    # Ensure we can find the streamlit module even if frozen
+    from streamlit.web import cli as stcli
+
     # 2. Construct the arguments for the streamlit run command
     # equivalent to: streamlit run app.py
     sys.argv = [
@@ -30,7 +34,8 @@ if __name__ == "__main__":
         "run",
         resolve_path("app.py"), # This locates app.py inside the bundle
         "--global.developmentMode=false",
+        "--server.fileWatcherType=none",
     ]
-    
+
     # 3. Execute Streamlit
     sys.exit(stcli.main())
@@ -0,0 +1,149 @@
+"""
+Load test for the generation pipeline against the local mock DashScope server.
+
+Runs full generation jobs (prompting, validation, polishing, history dedup) through
+the JobManager with synthetic product rows, and reports throughput, latency
+percentiles and how injected throttling / server errors were recovered.
+No API costs: requests go to mock_dashscope.py (started in-process unless --url is given).
+
+Examples:
+  python load_test.py                                       # 100 rows, lognormal latency
+  python load_test.py --rows 500 --concurrency 8 --rate-429 0.05 --rate-5xx 0.02
+  python load_test.py --jobs 3 --latency fixed:0.5          # three concurrent jobs
+  python load_test.py --rows 300 --adaptive --rate-429 0.02 # concurrency tuned from latency and throttling
+  python load_test.py --url http://127.0.0.1:8600/api/v1    # already running mock server
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+
+from mock_dashscope import DEFAULT_LATENCY, serve_in_thread
+
+# Synthetic product vocabulary
+BRANDS = ["TechNova", "EcoLife", "PRO-X", "Sunmax", "Korvo", "Aqualine", "Vexor", "Brightek"]
+PRODUCTS = [
+    ("Wireless Earbuds", "Bluetooth 5.0 Headphones"), ("Bamboo Toothbrush", "Biodegradable Soft Bristles"),
+    ("Gaming Mouse", "Optical Sensor RGB Mouse"), ("POS Terminal", "Android Payment Machine"),
+    ("Solar Panel", "Monocrystalline Photovoltaic Module"), ("Water Pump", "Submersible Irrigation Pump"),
+    ("LED Floodlight", "Outdoor Waterproof Lamp"), ("Office Chair", "Ergonomic Mesh Seat"),
+]
+COLORS = ["Black", "White", "Silver", "Blue", "Red", "Green"]
+
+
+def make_rows(count: int, seed: int = 7) -> list:
+    """(index, row) pairs of synthetic product data."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        main_kw, core_kw = rng.choice(PRODUCTS)
+        rows.append((i, pd.Series({
+            "Brand": rng.choice(BRANDS),
+            "Main Keyword": main_kw,
+            "Core Keyword": core_kw,
+            "Attributes": f"{rng.choice(COLORS)}, Model {rng.randint(100, 999)}",
+        })))
+    return rows
+
+
+def percentiles(values: list) -> str:
+    if len(values) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return f"p50 {cuts[49]:6.2f}s   p95 {cuts[94]:6.2f}s   p99 {cuts[98]:6.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="Rows per job")
+    parser.add_argument("--jobs", type=int, default=1, help="Jobs submitted at the same time")
+    parser.add_argument("--concurrency", type=int, default=3, help="Rows processed in parallel per job")
+    parser.add_argument("--adaptive", action="store_true", help="Tune concurrency automatically (ignores --concurrency)")
+    parser.add_argument("--num-titles", type=int, default=5)
+    parser.add_argument("--mode", choices=["Mode A", "Mode B"], default="Mode B")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="Mock latency spec (see mock_dashscope.py)")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-delay", type=float, default=0.2, help="Base retry backoff in seconds")
+    parser.add_argument("--url", help="Use a running mock server instead of starting one")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        server = serve_in_thread(latency=args.latency, rate_429=args.rate_429, rate_5xx=args.rate_5xx)
+        base_url = server.url
+
+    # Must be set before dashscope / utils.text_gen read them
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = base_url
+    os.environ["TITLE_GENIE_RETRY_DELAY"] = str(args.retry_delay)
+
+    from utils.job_runner import JobManager
+    from utils.title_history import TitleHistoryManager
+
+    config = {
+        'mode': args.mode,
+        'keyword_positions': {"Brand": "前 (Front)", "Main Keyword": "前 (Front)", "Core Keyword": "尾 (End)"},
+        'starred_fields': [],
+        'num_titles': args.num_titles,
+        'api_key': "mock",
+        'model_name': "qwen-flash",
+        'extra_context': "",
+        'concurrency': args.concurrency,
+        'adaptive_concurrency': args.adaptive,
+    }
+    print(f"Mock server {base_url} | latency {args.latency} | 429 rate {args.rate_429} | 5xx rate {args.rate_5xx}")
+    concurrency = "adaptive" if args.adaptive else args.concurrency
+    print(f"{args.jobs} job(s) x {args.rows} rows | row concurrency {concurrency} | {args.num_titles} titles/row")
+
+    manager = JobManager(max_running=args.jobs)
+    # Throwaway history, so load-test titles never reach the real one
+    history = TitleHistoryManager(history_path=os.path.join(tempfile.mkdtemp(), "title_history.json"))
+    start = time.perf_counter()
+    jobs = [manager.submit(make_rows(args.rows, seed=j), config, history) for j in range(args.jobs)]
+    while not all(job.finished for job in jobs):
+        time.sleep(0.2)
+        done = sum(job.progress()['done'] for job in jobs)
+        print(f"\r  {done}/{args.rows * args.jobs} rows", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print()
+
+    rows_done = sum(job.rows_done for job in jobs)
+    rows_failed = sum(len(job.row_errors) for job in jobs)
+    titles = sum(job.titles_done for job in jobs)
+    row_durations = [d for job in jobs for d in job.row_durations]
+    retries = sum(job.usage.retries for job in jobs)
+    tokens = sum(job.usage.total_tokens for job in jobs)
+
+    print(f"\nWall time        {elapsed:8.1f}s")
+    print(f"Rows             {rows_done} done, {rows_failed} failed   ({rows_done / elapsed * 60:.1f} rows/min)")
+    print(f"Titles           {titles}   ({titles / max(rows_done, 1):.1f} per row)")
+    print(f"Row latency      {percentiles(row_durations)}")
+
+    stats = server.snapshot() if server else json.load(urllib.request.urlopen(base_url.rsplit("/api/", 1)[0] + "/stats"))
+    print(f"Request latency  {percentiles(stats['latencies'])}")
+    print(f"Requests         {stats['requests']} ({', '.join(f'{k}: {v}' for k, v in sorted(stats['status'].items()))})")
+    injected = sum(v for k, v in stats['status'].items() if k != "200")
+    print(f"Error recovery   {injected} injected errors, {retries} retries, {rows_failed} rows failed after retries")
+    print(f"Tokens           {tokens} (reported to the client)")
+    if jobs[0].limiter:
+        adaptive = jobs[0].limiter.snapshot()
+        print(f"Adaptive limit   {adaptive['limit']} ({adaptive['decreases']} decreases, "
+              f"last {adaptive['calls_per_minute'] or 0:.0f} calls/min)")
+    for job in jobs:
+        for index, error in job.row_errors[:3]:
+            print(f"  job {job.id} row {index + 1}: {error}")
+    return 1 if rows_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Local stand-in for the DashScope Generation HTTP API, for load tests without API costs.
+
+Speaks enough of POST /api/v1/services/aigc/text-generation/generation for
+utils.text_gen.generate_text: chat messages or a prompt, result_format=message,
+JSON mode and token usage. Titles are canned (built from the product data in the
+request, or taken from --titles). Latency, throttling (429) and server errors (5xx)
+are injected at configurable rates. GET /stats returns what was served so far.
+
+Point the app (or anything using the dashscope SDK) at it with:
+  DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8600/api/v1  DASHSCOPE_API_KEY=mock
+
+Examples:
+  python mock_dashscope.py                                   # lognormal latency, median 1.2s
+  python mock_dashscope.py --latency fixed:0.2 --rate-429 0.05 --rate-5xx 0.01
+  python mock_dashscope.py --latency uniform:0.5,3 --titles canned_titles.txt
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GENERATION_PATH = "/api/v1/services/aigc/text-generation/generation"
+
+DEFAULT_LATENCY = "lognormal:1.2,0.5"
+
+# Server errors injected at --rate-5xx (status, DashScope error code)
+SERVER_ERRORS = [(500, "InternalError"), (503, "ServiceUnavailable")]
+
+# Phrases combined into canned titles
+TITLE_ATTRIBUTES = [
+    "Heavy Duty", "Portable", "Industrial Grade", "Lightweight", "Durable", "Professional",
+    "Energy Saving", "Waterproof", "Compact Design", "High Performance", "Multi Function", "Smart",
+]
+TITLE_USES = [
+    "for Home and Office Use", "for Retail Stores", "for Outdoor Travel", "for Commercial Kitchens",
+    "for Warehouses and Factories", "for Daily Use", "for Wholesale Buyers", "for Hotels and Restaurants",
+]
+
+
+def parse_latency(spec: str):
+    """
+    Latency sampler from a spec string:
+      fixed:S            always S seconds
+      uniform:A,B        uniform between A and B seconds
+      lognormal:M,SIGMA  lognormal with median M seconds and log-space sigma SIGMA
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def canned_title(fields: dict, canned: list) -> str:
+    """One 80-120 character title containing the product's brand and keywords."""
+    brand, main_kw, core_kw = fields.get("Brand", ""), fields.get("Main Keyword", ""), fields.get("Core Keyword", "")
+    if canned:
+        return random.choice(canned).format(brand=brand, main_kw=main_kw, core_kw=core_kw)
+    attributes = random.sample(TITLE_ATTRIBUTES, len(TITLE_ATTRIBUTES))
+    title = f"{brand} {main_kw} - {attributes[0]} {core_kw} {random.choice(TITLE_USES)}"
+    extras = attributes[1:]
+    while len(title) < 90 and extras:
+        title += f" {extras.pop()}"
+    return title[:118].rsplit(" ", 1)[0] if len(title) > 118 else title
+
+
+def reply_content(body: dict, canned: list) -> str:
+    """Assistant reply for a generation request: a JSON title list or a single polished title."""
+    payload = body.get("input", {})
+    text = "\n".join(m.get("content", "") for m in payload.get("messages", [])) or payload.get("prompt", "")
+
+    # Product data lines ("- Brand: X") or the polish request's mandatory keywords
+    fields = dict(re.findall(r"^- (Brand|Main Keyword|Core Keyword): (.*)$", text, re.MULTILINE))
+    polish = re.search(r'Brand "(.*?)", Main Keyword "(.*?)", Core Keyword "(.*?)"', text)
+    if polish:
+        fields = dict(zip(["Brand", "Main Keyword", "Core Keyword"], polish.groups()))
+
+    if body.get("parameters", {}).get("response_format", {}).get("type") == "json_object":
+        count = int(re.search(r"Generate (\d+)", text).group(1)) if re.search(r"Generate (\d+)", text) else 5
+        return json.dumps({"titles": [canned_title(fields, canned) for _ in range(count)]})
+    return canned_title(fields, canned)
+
+
+class MockDashScopeServer(ThreadingHTTPServer):
+    """HTTP server holding the injection settings and the served-request statistics."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: str = DEFAULT_LATENCY, rate_429: float = 0.0, rate_5xx: float = 0.0,
+                 canned: list = None):
+        super().__init__(address, MockDashScopeHandler)
+        self.sample_latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.canned = canned or []
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        """Base URL for DASHSCOPE_HTTP_BASE_URL."""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/api/v1"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {"requests": 0, "status": {}, "latencies": [], "input_tokens": 0, "output_tokens": 0}
+
+    def record(self, status: int, latency: float, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+            self.stats["latencies"].append(latency)
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, status=dict(self.stats["status"]), latencies=list(self.stats["latencies"]))
+
+
+class MockDashScopeHandler(BaseHTTPRequestHandler):
+    server: MockDashScopeServer
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the load test output
+
+    def send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.server.snapshot())
+        else:
+            self.send_json(404, {"code": "NotFound", "message": self.path})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        request_id = uuid.uuid4().hex
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        if self.path != GENERATION_PATH:
+            self.send_json(404, {"request_id": request_id, "code": "NotFound", "message": self.path})
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self.send_json(401, {"request_id": request_id, "code": "InvalidApiKey", "message": "No API-key provided."})
+            self.server.record(401, time.perf_counter() - start)
+            return
+
+        # Throttling is decided up front and answered fast, like a rate limiter
+        roll = random.random()
+        if roll < self.server.rate_429:
+            self.send_json(429, {"request_id": request_id, "code": "Throttling.RateQuota",
+                                 "message": "Requests rate limit exceeded, please try again later."})
+            self.server.record(429, time.perf_counter() - start)
+            return
+
+        time.sleep(max(0.0, self.server.sample_latency()))
+        if roll < self.server.rate_429 + self.server.rate_5xx:
+            status, code = random.choice(SERVER_ERRORS)
+            self.send_json(status, {"request_id": request_id, "code": code, "message": "Injected server error."})
+            self.server.record(status, time.perf_counter() - start)
+            return
+
+        content = reply_content(body, self.server.canned)
+        prompt_text = json.dumps(body.get("input", {}), ensure_ascii=False)
+        usage = {"input_tokens": count_tokens(prompt_text), "output_tokens": count_tokens(content)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        self.send_json(200, {
+            "request_id": request_id,
+            "output": {"choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": content}}]},
+            "usage": usage,
+        })
+        self.server.record(200, time.perf_counter() - start, usage["input_tokens"], usage["output_tokens"])
+
+
+def serve_in_thread(port: int = 0, **options) -> MockDashScopeServer:
+    """Start a mock server on a background thread (port 0 picks a free port)."""
+    server = MockDashScopeServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-dashscope", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help=f"Latency spec (default: {DEFAULT_LATENCY})")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests answered with 500/503")
+    parser.add_argument("--titles", help="Text file of canned titles, one per line ({brand}, {main_kw}, {core_kw} are filled in)")
+    args = parser.parse_args()
+
+    canned = []
+    if args.titles:
+        with open(args.titles, encoding="utf-8") as f:
+            canned = [line.strip() for line in f if line.strip()]
+
+    server = MockDashScopeServer(("127.0.0.1", args.port), latency=args.latency, rate_429=args.rate_429,
+                                 rate_5xx=args.rate_5xx, canned=canned)
+    print(f"Mock DashScope listening on {server.url} (set DASHSCOPE_HTTP_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Shared fixtures. Run the suite from the repository root with `python -m pytest tests`.
+Tests that talk to the mock DashScope server are skipped when dashscope is not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class FakeLocalStorage:
+    """Dict-backed stand-in for streamlit_local_storage.LocalStorage, recording every write."""
+
+    def __init__(self):
+        self.items = {}
+        self.writes = []
+
+    def getItem(self, item_key):
+        return self.items.get(item_key)
+
+    def setItem(self, item_key, value, key=None):
+        self.items[item_key] = value
+        self.writes.append(item_key)
+
+
+@pytest.fixture
+def local_storage():
+    return FakeLocalStorage()
+
+
+@pytest.fixture
+def history_path(tmp_path):
+    return str(tmp_path / "title_history.json")
+
+
+@pytest.fixture(scope="session")
+def mock_server_session():
+    pytest.importorskip("dashscope")
+    from mock_dashscope import serve_in_thread
+
+    server = serve_in_thread(latency="fixed:0.01")
+    os.environ["DASHSCOPE_HTTP_BASE_URL"] = server.url
+    import dashscope
+    # dashscope reads the base URL when first imported; set it in case that already happened
+    dashscope.base_http_api_url = server.url
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_server(mock_server_session, monkeypatch):
+    """The mock DashScope server with no injected errors, fresh statistics and fast retries."""
+    import utils.text_gen as text_gen
+
+    mock_server_session.rate_429 = 0.0
+    mock_server_session.rate_5xx = 0.0
+    mock_server_session.reset_stats()
+    monkeypatch.setattr(text_gen, "RETRY_BASE_DELAY", 0.01)
+    return mock_server_session
@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from utils.analyzer import keyword_traffic
+
+REPORT = pd.DataFrame({
+    'Product Name': ["TechNova Wireless Earbuds Bluetooth", "Wireless Charger Pad", "EcoLife Bamboo Toothbrush"],
+    'Impressions': [1000, 300, 50],
+    'Clicks': [40, 9, 1],
+    'CTR': [0.04, 0.03, 0.02],
+})
+
+
+def test_traffic_sums_products_containing_every_word():
+    traffic = keyword_traffic(["wireless", "Wireless Earbuds", "bamboo toothbrush", "power bank", None], REPORT)
+    assert traffic.tolist() == [1300, 1000, 50, 0, 0]
+
+
+def test_metric_choice():
+    assert keyword_traffic(["wireless"], REPORT, metric='Clicks').tolist() == [49]
+    assert keyword_traffic(["wireless"], REPORT.drop(columns=['Impressions', 'Clicks']))[0] == pytest.approx(0.07)
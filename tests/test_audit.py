@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from utils.audit import (DEFAULT_REGENERATE_BELOW, REGENERATE_COLUMN, ROW_ID_COLUMN, SCORE_COLUMN, audit_catalog,
+                         regeneration_rows, score_titles)
+from utils.validator import calculate_seo_score
+
+VOCAB = ("the best new cheap hot sale wireless earbuds bluetooth headphones noise cancelling battery waterproof, "
+         "gym! LED usb power power bank: charger 5.0 Hot Sale cheap TechNova technova").split()
+
+
+def random_catalog(count, seed=1):
+    rng = random.Random(seed)
+    titles = [" ".join(rng.choice(VOCAB) for _ in range(rng.randint(1, 25))) for _ in range(count)]
+    titles = [t.capitalize() if i % 5 == 0 else t for i, t in enumerate(titles)]
+    titles[3] = None
+    brands = [rng.choice(["TechNova", "", None, "Eco-Life"]) for _ in range(count)]
+    mains = [rng.choice(["Wireless Earbuds", "power bank", None]) for _ in range(count)]
+    cores = [rng.choice(["Bluetooth 5.0", "charger", ""]) for _ in range(count)]
+    return titles, brands, mains, cores
+
+
+def test_matches_the_scalar_validator():
+    titles, brands, mains, cores = random_catalog(3000)
+    scores, reasons = score_titles(titles, brands, mains, cores)
+
+    for i, title in enumerate(titles):
+        # The scalar scorer sees missing cells as pandas does: NaN keywords, '' titles
+        expected = calculate_seo_score(title if title is not None else '',
+                                       brands[i] if brands[i] is not None else np.nan,
+                                       mains[i] if mains[i] is not None else np.nan, cores[i])
+        assert (scores[i], reasons[i]) == expected, title
+
+
+def test_scores_across_chunks(monkeypatch):
+    import utils.audit as audit
+    titles, brands, mains, cores = random_catalog(500, seed=2)
+    expected = score_titles(titles, brands, mains, cores)
+    monkeypatch.setattr(audit, "SCORE_CHUNK_ROWS", 64)
+    scores, reasons = score_titles(titles, brands, mains, cores)
+    assert np.array_equal(scores, expected[0])
+    assert reasons.tolist() == expected[1].tolist()
+
+
+def test_catalog_report():
+    titles, brands, mains, cores = random_catalog(200, seed=3)
+    listing = pd.DataFrame({'Title': titles, 'brand': brands, 'Main Keyword': mains, 'Core Keyword': cores})
+    report = audit_catalog(listing)
+
+    assert len(report) == len(listing)
+    assert report[SCORE_COLUMN].is_monotonic_increasing
+    in_sheet_order = report.sort_values(ROW_ID_COLUMN)
+    assert in_sheet_order[SCORE_COLUMN].tolist() == score_titles(titles, brands, mains, cores)[0].tolist()
+    flagged = regeneration_rows(report)
+    assert len(flagged) == int((report[SCORE_COLUMN] < DEFAULT_REGENERATE_BELOW).sum())
+    assert list(flagged.columns) == list(listing.columns.str.replace('brand', 'Brand'))
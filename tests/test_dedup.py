@@ -0,0 +1,78 @@
+import numpy as np
+
+from utils.dedup import find_near_duplicates
+from utils.results_store import DUPLICATE_COLUMN, NOTES_COLUMN, ROW_ID_COLUMN, SCORE_COLUMN, TITLE_COLUMN, ResultsStore
+
+BASE = "TechNova Wireless Earbuds Bluetooth Headphones with Noise Cancelling Deep Bass and Long Battery Life for Gym"
+TITLES = [
+    BASE + " Running",
+    "EcoLife Bamboo Toothbrush Pack of 4 Biodegradable Soft Bristles with Natural Wood Handle BPA Free",
+    BASE + " Workouts",
+    BASE.lower() + " running",
+    "PowerMax Power Bank 20000mAh USB C Fast Charger Portable Battery Pack for Phones and Tablets",
+]
+
+
+def result(row_id, title, score):
+    return {ROW_ID_COLUMN: row_id, TITLE_COLUMN: title, SCORE_COLUMN: score, NOTES_COLUMN: "", DUPLICATE_COLUMN: False}
+
+
+class TestFindNearDuplicates:
+    def test_clusters_keep_the_best_score(self):
+        representative, is_duplicate = find_near_duplicates(TITLES, [90, 100, 95, 80, 100])
+        assert is_duplicate.tolist() == [True, False, False, True, False]
+        assert representative.tolist() == [2, 1, 2, 2, 4]
+
+    def test_ties_keep_the_earliest_title(self):
+        representative, is_duplicate = find_near_duplicates(TITLES)
+        assert is_duplicate.tolist() == [False, False, True, True, False]
+        assert representative[[2, 3]].tolist() == [0, 0]
+
+    def test_threshold(self):
+        _, is_duplicate = find_near_duplicates(TITLES, threshold=0.999)
+        assert is_duplicate.tolist() == [False, False, False, True, False]
+
+    def test_small_inputs(self):
+        for titles in ([], ["Only one title"]):
+            representative, is_duplicate = find_near_duplicates(titles)
+            assert representative.tolist() == list(range(len(titles)))
+            assert not is_duplicate.any()
+
+
+class TestResultsStoreDedup:
+    def make_store(self):
+        store = ResultsStore()
+        store.append(result(row_id, title, score) for row_id, title, score in
+                     zip([1, 2, 3, 4, 5], TITLES, [90, 100, 95, 80, 100]))
+        return store
+
+    def test_flags_without_dropping(self):
+        store = self.make_store()
+        version = store.version
+        assert store.mark_near_duplicates() == 2
+        assert store.version > version
+        assert len(store) == 5
+        assert store.cross_row_count() == 2
+
+        frame = store.to_frame()
+        assert frame[DUPLICATE_COLUMN].tolist() == [True, False, False, True, False]
+        assert "第 3 行" in frame[NOTES_COLUMN][0]
+
+        # A second pass only reports titles it has not flagged before
+        version = store.version
+        assert store.mark_near_duplicates() == 0
+        assert store.version == version
+
+    def test_hidden_in_views_on_request(self):
+        store = self.make_store()
+        store.mark_near_duplicates()
+        assert store.to_frame(hide_cross_row=True)[ROW_ID_COLUMN].tolist() == [2, 3, 5]
+        assert store.query(hide_cross_row=True).tolist() == [1, 2, 4]
+        assert store.query().tolist() == [0, 1, 2, 3, 4]
+
+    def test_deleted_titles_are_not_counted(self):
+        store = self.make_store()
+        store.mark_near_duplicates()
+        store.apply_edits(np.array([0]), {'deleted_rows': [0]})
+        assert len(store) == 4
+        assert store.cross_row_count() == 1
@@ -0,0 +1,149 @@
+import time
+
+import pandas as pd
+import pytest
+
+import utils.job_runner as job_runner
+import utils.result_writer as result_writer
+from utils.job_runner import DONE, STOP_DEADLINE, STOP_TOKEN_BUDGET, JobManager
+from utils.title_history import TitleHistoryManager
+
+ROW_TOKENS = 1000
+
+
+class FakeGroupTitles:
+    """Stands in for generate_group_titles: each group takes `seconds` and uses ROW_TOKENS per row."""
+
+    def __init__(self, seconds=0.0, fail_rows=()):
+        self.seconds = seconds
+        self.fail_rows = set(fail_rows)
+        self.groups = []
+
+    def __call__(self, indices, row, config, history_manager, usage=None):
+        self.groups.append(list(indices))
+        time.sleep(self.seconds)
+        if self.fail_rows & set(indices):
+            raise RuntimeError("Error 500: Injected server error.")
+        usage.add(ROW_TOKENS * len(indices) // 2, ROW_TOKENS * len(indices) // 2, self.seconds)
+        return {i: [{"AI 生成标题 (AI Suggestions)": f"Title for row {i}", "原行号 (Row ID)": i + 1}] for i in indices}
+
+
+@pytest.fixture(autouse=True)
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_writer, "OUTPUT_DIR", str(tmp_path / "outputs"))
+
+
+def make_rows(count):
+    return [(i, pd.Series({'Brand': "TechNova", 'Main Keyword': f"Product {i}", 'Core Keyword': "Core"}, name=i))
+            for i in range(count)]
+
+
+def make_config(**overrides):
+    config = {'mode': "Mode A", 'extra_context': "", 'keyword_positions': None, 'starred_fields': [],
+              'num_titles': 1, 'api_key': "test-key", 'model_name': "qwen-flash", 'concurrency': 1}
+    config.update(overrides)
+    return config
+
+
+def run_job(rows, config, history, timeout=10.0):
+    job = JobManager(max_running=1).submit(rows, config, history)
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.02)
+    assert job.finished
+    return job
+
+
+@pytest.fixture
+def history(history_path):
+    return TitleHistoryManager(history_path)
+
+
+def test_all_rows_finish(history, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles())
+    job = run_job(make_rows(5), make_config(), history)
+
+    assert job.status == DONE
+    assert job.stop_reason is None
+    assert job.rows_done == 5
+    rows, cursor = job.rows_since(0)
+    assert sorted(index for index, _ in rows) == [0, 1, 2, 3, 4]
+    assert cursor == 5
+
+
+def test_failed_group_is_reported(history, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles(fail_rows=[1]))
+    job = run_job(make_rows(3), make_config(), history)
+
+    assert job.status == DONE
+    assert job.rows_done == 2
+    assert [index for index, _ in job.row_errors] == [1]
+    assert "Injected server error" in job.row_errors[0][1]
+
+
+def test_deadline_stops_starting_rows(history, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles(seconds=0.1))
+    job = run_job(make_rows(50), make_config(deadline_seconds=0.35), history)
+
+    assert job.status == DONE
+    assert job.stop_reason == STOP_DEADLINE
+    # Rows are only started when an average row still fits before the deadline
+    assert 2 <= job.rows_done <= 3
+    assert job.finished_at - job.started_at < 0.6
+    assert job.progress()['stop_reason'] == STOP_DEADLINE
+
+
+def test_token_budget_stops_starting_rows(history, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles())
+    job = run_job(make_rows(20), make_config(token_budget=ROW_TOKENS * 4.5), history)
+
+    assert job.stop_reason == STOP_TOKEN_BUDGET
+    assert job.rows_done == 4
+    assert job.usage.total_tokens <= ROW_TOKENS * 4.5
+
+
+def test_budget_counts_rows_in_flight(history, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles(seconds=0.05))
+    job = run_job(make_rows(20), make_config(token_budget=ROW_TOKENS * 6.5, concurrency=4), history)
+
+    # Rows already running are expected to cost an average row each, so the budget holds
+    assert job.stop_reason == STOP_TOKEN_BUDGET
+    assert 4 <= job.rows_done <= 6
+    assert job.usage.total_tokens <= ROW_TOKENS * 6.5
+
+
+def test_identical_rows_run_as_one_group(history, monkeypatch):
+    fake = FakeGroupTitles()
+    monkeypatch.setattr(job_runner, "generate_group_titles", fake)
+    rows = make_rows(3) + [(3, make_rows(1)[0][1].rename(3))]
+    job = run_job(rows, make_config(), history)
+
+    assert job.rows_done == 4
+    assert sorted(map(sorted, fake.groups)) == [[0, 3], [1], [2]]
+
+
+def test_worker_loads_only_server_side_history(history_path, local_storage, monkeypatch):
+    monkeypatch.setattr(job_runner, "generate_group_titles", FakeGroupTitles())
+    file_history = TitleHistoryManager(history_path, lazy_load=True)
+    run_job(make_rows(1), make_config(), file_history)
+    assert file_history._titles is not None
+
+    browser_history = TitleHistoryManager(history_path, local_storage=local_storage, lazy_load=True)
+    run_job(make_rows(1), make_config(), browser_history)
+    assert browser_history._titles is None
+
+
+def test_rows_use_the_session_terms(history, monkeypatch):
+    from utils.terms import TermDictionary, get_terms
+
+    seen = []
+    fake = FakeGroupTitles()
+
+    def generate(*args, **kwargs):
+        seen.append(get_terms())
+        return fake(*args, **kwargs)
+
+    monkeypatch.setattr(job_runner, "generate_group_titles", generate)
+    session_terms = TermDictionary([("premium", "spam")])
+    run_job(make_rows(2), make_config(terms=session_terms, concurrency=2), history)
+    assert seen == [session_terms, session_terms]
@@ -0,0 +1,39 @@
+import datetime
+
+import pandas as pd
+
+from utils.keyword_store import KeywordStore, week_of
+
+REPORT = pd.DataFrame({'Product Name': ["Wireless Earbuds Bluetooth", "Wireless Charger Pad"],
+                       'Impressions': [1000, 500], 'Clicks': [50, 10]})
+MONDAY = datetime.date(2026, 10, 5)
+
+
+def test_merges_totals_per_week(tmp_path):
+    store = KeywordStore(str(tmp_path / "keywords.db"))
+    result = store.merge_report(REPORT, day=MONDAY + datetime.timedelta(days=3), name="week 41")
+    assert result == {'week': week_of(MONDAY), 'products': 2, 'keywords': 9, 'duplicate': False}
+
+    top = store.top_keywords(order='impressions', today=MONDAY).set_index('keyword')
+    assert top.loc['wireless', 'impressions'] == 1500
+    assert top.loc['wireless', 'clicks'] == 60
+    assert top.loc['wireless earbuds', 'products'] == 1
+
+
+def test_report_imported_again_under_another_week_is_rejected(tmp_path):
+    store = KeywordStore(str(tmp_path / "keywords.db"))
+    store.merge_report(REPORT, day=MONDAY)
+
+    result = store.merge_report(REPORT, day=MONDAY + datetime.timedelta(weeks=1))
+    assert result['duplicate']
+    assert result['week'] == week_of(MONDAY)
+    top = store.top_keywords(order='impressions').set_index('keyword')
+    assert top.loc['wireless', 'impressions'] == 1500
+    assert top.loc['wireless', 'weeks'] == 1
+    assert store.reports()['week'].tolist() == [week_of(MONDAY)]
+
+
+def test_changed_report_is_not_a_duplicate(tmp_path):
+    store = KeywordStore(str(tmp_path / "keywords.db"))
+    store.merge_report(REPORT, day=MONDAY)
+    assert not store.merge_report(REPORT.assign(Clicks=[60, 10]), day=MONDAY)['duplicate']
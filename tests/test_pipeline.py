@@ -0,0 +1,196 @@
+import json
+
+import pandas as pd
+import pytest
+
+import utils.pipeline as pipeline
+from utils.prompt_builder import TRUNCATION_MARK, compile_product_sections, product_section_of, truncate_text
+from utils.title_history import TitleHistoryManager
+
+GOOD_TITLES = [
+    "TechNova Wireless Earbuds Bluetooth Headphones with Noise Cancelling Deep Bass and Long Battery Life for Gym Running",
+    "TechNova Wireless Earbuds Bluetooth Headphones with Noise Cancelling Deep Bass and Long Battery Life for Gym Workouts",
+    "TechNova Wireless Earbuds Bluetooth Headphones Waterproof Sport Design with Charging Case and Touch Control for Travel",
+    "TechNova Wireless Earbuds Bluetooth Headphones Compact Fit for Small Ears Clear Calls and Quick Pairing with Phones",
+]
+WEAK_TITLE = "Wireless earbuds cheap"
+
+ROW = pd.Series({'Brand': "TechNova", 'Main Keyword': "Wireless Earbuds", 'Core Keyword': "Bluetooth Headphones",
+                 'Selling Points': "Noise cancelling, 24h battery"}, name=0)
+
+
+def make_config(**overrides):
+    config = {'mode': "Mode A", 'extra_context': "", 'keyword_positions': None, 'starred_fields': [],
+              'num_titles': 2, 'api_key': "test-key", 'model_name': "qwen-flash"}
+    config.update(overrides)
+    return config
+
+
+class FakeGenerate:
+    """Stands in for generate_text, answering with scripted replies (lists become a titles JSON object)."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def __call__(self, prompt, *args, **kwargs):
+        self.calls += 1
+        reply = self.replies.pop(0)
+        return json.dumps({'titles': reply}) if isinstance(reply, list) else reply
+
+
+@pytest.fixture
+def history(history_path):
+    return TitleHistoryManager(history_path)
+
+
+class TestGeneration:
+    def test_top_up_asks_for_the_missing_titles(self, history, monkeypatch):
+        fake = FakeGenerate(GOOD_TITLES[:1], GOOD_TITLES[2:3])
+        monkeypatch.setattr(pipeline, "generate_text", fake)
+
+        results = pipeline.generate_row_titles(0, ROW, make_config(), history)
+        assert fake.calls == 2
+        assert [r["AI 生成标题 (AI Suggestions)"] for r in results] == [GOOD_TITLES[0], GOOD_TITLES[2]]
+
+    def test_parse_titles(self):
+        reply = '```json\n{"titles": ["1. ' + GOOD_TITLES[0] + '", 42, "short", "' + GOOD_TITLES[2] + '"]}\n```'
+        assert pipeline.parse_titles(reply) == [GOOD_TITLES[0], GOOD_TITLES[2]]
+        assert pipeline.parse_titles("Sorry, I cannot help") == []
+        assert pipeline.parse_titles('{"items": []}') == []
+        assert pipeline.parse_titles('{"titles": [') == []
+
+    def test_top_up_avoids_earlier_titles(self):
+        assert "exactly 3 titles" in pipeline.titles_task(3)
+        assert f"- {GOOD_TITLES[0]}" in pipeline.titles_task(1, [GOOD_TITLES[0]])
+
+
+class TestGroups:
+    def test_members_take_turns(self, history, monkeypatch):
+        monkeypatch.setattr(pipeline, "generate_text", FakeGenerate(GOOD_TITLES[:1] + GOOD_TITLES[2:]))
+
+        results = pipeline.generate_group_titles([3, 7], ROW, make_config(num_titles=1), history)
+        assert [r["原行号 (Row ID)"] for r in results[3] + results[7]] == [4, 8]
+        assert [t['product_id'] for t in history.titles] == ["Row-4", "Row-8"]
+
+    def test_failed_first_request_fails_the_row(self, history, monkeypatch):
+        monkeypatch.setattr(pipeline, "generate_text", FakeGenerate("Error 401: Invalid API key"))
+
+        with pytest.raises(RuntimeError, match="Invalid API key"):
+            pipeline.generate_row_titles(0, ROW, make_config(), history)
+        assert history.get_all_titles() == []
+
+    def test_failed_top_up_leaves_no_titles_in_history(self, history, monkeypatch):
+        monkeypatch.setattr(pipeline, "generate_text", FakeGenerate(GOOD_TITLES[:1], "Error Throttling: rate limited"))
+
+        with pytest.raises(RuntimeError, match="1/2"):
+            pipeline.generate_row_titles(0, ROW, make_config(), history)
+        assert history.get_all_titles() == []
+
+    def test_identical_rows_share_a_group_key(self):
+        keys = pipeline.row_keys_for([(0, ROW), (1, ROW.rename(1))], make_config())
+        assert pipeline.group_key(keys[1]) == keys[0]
+        assert pipeline.group_key(keys[0]) == keys[0]
+
+
+class TestRowKeys:
+    def test_fingerprint_follows_content_and_settings(self):
+        moved = ROW.rename(5)
+        assert pipeline.row_fingerprint(moved, make_config()) == pipeline.row_fingerprint(ROW, make_config())
+        assert pipeline.row_fingerprint(ROW, make_config(num_titles=3)) != pipeline.row_fingerprint(ROW, make_config())
+        changed = ROW.replace("TechNova", "EcoLife")
+        assert pipeline.row_fingerprint(changed, make_config()) != pipeline.row_fingerprint(ROW, make_config())
+
+    def test_identical_rows_get_their_own_keys(self):
+        rows = [(0, ROW), (1, ROW.rename(1)), (2, ROW.rename(2).replace("TechNova", "EcoLife"))]
+        keys = pipeline.row_keys_for(rows, make_config())
+        assert keys[1] == f"{keys[0]}#2"
+        assert len(set(keys.values())) == 3
+
+
+class TestPromptCompiler:
+    def test_batch_matches_single_rows(self):
+        df = pd.DataFrame({
+            'Brand': ["TechNova", "EcoLife", None],
+            'Main Keyword': ["Wireless Earbuds", "Bamboo Toothbrush", "Power Bank"],
+            'Core Keyword': ["Bluetooth Headphones", "Soft Bristles", "USB C Charger"],
+            'Selling Points': ["Noise cancelling.  24h battery", None, "x" * 2000],
+            'Attributes': ["Black\nwaterproof", "Natural wood handle", ""],
+            'Notes': ["Long notes. " * 200, "Short", float('nan')],
+        })
+        starred = ['Selling Points', 'Missing Column']
+        sections = compile_product_sections(df, starred)
+        for index, row in df.iterrows():
+            assert sections[index] == product_section_of(row, starred)
+        assert "STARRED FIELDS" in sections[0]
+        assert TRUNCATION_MARK in sections[2]
+
+    def test_truncate_text(self):
+        assert truncate_text("Short text", 50) == "Short text"
+        text = "First sentence is here. Second sentence is a good deal longer than the first one."
+        assert truncate_text(text, 40) == "First sentence is here." + TRUNCATION_MARK
+        cut = truncate_text("word " * 30, 42)
+        assert len(cut) <= 42
+        assert cut.endswith("word" + TRUNCATION_MARK)
+
+    def test_field_budgets(self):
+        df = pd.DataFrame({'Brand': ["TechNova"], 'Main Keyword': ["Earbuds"], 'Core Keyword': ["Headphones"],
+                           'Selling Points': ["Noise cancelling and a long battery life"]})
+        section = compile_product_sections(df, field_budgets={'Selling Points': 20})[0]
+        assert section == product_section_of(df.iloc[0], field_budgets={'Selling Points': 20})
+        assert "- Selling Points: Noise" in section
+        assert "battery" not in section
+
+    def test_precompiled_section_is_used(self, history, monkeypatch):
+        prompts = []
+        fake = FakeGenerate([GOOD_TITLES[0], GOOD_TITLES[2]])
+        monkeypatch.setattr(pipeline, "generate_text", lambda prompt, *a, **k: (prompts.append(prompt), fake(prompt))[1])
+        sections = pd.Series({0: "Product Data: precompiled"})
+
+        pipeline.generate_row_titles(0, ROW, make_config(product_sections=sections), history)
+        assert "Product Data: precompiled" in prompts[0][-1]['content']
+
+
+class TestSelectDiverse:
+    def test_skips_near_duplicates_of_picked_titles(self):
+        candidates = [{'title': GOOD_TITLES[0], 'score': 100}, {'title': GOOD_TITLES[1], 'score': 100},
+                      {'title': GOOD_TITLES[2], 'score': 85}]
+        picked = pipeline.select_diverse(candidates, 2)
+        assert [c['title'] for c in picked] == [GOOD_TITLES[0], GOOD_TITLES[2]]
+
+    def test_respects_titles_chosen_before(self):
+        candidates = [{'title': GOOD_TITLES[1], 'score': 100}, {'title': GOOD_TITLES[3], 'score': 90}]
+        picked = pipeline.select_diverse(candidates, 2, chosen=[GOOD_TITLES[0]])
+        assert [c['title'] for c in picked] == [GOOD_TITLES[3]]
+
+    def test_prefers_higher_scores(self):
+        candidates = [{'title': WEAK_TITLE, 'score': 60}, {'title': GOOD_TITLES[2], 'score': 100}]
+        assert pipeline.select_diverse(candidates, 1) == [candidates[1]]
+
+
+class TestOvergeneration:
+    def test_ranks_candidates_without_polishing(self, history, monkeypatch):
+        fake = FakeGenerate([WEAK_TITLE] + GOOD_TITLES + [WEAK_TITLE])
+        monkeypatch.setattr(pipeline, "generate_text", fake)
+
+        results = pipeline.generate_row_titles(0, ROW, make_config(overgenerate=True), history)
+        titles = [r["AI 生成标题 (AI Suggestions)"] for r in results]
+        assert fake.calls == 1
+        assert len(titles) == 2
+        assert all(r["SEO 得分"] == 100 for r in results)
+        assert not pipeline.check_duplication(titles[0], [titles[1]], pipeline.DUPLICATE_THRESHOLD)[0]
+        assert history.get_all_titles() == titles
+
+    def test_group_members_share_the_candidates(self, history, monkeypatch):
+        monkeypatch.setattr(pipeline, "generate_text", FakeGenerate(GOOD_TITLES))
+
+        results = pipeline.generate_group_titles([3, 7], ROW, make_config(overgenerate=True, num_titles=1), history)
+        assert [len(results[3]), len(results[7])] == [1, 1]
+        assert results[3][0]["AI 生成标题 (AI Suggestions)"] != results[7][0]["AI 生成标题 (AI Suggestions)"]
+
+    def test_failed_top_up_fails_the_group(self, history, monkeypatch):
+        monkeypatch.setattr(pipeline, "generate_text", FakeGenerate(GOOD_TITLES[:1], "Error Throttling: rate limited"))
+
+        with pytest.raises(RuntimeError, match="1/2"):
+            pipeline.generate_row_titles(0, ROW, make_config(overgenerate=True), history)
+        assert history.get_all_titles() == []
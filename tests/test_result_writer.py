@@ -0,0 +1,42 @@
+import pandas as pd
+
+import utils.job_runner as job_runner
+import utils.result_writer as result_writer
+from utils.result_writer import FLUSH_ROWS, ResultWriter
+from utils.results_store import ROW_ID_COLUMN, TITLE_COLUMN
+
+
+def results_for(index):
+    return [{ROW_ID_COLUMN: index + 1, TITLE_COLUMN: f"Title {index} {n}"} for n in range(2)]
+
+
+def test_rows_are_flushed_in_batches(tmp_path):
+    writer = ResultWriter("job", str(tmp_path))
+    flushes = [writer.append(i, results_for(i)) for i in range(FLUSH_ROWS)]
+    assert flushes == [False] * (FLUSH_ROWS - 1) + [True]
+    writer.flush()
+    assert writer.written_rows == FLUSH_ROWS
+    assert writer.read_rows(10, 12) == [(10, results_for(10)), (11, results_for(11))]
+
+
+def test_close_writes_csv_and_xlsx(tmp_path):
+    writer = ResultWriter("job", str(tmp_path))
+    for i in range(3):
+        writer.append(i, results_for(i))
+    writer.close()
+    assert len(pd.read_csv(writer.csv_path)) == 6
+    assert pd.read_excel(writer.xlsx_path)[TITLE_COLUMN].tolist() == pd.read_csv(writer.csv_path)[TITLE_COLUMN].tolist()
+
+
+def test_job_memory_keeps_a_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_writer, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(job_runner, "RESULT_WINDOW_ROWS", 5)
+    job = job_runner.Job([], {'api_key': "test-key", 'model_name': "qwen-flash"}, history_manager=None)
+    job.writer = ResultWriter(job.id)
+    for i in range(2 * FLUSH_ROWS):
+        job._record_row(i, results_for(i))
+
+    assert len(job._row_log) < 2 * FLUSH_ROWS
+    rows, cursor = job.rows_since(0)
+    assert cursor == 2 * FLUSH_ROWS
+    assert [index for index, _ in rows] == list(range(2 * FLUSH_ROWS))
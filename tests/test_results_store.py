@@ -0,0 +1,36 @@
+import numpy as np
+
+from utils.results_store import NOTES_COLUMN, ROW_ID_COLUMN, SCORE_COLUMN, TITLE_COLUMN, ResultsStore
+
+
+def make_store():
+    store = ResultsStore()
+    store.append({ROW_ID_COLUMN: i // 2 + 1, TITLE_COLUMN: f"Title {i}", SCORE_COLUMN: score, NOTES_COLUMN: ""}
+                 for i, score in enumerate([100, 70, 95, 85, 60, 90]))
+    return store
+
+
+def test_query_filters_and_sorts():
+    store = make_store()
+    assert store.query(row_id=2).tolist() == [2, 3]
+    assert store.query(score_band=(85, 95)).tolist() == [2, 3, 5]
+    assert store.query(sort_by=SCORE_COLUMN).tolist() == [4, 1, 3, 5, 2, 0]
+
+
+def test_pages():
+    store = make_store()
+    frame, ids = store.page(store.query(), 1, 4)
+    assert ids.tolist() == [4, 5]
+    assert frame[TITLE_COLUMN].tolist() == ["Title 4", "Title 5"]
+
+
+def test_editor_changes():
+    store = make_store()
+    version = store.version
+    page_ids = np.array([2, 3])
+    store.apply_edits(page_ids, {'edited_rows': {0: {TITLE_COLUMN: "Edited"}}, 'deleted_rows': [1],
+                                 'added_rows': [{TITLE_COLUMN: "Added", SCORE_COLUMN: 50}]})
+    assert store.version > version
+    assert len(store) == 6
+    frame = store.to_frame()
+    assert frame[TITLE_COLUMN].tolist() == ["Title 0", "Title 1", "Edited", "Title 4", "Title 5", "Added"]
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from utils.settings import LOCAL_STORAGE_KEY, Settings, SettingsStore
+
+
+def test_invalid_stored_values_fall_back_to_defaults():
+    settings = Settings.from_dict({'num_titles': 99, 'model_name': "qwen-max", 'unknown': 1, 'overgenerate': "yes"})
+    assert settings.num_titles == Settings.num_titles
+    assert settings.model_name == "qwen-max"
+    assert settings.overgenerate is False
+
+
+def test_update_rejects_invalid_values(tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    with pytest.raises(ValueError):
+        store.update(concurrency=0)
+
+
+def test_writes_are_debounced_unless_forced(local_storage, tmp_path):
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    store.update(num_titles=3)
+    assert store.flush(local_storage)
+    store.update(api_key="sk-test")
+    assert not store.flush(local_storage)
+    assert json.loads(local_storage.items[LOCAL_STORAGE_KEY])['api_key'] == ""
+    assert store.flush(local_storage, force=True)
+    assert json.loads(local_storage.items[LOCAL_STORAGE_KEY])['api_key'] == "sk-test"
+
+
+def test_api_key_stays_out_of_the_server_file(tmp_path):
+    path = str(tmp_path / "settings.json")
+    store = SettingsStore(path)
+    store.update(api_key="sk-test", num_titles=3)
+    assert store.flush(force=True)
+
+    reloaded = SettingsStore(path)
+    assert reloaded.load()
+    assert reloaded.settings.num_titles == 3
+    assert reloaded.settings.api_key == ""
+
+
+def test_browser_load_keeps_values_changed_in_the_session(local_storage, tmp_path):
+    local_storage.items[LOCAL_STORAGE_KEY] = json.dumps({'num_titles': 7, 'model_name': "qwen-plus"})
+    store = SettingsStore(str(tmp_path / "settings.json"))
+    store.update(model_name="qwen-max")
+    assert store.load(local_storage)
+    assert (store.settings.num_titles, store.settings.model_name) == (7, "qwen-max")
@@ -0,0 +1,53 @@
+import threading
+
+import pandas as pd
+
+from utils.audit import score_titles
+from utils.terms import SPAM, TermDictionary, get_terms, load_terms, use_terms
+from utils.validator import calculate_seo_score, fix_acronyms
+
+TITLE = "TechNova Wireless Earbuds Bluetooth Headphones Premium Sound with Noise Cancelling and Long Battery Life for Gym"
+
+
+def test_matching_is_word_based_and_case_insensitive():
+    terms = TermDictionary([("hot sale", SPAM), ("wi-fi", "acronym"), ("LED", "acronym")])
+    assert terms.distinct_terms("HOT SALE led strip", SPAM) == ["hot sale"]
+    assert terms.distinct_terms("hotsale", SPAM) == []
+    assert terms.apply_casing("led lamp with wi-fi") == "LED lamp with wi-fi"
+
+
+def test_uploaded_terms_stay_in_the_session(tmp_path):
+    path = tmp_path / "terms.csv"
+    pd.DataFrame({'term': ["premium", "", "ACME"], 'category': ["spam", "spam", "unknown"]}).to_csv(path, index=False)
+    session_terms, report = load_terms(str(path))
+    assert report == {'added': 1, 'skipped': 2}
+
+    assert "premium" in session_terms.terms(SPAM)
+    assert "premium" not in get_terms().terms(SPAM)
+    assert "违禁词'premium'" not in calculate_seo_score(TITLE, "TechNova", "Wireless Earbuds", "Bluetooth Headphones")[1]
+
+    with use_terms(session_terms):
+        score, notes = calculate_seo_score(TITLE, "TechNova", "Wireless Earbuds", "Bluetooth Headphones")
+        assert "违禁词'premium'" in notes
+        assert score_titles([TITLE], ["TechNova"], ["Wireless Earbuds"], ["Bluetooth Headphones"])[0][0] == score
+
+        # Other threads (other sessions) keep the process-wide dictionary
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(get_terms()))
+        thread.start()
+        thread.join()
+        assert seen[0] is not session_terms
+    assert get_terms() is not session_terms
+
+
+def test_uploads_build_on_the_session_dictionary(tmp_path):
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    pd.DataFrame({'term': ["premium"], 'category': ["spam"]}).to_csv(first, index=False)
+    pd.DataFrame({'term': ["HDMI"], 'category': ["acronym"]}).to_csv(second, index=False)
+    session_terms, _ = load_terms(str(first))
+    session_terms, _ = load_terms(str(second), session_terms)
+
+    with use_terms(session_terms):
+        assert fix_acronyms("hdmi cable") == "HDMI cable"
+        assert "premium" in get_terms().terms(SPAM)
+    assert fix_acronyms("hdmi cable") == "hdmi cable"
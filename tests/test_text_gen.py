@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+import types
+import urllib.error
+import urllib.request
+
+import pytest
+
+import utils.text_gen as text_gen
+from utils.text_gen import ADAPTIVE_WINDOW_CALLS, MAX_RETRIES, AdaptiveLimiter, TokenUsage, generate_text
+
+
+class ScriptedRolls:
+    """Replaces the mock server's random module, so the server's error injection follows a script."""
+
+    def __init__(self, rolls):
+        self._rolls = iter(rolls)
+
+    def random(self):
+        return next(self._rolls, 0.99)
+
+    def __getattr__(self, name):
+        return getattr(random, name)
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self, mock_server, monkeypatch):
+        import mock_dashscope
+        mock_server.rate_5xx = 0.5
+        monkeypatch.setattr(mock_dashscope, "random", ScriptedRolls([0.1, 0.1]))
+        usage = TokenUsage()
+
+        reply = generate_text("Say hello", api_key="test-key", usage=usage)
+        assert not text_gen.is_error_reply(reply)
+        assert usage.retries == 2
+        assert usage.calls == 1
+        assert usage.total_tokens > 0
+        assert mock_server.snapshot()['requests'] == 3
+
+    def test_gives_up_after_max_retries(self, mock_server):
+        mock_server.rate_5xx = 1.0
+        usage = TokenUsage()
+
+        reply = generate_text("Say hello", api_key="test-key", usage=usage)
+        assert text_gen.is_error_reply(reply)
+        assert usage.retries == MAX_RETRIES
+        assert usage.calls == 0
+        assert mock_server.snapshot()['requests'] == MAX_RETRIES + 1
+
+    def test_missing_api_key(self, monkeypatch):
+        monkeypatch.delenv("DASHSCOPE_API_KEY", raising=False)
+        assert text_gen.is_error_reply(generate_text("Say hello", api_key=None))
+
+
+def test_mock_server_requires_an_api_key(mock_server):
+    request = urllib.request.Request(mock_server.url + "/services/aigc/text-generation/generation",
+                                     data=json.dumps({'input': {'prompt': "Say hello"}}).encode(), method="POST")
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+    assert error.value.code == 401
+
+
+def test_identical_requests_are_sent_separately(mock_server):
+    usages = [TokenUsage() for _ in range(3)]
+    threads = [threading.Thread(target=generate_text, args=("Identical prompt", "test-key"), kwargs={'usage': u})
+               for u in usages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mock_server.snapshot()['requests'] == 3
+    assert [u.calls for u in usages] == [1, 1, 1]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(text_gen, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def run_window(limiter, clock, capacity=None, seconds=1.0):
+    """
+    One measurement window of a service that takes `seconds` per call and serves at
+    most `capacity` calls at once (unlimited if None): the limit's worth of calls run
+    side by side, ADAPTIVE_WINDOW_CALLS times.
+    """
+    for _ in range(ADAPTIVE_WINDOW_CALLS):
+        level = limiter.limit
+        for _ in range(level):
+            limiter.acquire()
+        clock.now += seconds * (1 if capacity is None else max(1, level / capacity))
+        for _ in range(level):
+            limiter.release(seconds)
+
+
+class TestAdaptiveLimiter:
+    def test_grows_while_throughput_grows(self, clock):
+        limiter = AdaptiveLimiter(max_limit=6, initial=2)
+        for _ in range(10):
+            run_window(limiter, clock)
+        assert limiter.limit == 6
+        assert limiter.decreases == 0
+
+    def test_settles_at_the_service_capacity(self, clock):
+        limiter = AdaptiveLimiter(max_limit=16, initial=2)
+        for _ in range(20):
+            run_window(limiter, clock, capacity=4)
+        assert limiter.limit == 4
+
+    def test_throttling_halves_once_per_burst(self, clock):
+        limiter = AdaptiveLimiter(max_limit=16, initial=8)
+        for _ in range(3):
+            limiter.acquire()
+        limiter.release(1.0, throttled=True)
+        assert limiter.limit == 4
+        # The rest of the same burst doesn't count again
+        limiter.release(1.0, throttled=True)
+        limiter.release(1.0, throttled=True)
+        assert limiter.limit == 4
+        assert limiter.decreases == 1
+
+        for expected in (2, 1, 1):
+            clock.now += 2.0
+            limiter.acquire()
+            limiter.release(1.0, throttled=True)
+            assert limiter.limit == expected
+
+    def test_latency_spike_decreases(self, clock):
+        limiter = AdaptiveLimiter(max_limit=16, initial=4)
+        limiter.acquire()
+        limiter.release(1.0)
+        clock.now += 5.0
+        limiter.acquire()
+        limiter.release(10.0)
+        assert limiter.limit == 2
+        assert limiter.snapshot()['decreases'] == 1
+
+    def test_acquire_waits_for_a_slot(self):
+        limiter = AdaptiveLimiter(max_limit=1, initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        waiter.start()
+        assert not acquired.wait(0.1)
+        limiter.release(0.1)
+        assert acquired.wait(2)
+        waiter.join()
+        assert limiter.snapshot()['in_flight'] == 1
+
+    def test_throttled_calls_lower_the_limit(self, mock_server):
+        mock_server.rate_429 = 1.0
+        limiter = AdaptiveLimiter(max_limit=16, initial=8)
+
+        reply = generate_text("Say hello", api_key="test-key", limiter=limiter)
+        assert text_gen.is_error_reply(reply)
+        assert limiter.limit < 8
+        assert limiter.snapshot()['in_flight'] == 0
@@ -0,0 +1,186 @@
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+import utils.title_history as title_history
+from utils.history_db import HistoryDatabase
+from utils.title_history import LOCALSTORAGE_CHUNK_RECORDS, LOCALSTORAGE_KEY, TitleHistoryManager
+
+
+def make_titles(count, prefix="Title"):
+    return [f"{prefix} number {i} for the history" for i in range(count)]
+
+
+class TestBrowserStorage:
+    def test_round_trip_in_chunks(self, local_storage, history_path):
+        titles = make_titles(2 * LOCALSTORAGE_CHUNK_RECORDS + 1)
+        manager = TitleHistoryManager(history_path, local_storage=local_storage)
+        manager.add_titles(titles, brand="TechNova")
+        manager.save_history()
+
+        manifest = json.loads(local_storage.items[LOCALSTORAGE_KEY])
+        assert manifest['chunks'] == 3
+        assert manifest['total_count'] == len(titles)
+
+        reloaded = TitleHistoryManager(history_path, local_storage=local_storage)
+        assert reloaded.get_all_titles() == titles
+        assert reloaded.titles[0]['brand'] == "TechNova"
+        assert reloaded.check_similarity(titles[-1])[0]
+
+    def test_save_only_sends_the_open_chunk(self, local_storage, history_path):
+        manager = TitleHistoryManager(history_path, local_storage=local_storage)
+        manager.add_titles(make_titles(LOCALSTORAGE_CHUNK_RECORDS + 10))
+        manager.save_history()
+
+        local_storage.writes.clear()
+        manager.add_title("One more title for the history")
+        manager.save_history()
+        assert local_storage.writes == [f"{LOCALSTORAGE_KEY}_1", LOCALSTORAGE_KEY]
+
+        local_storage.writes.clear()
+        manager.save_history()
+        assert local_storage.writes == []
+
+        reloaded = TitleHistoryManager(history_path, local_storage=local_storage)
+        assert len(reloaded.titles) == LOCALSTORAGE_CHUNK_RECORDS + 11
+
+    def test_legacy_blob_is_migrated(self, local_storage, history_path):
+        titles = make_titles(3)
+        local_storage.items[LOCALSTORAGE_KEY] = json.dumps({'titles': [{'title': t, 'title_lower': t.lower()} for t in titles]})
+        manager = TitleHistoryManager(history_path, local_storage=local_storage)
+        assert manager.get_all_titles() == titles
+
+        manager.add_title("A new title after the migration")
+        manager.save_history()
+        manifest = json.loads(local_storage.items[LOCALSTORAGE_KEY])
+        assert manifest['chunks'] == 1
+        assert len(TitleHistoryManager(history_path, local_storage=local_storage).titles) == 4
+
+    def test_overflow_falls_back_to_the_file(self, local_storage, history_path, monkeypatch):
+        monkeypatch.setattr(title_history, "LOCALSTORAGE_BUDGET_BYTES", 100)
+        manager = TitleHistoryManager(history_path, local_storage=local_storage)
+        manager.add_titles(make_titles(50))
+        manager.save_history()
+
+        assert json.loads(local_storage.items[LOCALSTORAGE_KEY])['overflow']
+        reloaded = TitleHistoryManager(history_path, local_storage=local_storage)
+        assert len(reloaded.titles) == 50
+
+
+class TestImport:
+    def test_csv_import_deduplicates(self, tmp_path, history_path):
+        path = tmp_path / "titles.csv"
+        pd.DataFrame({'Title': ["Alpha title", "alpha  TITLE", "Beta title", "", "Gamma title"]}).to_csv(path, index=False)
+        manager = TitleHistoryManager(history_path)
+        manager.add_title("Gamma title")
+
+        report = manager.import_titles(str(path), chunk_rows=2)
+        assert report['imported'] == 2
+        assert report['duplicates'] == 2
+        assert report['rejected'] == 1
+        assert report['rows_read'] == 5
+        assert manager.get_all_titles() == ["Gamma title", "Alpha title", "Beta title"]
+
+    def test_csv_with_late_latin1_byte(self, tmp_path, history_path, monkeypatch):
+        # The only non-UTF-8 byte comes after the first encoding-check block and the first chunks
+        monkeypatch.setattr(title_history, "CSV_ENCODING_BLOCK_BYTES", 64)
+        path = tmp_path / "latin1.csv"
+        lines = [b"title"] + [f"Plain ascii title {i}".encode() for i in range(30)] + [b"Caf\xe9 title"]
+        path.write_bytes(b"\n".join(lines) + b"\n")
+
+        manager = TitleHistoryManager(history_path)
+        report = manager.import_titles(str(path), chunk_rows=7)
+        assert report['imported'] == 31
+        assert report['duplicates'] == 0
+        assert len(manager.titles) == 31
+        assert manager.get_all_titles()[-1] == "Café title"
+
+    def test_excel_import(self, tmp_path, history_path):
+        path = tmp_path / "titles.xlsx"
+        pd.DataFrame({'Product Name': ["Alpha title", "Beta title", "ALPHA title"]}).to_excel(path, index=False)
+
+        manager = TitleHistoryManager(history_path)
+        report = manager.import_titles(str(path))
+        assert report['imported'] == 2
+        assert report['duplicates'] == 1
+        assert manager.get_all_titles() == ["Alpha title", "Beta title"]
+
+    def test_missing_title_column(self, tmp_path, history_path):
+        path = tmp_path / "other.csv"
+        pd.DataFrame({'SKU': ["a", "b"]}).to_csv(path, index=False)
+        with pytest.raises(ValueError):
+            TitleHistoryManager(history_path).import_titles(str(path))
+
+
+class TestSharedStores:
+    def test_sqlite_history_is_shared(self, tmp_path, history_path):
+        db_path = str(tmp_path / "history.db")
+        first = TitleHistoryManager(history_path, history_db=db_path)
+        second = TitleHistoryManager(history_path, history_db=db_path)
+
+        first.add_title("Shared title between sessions")
+        assert second.check_similarity("Shared title between sessions")[0]
+
+        path = tmp_path / "titles.csv"
+        pd.DataFrame({'title': ["Shared title between sessions", "Imported title"]}).to_csv(path, index=False)
+        report = second.import_titles(str(path))
+        assert report == dict(report, imported=1, duplicates=1)
+
+        first.refresh()
+        assert sorted(first.get_all_titles()) == ["Imported title", "Shared title between sessions"]
+        assert TitleHistoryManager(history_path, history_db=db_path).get_stats()['total_titles'] == 2
+
+    def test_concurrent_appends_store_each_title_once(self, tmp_path):
+        db = HistoryDatabase(str(tmp_path / "history.db"))
+        records = [{'title': t, 'title_key': t.lower(), 'brand': '', 'product_id': '', 'created_at': ''}
+                   for t in make_titles(200)]
+        stored = []
+        threads = [threading.Thread(target=lambda: stored.append(db.append(records))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(stored) == 200
+        assert db.count() == 200
+
+
+class TestSharedManager:
+    def test_file_rewritten_elsewhere_is_reloaded(self, history_path):
+        first = TitleHistoryManager(history_path)
+        first.add_title("Saved by the first process")
+        first.save_history()
+
+        second = TitleHistoryManager(history_path)
+        second.add_title("Saved by the second process")
+        second.save_history()
+
+        first.add_title("Not saved yet")
+        assert first.reload_if_changed()
+        assert first.get_all_titles() == ["Saved by the first process", "Saved by the second process", "Not saved yet"]
+        assert not first.reload_if_changed()
+
+    def test_one_manager_per_history(self, history_path, monkeypatch):
+        monkeypatch.setattr(title_history, "_shared_managers", {})
+        first = title_history.get_shared_history(history_path)
+        assert title_history.get_shared_history(history_path) is first
+        assert first._titles is None  # Loaded when first used, not when handed out
+
+    def test_concurrent_reloads_read_the_file_once(self, history_path):
+        shared = TitleHistoryManager(history_path)
+        other = TitleHistoryManager(history_path)
+        other.add_titles(make_titles(500))
+        other.save_history()
+
+        loads = []
+        load_history = shared.load_history
+        shared.load_history = lambda: (loads.append(1), load_history())
+        threads = [threading.Thread(target=shared.reload_if_changed) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(loads) == 1
+        assert len(shared.titles) == 500
+
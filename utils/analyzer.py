@@ -1,7 +1,53 @@
+import numpy as np
 import pandas as pd
-from collections import Counter
+from collections import Counter, defaultdict
 import re
 
+from utils.terms import STOPWORD, get_terms
+
+# Report columns tried, in order, as the traffic signal for row priorities
+PRIORITY_METRICS = ['Impressions', 'Clicks']
+
+# Performance keywords given to each row's prompt
+ROW_KEYWORD_LIMIT = 5
+
+def load_performance_report(file) -> pd.DataFrame:
+    """
+    Reads a performance report (Excel) and makes sure it has a numeric CTR column.
+
+    Args:
+        file: Excel file with 'Product Name' and 'CTR' or 'Clicks'/'Impressions'.
+
+    Returns:
+        pd.DataFrame: The report with stripped column names
+
+    Raises:
+        ValueError: If required columns are missing
+    """
+    # Load data (assuming standard Alibaba export format or basic columns)
+    # We need to handle potential format variations.
+    # For MVP, we look for 'Product Name' and 'CTR' or 'Clicks'/'Impressions'.
+    df = pd.read_excel(file)
+
+    # Normalize columns
+    df.columns = [c.strip() for c in df.columns]
+
+    # Check for required columns
+    if 'Product Name' not in df.columns:
+        raise ValueError("Error: Performance file missing 'Product Name' column.")
+
+    # If CTR is missing, try to calculate it
+    if 'CTR' not in df.columns:
+        if 'Clicks' in df.columns and 'Impressions' in df.columns:
+            df['CTR'] = df['Clicks'] / df['Impressions']
+        else:
+            raise ValueError("Error: Could not calculate CTR. Missing 'CTR' or 'Clicks'/'Impressions' columns.")
+
+    # Ensure CTR is numeric (handle '1.5%' strings if any)
+    if df['CTR'].dtype == object:
+         df['CTR'] = df['CTR'].astype(str).str.rstrip('%').astype('float') / 100.0
+    return df
+
 def analyze_performance(file) -> str:
     """
     Analyzes uploaded performance report (Excel) to find high-CTR keywords.
@@ -13,29 +59,10 @@ def analyze_performance(file) -> str:
         str: Summary of high-performing keywords to be used as context.
     """
     try:
-        # Load data (assuming standard Alibaba export format or basic columns)
-        # We need to handle potential format variations. 
-        # For MVP, we look for 'Product Name' and 'CTR' or 'Clicks'/'Impressions'.
-        
-        df = pd.read_excel(file)
-        
-        # Normalize columns
-        df.columns = [c.strip() for c in df.columns]
-        
-        # Check for required columns
-        if 'Product Name' not in df.columns:
-            return "Error: Performance file missing 'Product Name' column."
-            
-        # If CTR is missing, try to calculate it
-        if 'CTR' not in df.columns:
-            if 'Clicks' in df.columns and 'Impressions' in df.columns:
-                df['CTR'] = df['Clicks'] / df['Impressions']
-            else:
-                return "Error: Could not calculate CTR. Missing 'CTR' or 'Clicks'/'Impressions' columns."
-        
-        # Ensure CTR is numeric (handle '1.5%' strings if any)
-        if df['CTR'].dtype == object:
-             df['CTR'] = df['CTR'].astype(str).str.rstrip('%').astype('float') / 100.0
+        try:
+            df = load_performance_report(file)
+        except ValueError as e:
+            return str(e)
 
         # Filter for High Performance (Top 25%)
         # Simple threshold: items with CTR > mean CTR
@@ -49,12 +76,7 @@ def analyze_performance(file) -> str:
         titles = high_performers['Product Name'].astype(str).tolist()
         all_text = " ".join(titles).lower()
         
-        # Simple tokenization (cleaning non-alphanumeric)
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text) # Ignore short words
-        
-        # Filter common stopwords (basic list)
-        stopwords = set(['with', 'for', 'and', 'the', 'new', 'hot', 'sale', 'wholesale', 'china', 'high', 'quality'])
-        filtered_words = [w for w in words if w not in stopwords]
+        filtered_words = keyword_words(all_text)
         
         # Count frequency
         common_keywords = Counter(filtered_words).most_common(10)
@@ -70,3 +92,112 @@ def analyze_performance(file) -> str:
         
     except Exception as e:
         return f"分析失败: {str(e)}"
+
+def keyword_words(text: str) -> list:
+    """Lowercase keyword candidates of a text: words of 3+ letters, without dictionary stopwords."""
+    words = re.findall(r'\b[a-zA-Z]{3,}\b', str(text).lower())  # Ignore short words
+    terms = get_terms()
+    return [w for w in words if not terms.is_term(w, STOPWORD)]
+
+
+class KeywordIndex:
+    """
+    Keyword statistics of a performance report, for per-row prompt context.
+
+    Every word of the product names maps to the products it appears in, so a row's
+    Main/Core Keyword finds the report products about the same thing. The words
+    that co-occur in the high-CTR ones (CTR above the report mean) are the
+    keywords worth suggesting for that row.
+    """
+
+    def __init__(self, report: pd.DataFrame):
+        """
+        Args:
+            report: DataFrame from load_performance_report
+        """
+        ctr = pd.to_numeric(report['CTR'], errors='coerce').fillna(0).to_numpy()
+        self.mean_ctr = float(ctr.mean()) if len(ctr) else 0.0
+        self.product_ctr = ctr
+        self.product_words = [set(keyword_words(name)) for name in report['Product Name'].astype(str)]
+
+        # Word -> products containing it, and the word's CTR stats over those products
+        self.word_products = defaultdict(list)
+        for i, words in enumerate(self.product_words):
+            for word in words:
+                self.word_products[word].append(i)
+        self.stats = {
+            word: {'count': len(products), 'ctr': float(ctr[products].mean())}
+            for word, products in self.word_products.items()
+        }
+        self._cache = {}
+
+    def relevant(self, main_kw, core_kw, limit: int = ROW_KEYWORD_LIMIT) -> list:
+        """
+        High-CTR keywords relevant to one product.
+
+        Candidates are words co-occurring with the product's keyword words in
+        above-average-CTR report products. Each is weighted by how many of the
+        product's keyword words that report product shares and by its CTR lift.
+        Words already in the product's keywords and words whose own CTR is not
+        above the mean are dropped.
+
+        Returns:
+            list: Up to `limit` dicts {'keyword', 'ctr', 'count'}, best first
+        """
+        query = frozenset(keyword_words(f"{'' if pd.isna(main_kw) else main_kw} {'' if pd.isna(core_kw) else core_kw}"))
+        if (query, limit) in self._cache:
+            return self._cache[(query, limit)]
+
+        overlap = Counter()
+        for word in query:
+            overlap.update(self.word_products.get(word, ()))
+
+        scores = Counter()
+        for product, shared in overlap.items():
+            lift = self.product_ctr[product] / self.mean_ctr if self.mean_ctr else 0.0
+            if lift <= 1:
+                continue
+            for word in self.product_words[product] - query:
+                scores[word] += shared * lift
+
+        keywords = [
+            {'keyword': word, 'ctr': self.stats[word]['ctr'], 'count': self.stats[word]['count']}
+            for word, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            if self.stats[word]['ctr'] > self.mean_ctr
+        ][:limit]
+        self._cache[(query, limit)] = keywords
+        return keywords
+
+
+def keyword_traffic(keywords, report: pd.DataFrame, metric: str = None) -> np.ndarray:
+    """
+    Traffic of each keyword in a performance report: the sum of `metric` over the
+    report products whose name contains every word of the keyword.
+
+    Args:
+        keywords: Keyword per product row (e.g. the Main Keyword column)
+        report: DataFrame from load_performance_report
+        metric: Report column to sum (default: first of PRIORITY_METRICS present, else CTR)
+
+    Returns:
+        np.ndarray: One value per keyword (0 for keywords without matches)
+    """
+    if metric is None:
+        metric = next((m for m in PRIORITY_METRICS if m in report.columns), 'CTR')
+    values = pd.to_numeric(report[metric], errors='coerce').fillna(0).to_numpy()
+
+    # Word -> report rows containing it, so each keyword costs a few set intersections
+    word_index = defaultdict(set)
+    for i, name in enumerate(report['Product Name'].astype(str).str.lower()):
+        for word in set(re.findall(r'[a-z0-9]+', name)):
+            word_index[word].add(i)
+
+    traffic = {}
+    result = np.zeros(len(keywords))
+    for pos, keyword in enumerate(keywords):
+        words = frozenset(re.findall(r'[a-z0-9]+', str(keyword).lower())) if pd.notna(keyword) else frozenset()
+        if words not in traffic:
+            matched = set.intersection(*(word_index.get(w, set()) for w in words)) if words else set()
+            traffic[words] = float(values[list(matched)].sum()) if matched else 0.0
+        result[pos] = traffic[words]
+    return result
@@ -0,0 +1,341 @@
+"""
+Catalog Audit - bulk SEO scoring of existing listing titles.
+Applies the rules of utils.validator.calculate_seo_score to whole columns at
+once: titles are scored as one code-point array per chunk (words, keywords and
+punctuation are found with array operations, not a regex call per title), so
+exported catalogs with hundreds of thousands of titles score in seconds.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+from utils.terms import SPAM, TermDictionary, get_terms
+from utils.title_history import TITLE_COLUMN_CANDIDATES
+from utils.validator import (
+    FORBIDDEN_PUNCTUATION_CHARS,
+    MIN_TITLE_CHARS,
+    MAX_TITLE_CHARS,
+    REDUNDANT_WORD_MIN_LENGTH
+)
+
+# Titles scoring below this are suggested for regeneration
+DEFAULT_REGENERATE_BELOW = 90
+
+# Titles scored per vectorized pass (bounds the size of the code-point arrays)
+SCORE_CHUNK_ROWS = 100_000
+
+# Report columns added to the listing
+ROW_ID_COLUMN = "原行号 (Row ID)"
+SCORE_COLUMN = "SEO 得分"
+NOTES_COLUMN = "扣分原因"
+REGENERATE_COLUMN = "建议重新生成"
+
+# Listing columns holding the mandatory keywords (matched case-insensitively),
+# keyed by the score_titles argument they feed
+KEYWORD_COLUMNS = {'brands': 'Brand', 'main_kws': 'Main Keyword', 'core_kws': 'Core Keyword'}
+
+# Multiplier of the polynomial word hash (wraps modulo 2**64)
+_HASH_BASE = np.uint64(1000003)
+
+_FORBIDDEN_CODES = np.array([ord(c) for c in FORBIDDEN_PUNCTUATION_CHARS], dtype=np.uint32)
+
+_ASCII_WORD = np.array([chr(c).isalnum() or chr(c) == '_' for c in range(128)], dtype=bool)
+
+
+def _text_values(values, count: int) -> List[str]:
+    """Values as strings with missing cells as '' (None means an all-empty column)."""
+    if values is None:
+        return [''] * count
+    series = pd.Series(values, dtype=object)
+    return series.where(series.notna(), '').astype(str).tolist()
+
+
+class _CodePoints:
+    """Strings as one code-point array, separated by NUL, with the owning string of each position."""
+
+    def __init__(self, strings: List[str]):
+        self.count = len(strings)
+        self.text = "\0".join(strings)
+        self.lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=self.count)
+        self.codes = np.frombuffer(self.text.encode("utf-32-le"), dtype=np.uint32)
+        self.owner = np.repeat(np.arange(self.count), self.lengths + 1)[:len(self.codes)]
+
+    def keep(self, mask: np.ndarray) -> List[str]:
+        """Each string reduced to the positions where `mask` is True."""
+        kept = self.codes[mask].tobytes().decode("utf-32-le")
+        offsets = np.r_[0, np.cumsum(np.bincount(self.owner[mask], minlength=self.count))].tolist()
+        return [kept[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def alphanumeric(self) -> np.ndarray:
+        """Positions holding a-z or 0-9."""
+        codes = self.codes
+        return ((codes >= ord('a')) & (codes <= ord('z'))) | ((codes >= ord('0')) & (codes <= ord('9')))
+
+    def word_chars(self) -> np.ndarray:
+        """Positions matching the regex class \\w (alphanumeric or underscore)."""
+        flags = np.zeros(len(self.codes), dtype=bool)
+        ascii_pos = self.codes < 128
+        flags[ascii_pos] = _ASCII_WORD[self.codes[ascii_pos]]
+        other = np.flatnonzero(~ascii_pos)
+        if len(other):
+            uniques, inverse = np.unique(self.codes[other], return_inverse=True)
+            is_word = np.fromiter((chr(c).isalnum() for c in uniques.tolist()), dtype=bool, count=len(uniques))
+            flags[other] = is_word[inverse.ravel()]
+        return flags
+
+
+def _run_hashes(codes: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """64-bit hash of each non-empty run codes[start:start + length], mixed with its length."""
+    # Polynomial hash: sum(code * BASE**offset) over the run's characters
+    first = np.cumsum(np.r_[0, lengths])[:-1].astype(np.int64)  # Run starts within the gathered positions
+    offsets = np.arange(int(lengths.sum())) - np.repeat(first, lengths)
+    pos = np.repeat(starts, lengths) + offsets
+    powers = np.cumprod(np.r_[np.uint64(1), np.full(max(int(lengths.max(initial=0)) - 1, 0), _HASH_BASE)])
+    with np.errstate(over='ignore'):
+        values = codes[pos].astype(np.uint64) * powers[offsets]
+        hashes = np.add.reduceat(values, first) if len(pos) else np.zeros(0, dtype=np.uint64)
+        return hashes * _HASH_BASE + lengths.astype(np.uint64)
+
+
+class _Words:
+    """
+    Maximal runs of word characters (what re.findall(r'\\b\\w+\\b') returns),
+    in text order, each with its owning string and a 64-bit hash.
+    """
+
+    def __init__(self, points: _CodePoints):
+        is_word = points.word_chars()
+        prev = np.r_[False, is_word[:-1]]
+        nxt = np.r_[is_word[1:], False]
+        self.starts = np.flatnonzero(is_word & ~prev)
+        self.ends = np.flatnonzero(is_word & ~nxt) + 1
+        self.lengths = self.ends - self.starts
+        self.rows = points.owner[self.starts]
+        self.hashes = _run_hashes(points.codes, self.starts, self.lengths)
+
+    def keys(self) -> np.ndarray:
+        """Hashes combined with the owning row, for set operations on (row, word) pairs."""
+        with np.errstate(over='ignore'):
+            return self.hashes * _HASH_BASE + self.rows.astype(np.uint64)
+
+    def gap_hashes(self, points: _CodePoints) -> np.ndarray:
+        """Hash of the text between each word and the next (only meaningful within one string)."""
+        return _run_hashes(points.codes, self.ends[:-1], self.starts[1:] - self.ends[:-1])
+
+    def sequence_keys(self, points: _CodePoints, count: int) -> np.ndarray:
+        """
+        Hash of every window of `count` consecutive words together with the text between
+        them (windows crossing strings included; check the rows before using them).
+        """
+        windows = max(len(self.hashes) - count + 1, 0)
+        gaps = self.gap_hashes(points) if count > 1 else None
+        keys = self.hashes[:windows].copy()
+        with np.errstate(over='ignore'):
+            for j in range(1, count):
+                keys = (keys * _HASH_BASE + gaps[j - 1:j - 1 + windows]) * _HASH_BASE + self.hashes[j:j + windows]
+        return keys
+
+
+def _join_reasons(parts: List[np.ndarray]) -> np.ndarray:
+    """Join per-row reason fragments with ', ', skipping empty ones."""
+    return np.array([", ".join(filter(None, row)) for row in zip(*(p.tolist() for p in parts))], dtype=object)
+
+
+def _group_bounds(rows: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) of each run of equal values in a sorted array."""
+    if not len(rows):
+        return []
+    bounds = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1], True]).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _SpamTerms:
+    """
+    The dictionary's spam terms keyed by the hash of their words and separators, grouped
+    by word count, so each title window is one sorted-array lookup whatever the dictionary size.
+    """
+
+    def __init__(self, dictionary: TermDictionary):
+        entries = [(term_id, term) for term_id, (term, category) in enumerate(dictionary.entries) if category == SPAM]
+        self.terms = dict(entries)
+        self.id_limit = len(dictionary.entries)
+        points = _CodePoints([term.lower() for _, term in entries])
+        words = _Words(points)
+        tables = {}  # word count -> {sequence hash: term id}
+        for a, b in _group_bounds(words.rows):
+            key = words.sequence_keys(points, b - a)[a]
+            tables.setdefault(b - a, {})[int(key)] = entries[words.rows[a]][0]
+        self.tables = {}  # word count -> (sorted sequence hashes, term ids)
+        for count, table in tables.items():
+            keys = np.fromiter(table, dtype=np.uint64, count=len(table))
+            ids = np.fromiter(table.values(), dtype=np.int64, count=len(table))
+            order = np.argsort(keys)
+            self.tables[count] = (keys[order], ids[order])
+
+    def hits(self, words: _Words, points: _CodePoints) -> np.ndarray:
+        """Distinct (row, term id) pairs of the spam terms found, sorted by row then term id."""
+        pairs = [np.zeros(0, dtype=np.int64)]
+        for count, (term_keys, term_ids) in self.tables.items():
+            keys = words.sequence_keys(points, count)
+            if not len(keys):
+                continue
+            slot = np.minimum(np.searchsorted(term_keys, keys), len(term_keys) - 1)
+            found = np.flatnonzero((term_keys[slot] == keys) & (words.rows[:len(keys)] == words.rows[count - 1:]))
+            pairs.append(words.rows[found].astype(np.int64) * self.id_limit + term_ids[slot[found]])
+        pairs = np.unique(np.concatenate(pairs))
+        return np.column_stack((pairs // max(self.id_limit, 1), pairs % max(self.id_limit, 1)))
+
+
+def _score_chunk(titles: List[str], brands: List[str], main_kws: List[str], core_kws: List[str],
+                 spam_terms: _SpamTerms) -> Tuple[np.ndarray, np.ndarray]:
+    """Scores and fault reasons for one chunk of titles (see score_titles)."""
+    n = len(titles)
+    lower = [t.lower() for t in titles]
+    points = _CodePoints(lower)
+    words = _Words(points)
+    penalty = np.zeros(n, dtype=np.int64)
+    parts = []
+
+    # 1. Length
+    length = np.fromiter((len(t) for t in titles), dtype=np.int64, count=n)
+    short = np.minimum(20, np.maximum(MIN_TITLE_CHARS - length, 0))
+    long = np.minimum(50, np.maximum(length - MAX_TITLE_CHARS, 0) * 3)
+    penalty += short + long
+    reason = np.where(short > 0, "太短 (-" + short.astype(str) + ")", "")
+    parts.append(np.where(long > 0, "太长(" + length.astype(str) + f"/{MAX_TITLE_CHARS}) (-" + long.astype(str) + ")", reason))
+
+    # 2. Keywords (normalized substring match; empty keywords always match)
+    norm_titles = points.keep(points.alphanumeric())
+    for keywords, lost, label in ((brands, 20, "缺品牌 (-20)"), (main_kws, 20, "缺主词 (-20)"),
+                                  (core_kws, 15, "缺核心词 (-15)")):
+        kw_points = _CodePoints([k.lower() for k in keywords])
+        norm_kw = kw_points.keep(kw_points.alphanumeric())
+        missing = np.fromiter((k not in t for t, k in zip(norm_titles, norm_kw)), dtype=bool, count=n)
+        penalty += missing * lost
+        parts.append(np.where(missing, label, ''))
+
+    # 3. Spam terms of the term dictionary (listed in dictionary order)
+    hits = spam_terms.hits(words, points)
+    penalty += np.bincount(hits[:, 0], minlength=n) * 5
+    for term_id in np.unique(hits[:, 1]).tolist():
+        found = np.zeros(n, dtype=bool)
+        found[hits[hits[:, 1] == term_id, 0]] = True
+        parts.append(np.where(found, f"含违禁词'{spam_terms.terms[term_id]}' (-5)", ''))
+
+    # 4. Starting capital
+    lower_start = np.fromiter((t[:1].islower() for t in titles), dtype=bool, count=n)
+    penalty += lower_start * 5
+    parts.append(np.where(lower_start, "首字母未大写 (-5)", ''))
+
+    # 5. Redundancy: long words seen again (listed in order of their first repeat), unless part of the keywords
+    long_words = np.flatnonzero(words.lengths >= REDUNDANT_WORD_MIN_LENGTH)
+    order = long_words[np.lexsort((words.hashes[long_words], words.rows[long_words]))]
+    same = (words.rows[order][1:] == words.rows[order][:-1]) & (words.hashes[order][1:] == words.hashes[order][:-1])
+    repeats = np.sort(order[np.flatnonzero(same & ~np.r_[False, same[:-1]]) + 1])
+    if len(repeats):
+        keyword_words = _Words(_CodePoints([f"{b} {m} {c}".lower() for b, m, c in zip(brands, main_kws, core_kws)]))
+        repeats = repeats[~np.isin(words.keys()[repeats], keyword_words.keys())]
+    repeat_rows = words.rows[repeats]
+    penalty += np.bincount(repeat_rows, minlength=n) * 7
+    reason = np.full(n, '', dtype=object)
+    texts = [points.text[s:e] for s, e in zip(words.starts[repeats].tolist(), words.ends[repeats].tolist())]
+    for a, b in _group_bounds(repeat_rows):
+        reason[repeat_rows[a]] = f"含重复词 {texts[a:b]} (-{(b - a) * 7})"
+    parts.append(reason)
+
+    # 6. Punctuation (each mark listed once, in order of appearance)
+    marks = np.flatnonzero(np.isin(points.codes, _FORBIDDEN_CODES))
+    has_punct = np.bincount(points.owner[marks], minlength=n) > 0
+    penalty += has_punct * 10
+    reason = np.full(n, '', dtype=object)
+    firsts = pd.DataFrame({'row': points.owner[marks], 'code': points.codes[marks]}).drop_duplicates()
+    mark_rows, mark_codes = firsts['row'].to_numpy(), firsts['code'].tolist()
+    for a, b in _group_bounds(mark_rows):
+        reason[mark_rows[a]] = f"含禁止标点{[chr(c) for c in mark_codes[a:b]]} (-10)"
+    parts.append(reason)
+
+    return np.maximum(0, 100 - penalty), _join_reasons(parts)
+
+
+def score_titles(titles, brands=None, main_kws=None, core_kws=None) -> Tuple[np.ndarray, pd.Series]:
+    """
+    Vectorized calculate_seo_score over whole columns.
+
+    Args:
+        titles: Title values (missing cells score as empty titles)
+        brands, main_kws, core_kws: Keyword values of the same length, or None when unknown
+            (a missing keyword is never penalized, as in calculate_seo_score)
+
+    Returns:
+        tuple: (int scores array, Series of fault reasons)
+    """
+    titles = _text_values(titles, 0)
+    n = len(titles)
+    brands, main_kws, core_kws = (_text_values(v, n) for v in (brands, main_kws, core_kws))
+
+    spam_terms = _SpamTerms(get_terms())
+    scores, reasons = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=object)]
+    for start in range(0, n, SCORE_CHUNK_ROWS):
+        window = slice(start, start + SCORE_CHUNK_ROWS)
+        chunk_scores, chunk_reasons = _score_chunk(titles[window], brands[window], main_kws[window], core_kws[window],
+                                                  spam_terms)
+        scores.append(chunk_scores)
+        reasons.append(chunk_reasons)
+    return np.concatenate(scores), pd.Series(np.concatenate(reasons), dtype=object)
+
+
+def _find_column(columns, candidates: List[str]) -> Optional[str]:
+    """First column whose stripped, lowercased name is one of `candidates`."""
+    normalized = {str(c).strip().lower(): c for c in columns}
+    for candidate in candidates:
+        if candidate.lower() in normalized:
+            return normalized[candidate.lower()]
+    return None
+
+
+def audit_catalog(df: pd.DataFrame, title_column: str = 'title',
+                  regenerate_below: int = DEFAULT_REGENERATE_BELOW) -> pd.DataFrame:
+    """
+    Scores every title of an exported listing file.
+
+    Args:
+        df: Listing rows; Brand / Main Keyword / Core Keyword columns are used when present
+        title_column: Name of the title column (common names are tried if it is missing)
+        regenerate_below: Rows scoring below this are marked for regeneration
+
+    Returns:
+        pd.DataFrame: The listing with row id, score, fault reasons and regeneration flag,
+            sorted by score (worst first)
+
+    Raises:
+        ValueError: If no title column is found
+    """
+    title_col = _find_column(df.columns, [title_column] + TITLE_COLUMN_CANDIDATES)
+    if title_col is None:
+        raise ValueError(f"No title column found (tried '{title_column}' and {TITLE_COLUMN_CANDIDATES}).")
+
+    # Canonical keyword column names, so flagged rows can be re-uploaded for generation
+    renames = {}
+    for name in KEYWORD_COLUMNS.values():
+        col = _find_column(df.columns, [name])
+        if col is not None:
+            renames[col] = name
+    report = df.rename(columns=renames).reset_index(drop=True)
+
+    scores, reasons = score_titles(
+        report[renames.get(title_col, title_col)],
+        **{arg: (report[name] if name in report.columns else None) for arg, name in KEYWORD_COLUMNS.items()}
+    )
+
+    report.insert(0, ROW_ID_COLUMN, np.arange(1, len(df) + 1))
+    report[SCORE_COLUMN] = scores
+    report[NOTES_COLUMN] = reasons.to_numpy()
+    report[REGENERATE_COLUMN] = scores < regenerate_below
+    return report.sort_values(SCORE_COLUMN, kind='stable').reset_index(drop=True)
+
+
+def regeneration_rows(report: pd.DataFrame) -> pd.DataFrame:
+    """Rows of an audit report marked for regeneration, as a product sheet for re-upload."""
+    rows = report[report[REGENERATE_COLUMN]].sort_values(ROW_ID_COLUMN, kind='stable')
+    return rows.drop(columns=[ROW_ID_COLUMN, SCORE_COLUMN, NOTES_COLUMN, REGENERATE_COLUMN]).reset_index(drop=True)
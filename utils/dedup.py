@@ -0,0 +1,188 @@
+"""
+Batch near-duplicate detection across all titles of a job.
+Titles are vectorized as character n-gram TF-IDF and grouped into clusters in
+one pass. Candidate pairs come from a blocked sparse product over word-bigram
+shingles (cheap: shingles are far rarer than n-grams); their exact cosine
+similarity is then computed on the n-gram vectors.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from typing import Optional, Sequence, Tuple
+
+# Character n-gram size used for the title vectors
+NGRAM_SIZE = 3
+
+# Cosine similarity at or above which two titles count as near-duplicates
+DEFAULT_THRESHOLD = 0.85
+
+# Rows of the similarity matrix computed per block (bounds peak memory)
+BLOCK_SIZE = 2048
+
+# Shingles found in more than this share of titles (and more than MAX_DF_MIN_TITLES titles)
+# don't generate candidates: they say little about duplication but make the product dense
+MAX_DF_RATIO = 0.01
+MAX_DF_MIN_TITLES = 200
+
+# Titles must share this many shingles to become a candidate pair
+MIN_SHARED_SHINGLES = 2
+
+# Candidate pairs verified per vectorized step
+VERIFY_CHUNK = 200_000
+
+# Multiplier of the polynomial n-gram hash (wraps modulo 2**64)
+_HASH_BASE = np.uint64(1000003)
+
+
+def ngram_tfidf_matrix(titles: Sequence[str], n: int = NGRAM_SIZE) -> sparse.csr_matrix:
+    """
+    Builds L2-normalized character n-gram TF-IDF vectors without a Python loop per title.
+
+    Args:
+        titles: Title strings
+        n: N-gram size
+
+    Returns:
+        csr_matrix of shape (len(titles), vocabulary size)
+    """
+    count = len(titles)
+    # Lowercase, collapse whitespace and pad so word boundaries form n-grams too
+    normalized = [" " + " ".join(str(t).lower().split()) + " " for t in titles]
+    lengths = np.fromiter((len(t) for t in normalized), dtype=np.int64, count=count)
+
+    # All titles as one code-point array, separated by NUL
+    codes = np.frombuffer("\0".join(normalized).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    owner = np.repeat(np.arange(count), lengths + 1)[:len(codes)]
+    ends = np.cumsum(lengths + 1) - 1  # Position of each title's separator
+
+    positions = np.arange(len(codes) - n + 1)
+    valid = positions + n - 1 < ends[owner[positions]]
+    positions = positions[valid]
+
+    grams = np.zeros(len(positions), dtype=np.uint64)
+    for k in range(n):
+        grams = grams * _HASH_BASE + codes[positions + k]
+    vocab, cols = np.unique(grams, return_inverse=True)
+    rows = owner[positions]
+
+    # Term counts (duplicates are summed on conversion)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols.ravel())),
+        shape=(count, len(vocab))
+    )
+    matrix.sum_duplicates()
+
+    doc_freq = np.bincount(matrix.indices, minlength=len(vocab))
+    idf = (np.log((1 + count) / (1 + doc_freq)) + 1).astype(np.float32)
+    matrix.data *= idf[matrix.indices]
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms.astype(np.float32)) @ matrix)
+
+
+def shingle_matrix(titles: Sequence[str]) -> sparse.csr_matrix:
+    """
+    Binary word-bigram presence matrix (with start/end markers, so one-word titles
+    still get shingles). Very common shingles are dropped.
+    """
+    count = len(titles)
+    tokens = [["\x02"] + str(t).lower().split() + ["\x03"] for t in titles]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=count)
+    token_ids, uniques = pd.factorize(pd.Series([tok for title in tokens for tok in title]))
+    token_ids = token_ids.astype(np.int64)
+    owner = np.repeat(np.arange(count), lengths)
+
+    same_title = owner[1:] == owner[:-1]
+    bigrams = (token_ids[:-1] * len(uniques) + token_ids[1:])[same_title]
+    cols, vocab = pd.factorize(bigrams)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(cols), dtype=np.float32), (owner[:-1][same_title], cols)),
+        shape=(count, len(vocab))
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+
+    doc_freq = np.bincount(matrix.indices, minlength=len(vocab))
+    max_df = max(MAX_DF_RATIO * count, MAX_DF_MIN_TITLES)
+    matrix.data[doc_freq[matrix.indices] > max_df] = 0.0
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def candidate_pairs(titles: Sequence[str], block_size: int = BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs (i < j) sharing at least MIN_SHARED_SHINGLES shingles. Only the upper
+    triangle of the shingle co-occurrence matrix is computed, one block of rows at a time.
+    """
+    matrix = shingle_matrix(titles)
+    found_i, found_j = [], []
+    for start in range(0, matrix.shape[0], block_size):
+        stop = min(start + block_size, matrix.shape[0])
+        block = (matrix[start:stop] @ matrix[start:].T).tocoo()
+        keep = (block.col > block.row) & (block.data >= MIN_SHARED_SHINGLES)
+        found_i.append(block.row[keep] + start)
+        found_j.append(block.col[keep] + start)
+    if not found_i:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(found_i).astype(np.int64), np.concatenate(found_j).astype(np.int64)
+
+
+def similar_pairs(titles: Sequence[str], threshold: float = DEFAULT_THRESHOLD) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs (i < j) whose n-gram TF-IDF cosine similarity is >= threshold.
+
+    Returns:
+        tuple: (i indices, j indices, similarities)
+    """
+    pair_i, pair_j = candidate_pairs(titles)
+    vectors = ngram_tfidf_matrix(titles)
+
+    sims = np.empty(len(pair_i), dtype=np.float32)
+    for start in range(0, len(pair_i), VERIFY_CHUNK):
+        chunk = slice(start, start + VERIFY_CHUNK)
+        sims[chunk] = np.asarray(vectors[pair_i[chunk]].multiply(vectors[pair_j[chunk]]).sum(axis=1)).ravel()
+
+    keep = sims >= threshold
+    return pair_i[keep], pair_j[keep], sims[keep]
+
+
+def find_near_duplicates(titles: Sequence[str], scores: Optional[Sequence[float]] = None,
+                         threshold: float = DEFAULT_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Groups near-identical titles into clusters and picks one keeper per cluster.
+
+    Args:
+        titles: All titles of the job
+        scores: Optional quality score per title; the best-scoring title of a cluster
+            is kept (ties go to the earliest title)
+        threshold: Cosine similarity threshold
+
+    Returns:
+        tuple: (representative, is_duplicate) arrays. representative[i] is the index of
+        the title kept for i's cluster (i itself for keepers and singletons).
+    """
+    count = len(titles)
+    representative = np.arange(count)
+    if count < 2:
+        return representative, np.zeros(count, dtype=bool)
+
+    pair_i, pair_j, _ = similar_pairs(titles, threshold)
+    if not len(pair_i):
+        return representative, np.zeros(count, dtype=bool)
+
+    graph = sparse.coo_matrix((np.ones(len(pair_i)), (pair_i, pair_j)), shape=(count, count))
+    _, labels = connected_components(graph, directed=False)
+
+    # Keeper per cluster: highest score first, then lowest index
+    score_values = np.zeros(count) if scores is None else np.nan_to_num(np.asarray(scores, dtype=float), nan=-1.0)
+    order = np.lexsort((np.arange(count), -score_values, labels))
+    first_of_label = np.ones(count, dtype=bool)
+    first_of_label[1:] = labels[order][1:] != labels[order][:-1]
+    keeper_by_label = np.empty(labels.max() + 1, dtype=np.int64)
+    keeper_by_label[labels[order][first_of_label]] = order[first_of_label]
+
+    representative = keeper_by_label[labels]
+    return representative, representative != np.arange(count)
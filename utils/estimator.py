@@ -0,0 +1,194 @@
+"""
+Dry-run estimates for a generation job: tokens, wall time and cost per model.
+
+Every row's prompt is built locally (no API calls) and its tokens estimated;
+identical rows are generated together, so their prompt is sent once per group
+request. The expected number of requests comes from the polish rate and the
+generation calls per request (top-ups) measured on recent jobs. Wall time comes from each
+model's measured per-call latency and the configured row concurrency. Built-in
+defaults stand in until a model has been measured.
+"""
+
+import math
+import re
+import threading
+from collections import defaultdict, deque
+
+from utils.pipeline import OVERGENERATION_FACTOR, first_request_titles, group_requests, prompt_args, row_fingerprint, titles_task
+from utils.prompt_builder import build_messages, build_polish_messages
+
+# Price per 1,000 tokens in CNY (input, output), DashScope list prices; update when they change
+MODEL_PRICES = {
+    'qwen-flash': (0.00015, 0.0015),
+    'qwen-turbo': (0.0003, 0.0006),
+    'qwen-plus': (0.0008, 0.002),
+    'qwen-max': (0.0024, 0.0096),
+}
+
+# Seconds per API call until a model has been measured
+DEFAULT_CALL_SECONDS = {'qwen-flash': 2.0, 'qwen-turbo': 2.5, 'qwen-plus': 5.0, 'qwen-max': 8.0}
+
+# Polishing requests per accepted title until measured (at most MAX_POLISH_ATTEMPTS each)
+DEFAULT_POLISH_RATE = 0.5
+
+# Generation calls per planned request (the request itself plus top-ups) until measured
+DEFAULT_GENERATION_CALLS = 1.1
+
+# Reply tokens per title (about 100 characters, plus JSON quoting in generation replies)
+TITLE_OUTPUT_TOKENS = 30
+
+# Chat framing tokens added per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Recent jobs per model whose measurements are used
+MEASURED_JOBS = 20
+
+# Title used to size polishing prompts (a typical 100-character title)
+SAMPLE_TITLE = "X" * 100
+
+_CJK = re.compile(r'[\u3000-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one per CJK character, one per 4 other characters."""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def messages_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+# --- Measured rates (process-wide, from finished jobs) ---
+_measurements = defaultdict(lambda: deque(maxlen=MEASURED_JOBS))
+_measurements_lock = threading.Lock()
+
+
+def record_job(model: str, usage, requests: int, titles: int) -> None:
+    """
+    Remember what a finished job measured, for later estimates.
+
+    Args:
+        model: Model the job used
+        usage: The job's TokenUsage
+        requests: First-round generation requests the job planned (see group_requests)
+        titles: Titles produced
+    """
+    if not requests or not usage.calls:
+        return
+    with _measurements_lock:
+        _measurements[model].append({
+            'requests': requests,
+            'titles': titles,
+            'calls': usage.calls,
+            'polish_calls': usage.polish_calls,
+            'call_seconds': usage.call_seconds,
+        })
+
+
+def measured_rates(model: str) -> dict:
+    """
+    Per-call latency, polish rate and generation calls per planned request of a model,
+    pooled over its recent jobs (defaults when it has none).
+
+    Returns:
+        dict with 'call_seconds', 'polish_rate', 'generation_calls' and 'jobs'
+    """
+    with _measurements_lock:
+        jobs = list(_measurements.get(model, ()))
+    if not jobs:
+        return {
+            'call_seconds': DEFAULT_CALL_SECONDS.get(model, max(DEFAULT_CALL_SECONDS.values())),
+            'polish_rate': DEFAULT_POLISH_RATE,
+            'generation_calls': DEFAULT_GENERATION_CALLS,
+            'jobs': 0,
+        }
+    total = {key: sum(job[key] for job in jobs) for key in jobs[0]}
+    return {
+        'call_seconds': total['call_seconds'] / total['calls'],
+        'polish_rate': total['polish_calls'] / max(total['titles'], 1),
+        'generation_calls': (total['calls'] - total['polish_calls']) / total['requests'],
+        'jobs': len(jobs),
+    }
+
+
+def prompt_token_profile(rows, config: dict) -> dict:
+    """
+    Estimated input tokens of the job's prompts, built exactly as the job would build them.
+
+    Args:
+        rows: (index, row) pairs to generate
+        config: Generation config (see generate_row_titles)
+
+    Returns:
+        dict with 'rows', 'groups', 'requests' (first-round generation requests),
+        'generation_input' (total over those requests) and 'polish_input' (mean per
+        polishing request)
+    """
+    num_titles = config['num_titles']
+    overgenerate = config.get('overgenerate', False)
+    task = titles_task(first_request_titles(num_titles, overgenerate))
+    groups = {}  # fingerprint -> [members, prompt tokens]
+    polish_input = 0
+    count = 0
+    for _, row in rows:
+        group = groups.setdefault(row_fingerprint(row, config), [0, 0])
+        if not group[0]:
+            group[1] = messages_tokens(build_messages(row, task=task, **prompt_args(config, row)))
+        group[0] += 1
+        polish_input += messages_tokens(build_polish_messages(
+            SAMPLE_TITLE, "Length too short", row.get('Brand', ''), row.get('Main Keyword', ''), row.get('Core Keyword', '')
+        ))
+        count += 1
+    requests = {key: group_requests(members, num_titles, overgenerate) for key, (members, _) in groups.items()}
+    return {
+        'rows': count,
+        'groups': len(groups),
+        'requests': sum(requests.values()),
+        'generation_input': sum(requests[key] * tokens for key, (_, tokens) in groups.items()),
+        'polish_input': polish_input / count if count else 0,
+    }
+
+
+def estimate_job(rows, config: dict, models=None) -> list:
+    """
+    Dry run of a generation job: projected tokens, wall time and cost per model.
+    No API calls are made.
+
+    Args:
+        rows: (index, row) pairs to generate
+        config: Generation config with 'num_titles' and 'concurrency'
+        models: Models to estimate (default: all of MODEL_PRICES)
+
+    Returns:
+        list: One dict per model with 'model', 'calls', 'input_tokens', 'output_tokens',
+        'seconds', 'cost' and 'measured_jobs'
+    """
+    profile = prompt_token_profile(rows, config)
+    titles = profile['rows'] * config['num_titles']
+    overgenerate = config.get('overgenerate', False)
+    concurrency = max(1, int(config.get('concurrency', 1)))
+
+    estimates = []
+    for model in models or MODEL_PRICES:
+        rates = measured_rates(model)
+        # Over-generation replaces polishing with extra candidates in the same replies
+        polish_calls = 0 if overgenerate else titles * rates['polish_rate']
+        candidates = titles * OVERGENERATION_FACTOR if overgenerate else titles
+        # Top-up requests resend the prompt (plus the titles to avoid, ignored here)
+        input_tokens = profile['generation_input'] * rates['generation_calls'] + polish_calls * profile['polish_input']
+        output_tokens = (candidates + polish_calls) * TITLE_OUTPUT_TOKENS
+        calls = profile['requests'] * rates['generation_calls'] + polish_calls
+        # A group's requests run one after another; groups run `concurrency` at a time
+        seconds = math.ceil(calls / concurrency) * rates['call_seconds']
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        estimates.append({
+            'model': model,
+            'calls': round(calls),
+            'input_tokens': round(input_tokens),
+            'output_tokens': round(output_tokens),
+            'seconds': seconds,
+            'cost': input_tokens / 1000 * price_in + output_tokens / 1000 * price_out,
+            'measured_jobs': rates['jobs'],
+        })
+    return estimates
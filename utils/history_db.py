@@ -0,0 +1,93 @@
+"""
+Shared title history in SQLite, for servers where several sessions generate at once.
+
+The database runs in WAL mode, so sessions read while another one writes. Every
+append is its own short transaction and exact duplicates are ignored by a unique
+key, so concurrent sessions never overwrite each other. Readers fetch only the
+rows added since their last read.
+"""
+
+import sqlite3
+import threading
+from typing import List, Tuple
+
+# Seconds a writer waits for another session's write lock before giving up
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    title_key TEXT NOT NULL UNIQUE,
+    brand TEXT NOT NULL DEFAULT '',
+    product_id TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL
+)
+"""
+
+
+class HistoryDatabase:
+    """
+    Append-only title store shared by all sessions of a server.
+    Connections are per thread, as sqlite3 connections must not cross threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Durable across application crashes; WAL makes this safe and much cheaper than FULL
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, records: List[dict]) -> int:
+        """
+        Atomically append history records (title, title_key, brand, product_id, created_at).
+
+        Returns:
+            Number of records stored; titles already present are skipped.
+        """
+        conn = self._connection()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO titles (title, title_key, brand, product_id, created_at) "
+                "VALUES (:title, :title_key, :brand, :product_id, :created_at)",
+                records
+            )
+        return conn.total_changes - before
+
+    def fetch_since(self, last_id: int) -> Tuple[List[dict], int]:
+        """
+        Records added after the given row id, oldest first.
+
+        Returns:
+            (records, last_row_id_seen)
+        """
+        rows = self._connection().execute(
+            "SELECT id, title, brand, product_id, created_at FROM titles WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+        records = [
+            {'title': title, 'title_lower': title.lower(), 'brand': brand, 'product_id': product_id,
+             'created_at': created_at}
+            for _, title, brand, product_id, created_at in rows
+        ]
+        return records, (rows[-1][0] if rows else last_id)
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def clear(self) -> None:
+        """Delete all titles, for every session."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM titles")
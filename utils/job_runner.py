@@ -0,0 +1,341 @@
+"""
+Background Job Runner - owns title generation jobs outside the Streamlit script run.
+Jobs run in server-side worker threads, so reruns, closed tabs or websocket drops
+don't interrupt them. Pages only submit jobs and poll their progress.
+"""
+
+import contextlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from utils.estimator import record_job
+from utils.pipeline import generate_group_titles, group_key, group_requests, row_fingerprint, row_label
+from utils.profiling import PROFILE_ALL_JOBS, JobProfiler
+from utils.result_writer import OUTPUT_DIR, ResultWriter
+from utils.settings import DEFAULT_ROW_CONCURRENCY
+from utils.terms import use_terms
+from utils.text_gen import ADAPTIVE_MAX_CONCURRENCY, TokenUsage, get_limiter
+
+# Jobs running at the same time on this server; further jobs wait in the queue
+MAX_RUNNING_JOBS = int(os.getenv("TITLE_GENIE_MAX_JOBS", "2"))
+
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION_SECONDS = 3600
+
+# Finished rows kept in memory per job; older ones are read back from the job's output files
+RESULT_WINDOW_ROWS = 500
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+
+# Why a job stopped before processing all rows (its status stays DONE)
+STOP_DEADLINE, STOP_TOKEN_BUDGET = "deadline", "token_budget"
+
+
+class Job:
+    """
+    One generation job: a list of product rows plus the settings to process them with.
+    Progress and results are append-only, so any number of sessions can poll the
+    same job with their own cursors. Results are streamed to disk as rows finish
+    (see utils.result_writer) and only the most recent rows stay in the job's memory;
+    polling sessions keep their own full copy.
+    """
+
+    def __init__(self, rows: list, config: dict, history_manager, row_keys: Optional[dict] = None):
+        """
+        Args:
+            rows: List of (index, row) pairs to process, in processing order
+            config: Generation settings (see utils.pipeline.generate_row_titles), plus the
+                optional job limits 'deadline_seconds' and 'token_budget', 'profile'
+                to record a CPU/memory profile (see utils.profiling) and 'terms', the
+                session's TermDictionary (see utils.terms.use_terms)
+            history_manager: TitleHistoryManager shared by all rows of the job
+            row_keys: Optional index -> fingerprint map (see utils.pipeline.row_fingerprint),
+                kept with the job so a reattached page can cache results by fingerprint
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.rows = rows
+        self.config = config
+        self.history_manager = history_manager
+        self.row_keys = row_keys or {}
+        self.status = QUEUED
+        self.total_rows = len(rows)
+        self.current_label = ""
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rows_done = 0
+        self.titles_done = 0
+        # First-round generation requests of the groups started so far (for utils.estimator)
+        self.requests_planned = 0
+        # ResultWriter, opened when the job starts (None if the output directory is not writable)
+        self.writer: Optional[ResultWriter] = None
+        # Adaptive concurrency limiter of the job's account and model (None: fixed row concurrency)
+        self.limiter = get_limiter(config['api_key'], config['model_name']) if config.get('adaptive_concurrency') else None
+        # Opt-in CPU/memory profiler, and its report once the job has ended
+        self.profiler = JobProfiler() if config.get('profile') or PROFILE_ALL_JOBS else None
+        self.profile: Optional[dict] = None
+        # Recently finished rows as (index, results), in finishing order; the first
+        # _row_log_offset rows were dropped from memory after being written to disk
+        self._row_log: List[Tuple[int, list]] = []
+        self._row_log_offset = 0
+        self.row_errors: List[Tuple[int, str]] = []
+        self.usage = TokenUsage()
+        self.stop_reason = None
+        self.row_durations: List[float] = []
+        self._rows_in_flight = 0
+        self._row_seconds = 0.0
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the job to stop. Rows already in flight still finish."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, CANCELLED, FAILED)
+
+    def profiled(self):
+        """Context manager profiling the calling thread when the job is profiled."""
+        return self.profiler.capture() if self.profiler else contextlib.nullcontext()
+
+    def rows_since(self, cursor: int) -> Tuple[List[Tuple[int, list]], int]:
+        """
+        Rows finished after `cursor` as (index, results) pairs, and the new cursor.
+        A cursor that fell behind the in-memory window is served from the job's log file.
+        """
+        with self._lock:
+            offset = self._row_log_offset
+            recent = self._row_log[max(cursor - offset, 0):]
+            new_cursor = offset + len(self._row_log)
+        older = self.writer.read_rows(cursor, offset) if cursor < offset else []
+        return older + recent, new_cursor
+
+    def progress(self) -> dict:
+        """Snapshot of the job's progress for display."""
+        with self._lock:
+            done = self.rows_done
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        eta = None
+        if done and self.status == RUNNING:
+            eta = elapsed / done * (self.total_rows - done)
+        return {
+            'status': self.status,
+            'done': done,
+            'total': self.total_rows,
+            'elapsed': elapsed,
+            'eta': eta,
+            'current': self.current_label,
+            'errors': len(self.row_errors),
+            'error': self.error,
+            'tokens': self.usage.total_tokens,
+            'stop_reason': self.stop_reason,
+            'concurrency': self.limiter.snapshot() if self.limiter else None
+        }
+
+    def can_start_row(self) -> bool:
+        """
+        Whether another row is expected to finish within the job's deadline and token
+        budget, judged by the average time and tokens of the rows finished so far
+        (rows in flight count as an average row each). A row allowed to start is
+        counted as in flight. Once a limit is reached the job stays stopped.
+        """
+        deadline = self.config.get('deadline_seconds')
+        budget = self.config.get('token_budget')
+        with self._lock:
+            if self.stop_reason:
+                return False
+            finished = len(self.row_durations)
+            if deadline:
+                avg_seconds = self._row_seconds / finished if finished else 0.0
+                if time.time() - self.started_at + avg_seconds > deadline:
+                    self.stop_reason = STOP_DEADLINE
+            if budget and not self.stop_reason:
+                used = self.usage.total_tokens
+                avg_tokens = used / finished if finished else 0.0
+                if used + avg_tokens * (self._rows_in_flight + 1) > budget:
+                    self.stop_reason = STOP_TOKEN_BUDGET
+            if self.stop_reason:
+                return False
+            self._rows_in_flight += 1
+            return True
+
+    def _time_row(self, started: float) -> None:
+        seconds = time.time() - started
+        with self._lock:
+            self.row_durations.append(seconds)
+            self._rows_in_flight -= 1
+            self._row_seconds += seconds
+
+    def _record_row(self, index, results: list) -> None:
+        flush = False
+        with self._lock:
+            self._row_log.append((index, results))
+            self.rows_done += 1
+            self.titles_done += len(results)
+            if self.writer:
+                # Queued under the job lock so the files keep the log's order
+                flush = self.writer.append(index, results)
+                # Forget rows that are safely on disk once the window is full
+                excess = min(len(self._row_log) - RESULT_WINDOW_ROWS, self.writer.written_rows - self._row_log_offset)
+                if excess > 0:
+                    del self._row_log[:excess]
+                    self._row_log_offset += excess
+        if flush:
+            try:
+                self.writer.flush()
+            except OSError as e:
+                # The rows stay buffered (the next flush retries) and in the log the page reads
+                self.row_errors.append((index, f"结果文件写入失败: {e}"))
+
+
+class JobManager:
+    """
+    Process-wide job queue. A small pool of job threads runs queued jobs in
+    submission order; each job fans its rows out to its own row pool.
+    """
+
+    def __init__(self, max_running: int = MAX_RUNNING_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="title-genie-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, rows: list, config: dict, history_manager, row_keys: Optional[dict] = None) -> Job:
+        """Queue a new job and return it."""
+        job = Job(rows, config, history_manager, row_keys)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> int:
+        """Number of queued jobs submitted before `job` (0 if it is running or done)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == QUEUED and j.created_at < job.created_at)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [i for i, j in self._jobs.items() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        if job.cancelled:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+
+        job.status = RUNNING
+        if job.profiler:
+            job.profiler.start()
+        try:
+            job.writer = ResultWriter(job.id)
+        except OSError:
+            job.writer = None  # Results stay in memory only
+        status = FAILED
+        try:
+            with job.profiled():
+                # Browser history must be loaded by the page before submitting: the
+                # localStorage component can't be read from this thread
+                if not job.history_manager.local_storage:
+                    job.history_manager.ensure_loaded()
+                concurrency = max(1, int(job.config.get('concurrency', DEFAULT_ROW_CONCURRENCY)))
+                if job.limiter:
+                    # Enough row workers for the highest limit; the limiter decides how many call at once
+                    concurrency = ADAPTIVE_MAX_CONCURRENCY
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"job-{job.id}") as pool:
+                    for members in self._groups(job):
+                        pool.submit(self._run_group, job, members)
+                if job.writer:
+                    try:
+                        job.writer.close()
+                    except Exception:
+                        pass  # The results themselves are in memory and the CSV; only the xlsx copy is missing
+            status = CANCELLED if job.cancelled else DONE
+            record_job(job.config['model_name'], job.usage, job.requests_planned, job.titles_done)
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        finally:
+            # The profile is attached before the status changes, so pages see it with the result
+            if job.profiler:
+                try:
+                    job.profile = job.profiler.finish(os.path.join(OUTPUT_DIR, f"{job.id}.prof"))
+                except Exception:
+                    pass  # A failed profile must not fail the job
+            job.finished_at = time.time()
+            job.status = status
+
+    @staticmethod
+    def _groups(job: Job) -> list:
+        """
+        The job's rows grouped by identical prompts (row fingerprint), as lists of
+        (index, row). Groups keep the processing order of their first member.
+        """
+        groups = {}
+        for index, row in job.rows:
+            key = group_key(job.row_keys[index]) if index in job.row_keys else row_fingerprint(row, job.config)
+            groups.setdefault(key, []).append((index, row))
+        return list(groups.values())
+
+    @staticmethod
+    def _run_group(job: Job, members: list) -> None:
+        if job.cancelled or not job.can_start_row():
+            return
+        index, row = members[0]
+        indices = [i for i, _ in members]
+        job.current_label = f"({index + 1}) {row_label(row)}" + (f" 等 {len(members)} 行相同产品" if len(members) > 1 else "")
+        with job._lock:
+            job.requests_planned += group_requests(len(members), job.config['num_titles'], job.config.get('overgenerate', False))
+        started = time.time()
+        try:
+            with job.profiled(), use_terms(job.config.get('terms')):
+                group_results = generate_group_titles(indices, row, job.config, job.history_manager, job.usage)
+        except Exception as e:
+            job.row_errors.extend((i, str(e)) for i in indices)
+            return
+        finally:
+            job._time_row(started)
+
+        recorded = []
+        try:
+            for i in indices:
+                job._record_row(i, group_results[i])
+                recorded.append(i)
+
+            # File-backed history is saved by the worker; browser storage can only be
+            # written from a script run, so the polling page syncs it instead.
+            if not job.history_manager.local_storage:
+                job.history_manager.save_history()
+        except Exception as e:
+            # Reported here, as nothing checks the pool's futures
+            job.row_errors.extend((i, f"结果保存失败: {e}") for i in [i for i in indices if i not in recorded] or indices)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """The server-wide JobManager (created on first use)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
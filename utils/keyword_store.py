@@ -0,0 +1,204 @@
+"""
+Keyword performance store - weekly performance reports merged into one local database.
+
+Each imported report is reduced to per-keyword totals (impressions, clicks, products)
+for the week it covers and added to those already stored, so months of reports can be
+queried without keeping or rescanning them. Keywords are the words of the product
+names and the two-word phrases they form. The same report imported twice is
+recognised by its content and skipped, whichever week it is imported for.
+"""
+
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+import pandas as pd
+
+from utils.terms import STOPWORD, get_terms
+
+# Database file; TITLE_GENIE_KEYWORD_DB overrides it
+KEYWORD_DB = os.getenv("TITLE_GENIE_KEYWORD_DB", os.path.join(os.path.expanduser("~"), ".title_genie", "keyword_performance.db"))
+
+# Keywords need at least this many impressions in a window to rank by CTR
+MIN_RANK_IMPRESSIONS = 100
+
+# Seconds a writer waits for another session's write lock before giving up
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL DEFAULT '',
+    week TEXT NOT NULL,
+    products INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keyword_weeks (
+    keyword TEXT NOT NULL,
+    week TEXT NOT NULL,
+    impressions REAL NOT NULL DEFAULT 0,
+    clicks REAL NOT NULL DEFAULT 0,
+    products INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (keyword, week)
+);
+CREATE INDEX IF NOT EXISTS keyword_weeks_week ON keyword_weeks (week);
+"""
+
+_WORD = re.compile(r'\b[a-zA-Z]{3,}\b')
+
+
+def report_keywords(name: str) -> set:
+    """Keywords of one product name: its words and two-word phrases, without dictionary stopwords."""
+    terms = get_terms()
+    words = [w if not terms.is_term(w, STOPWORD) else None for w in _WORD.findall(str(name).lower())]
+    keywords = {w for w in words if w}
+    keywords.update(f"{a} {b}" for a, b in zip(words, words[1:]) if a and b)
+    return keywords
+
+
+def week_of(day: datetime.date) -> str:
+    """ISO date of the Monday starting the week of `day` (the store's time bucket)."""
+    return (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+
+class KeywordStore:
+    """
+    Per-keyword, per-week performance totals in SQLite.
+    Connections are per thread, as sqlite3 connections must not cross threads.
+    """
+
+    def __init__(self, path: str = KEYWORD_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def merge_report(self, report: pd.DataFrame, day: datetime.date = None, name: str = "") -> dict:
+        """
+        Add a performance report's keyword totals to its week.
+
+        Reports with Impressions and Clicks are summed as such; a report with only CTR
+        counts each product as one impression with CTR clicks (an unweighted mean).
+
+        Args:
+            report: DataFrame from load_performance_report
+            day: Any day of the week the report covers (default: today)
+            name: Shown in the list of imported reports
+
+        Returns:
+            dict with 'week', 'products', 'keywords' and 'duplicate' (True if the
+            report was imported before, for any week, and nothing was added; 'week'
+            is then the week it was stored under)
+        """
+        week = week_of(day or datetime.date.today())
+        if 'Impressions' in report.columns and 'Clicks' in report.columns:
+            impressions = pd.to_numeric(report['Impressions'], errors='coerce').fillna(0)
+            clicks = pd.to_numeric(report['Clicks'], errors='coerce').fillna(0)
+        else:
+            impressions = pd.Series(1.0, index=report.index)
+            clicks = pd.to_numeric(report['CTR'], errors='coerce').fillna(0)
+
+        products = pd.DataFrame({
+            'keyword': report['Product Name'].map(report_keywords).map(list),
+            'impressions': impressions,
+            'clicks': clicks,
+        }).explode('keyword').dropna(subset=['keyword'])
+        totals = products.groupby('keyword').agg(
+            impressions=('impressions', 'sum'), clicks=('clicks', 'sum'), products=('clicks', 'size')
+        )
+
+        # From the content only: the same report imported under another week is still a duplicate
+        digest = hashlib.sha1(
+            pd.util.hash_pandas_object(report[['Product Name']].assign(i=impressions, c=clicks), index=False).to_numpy().tobytes()
+        ).hexdigest()
+        conn = self._connection()
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO reports (digest, name, week, products, imported_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, name, week, len(report), datetime.datetime.now().isoformat(timespec='seconds'))
+            ).rowcount
+            if not inserted:
+                week = conn.execute("SELECT week FROM reports WHERE digest = ?", (digest,)).fetchone()[0]
+            else:
+                conn.executemany(
+                    "INSERT INTO keyword_weeks (keyword, week, impressions, clicks, products) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (keyword, week) DO UPDATE SET impressions = impressions + excluded.impressions, "
+                    "clicks = clicks + excluded.clicks, products = products + excluded.products",
+                    [(keyword, week, float(row.impressions), float(row.clicks), int(row.products))
+                     for keyword, row in totals.iterrows()]
+                )
+        return {'week': week, 'products': len(report), 'keywords': len(totals), 'duplicate': not inserted}
+
+    def top_keywords(self, weeks: Optional[int] = None, limit: int = 20, order: str = 'ctr',
+                     min_impressions: float = MIN_RANK_IMPRESSIONS, today: datetime.date = None) -> pd.DataFrame:
+        """
+        Best keywords over the most recent weeks.
+
+        Args:
+            weeks: Number of weeks up to the current one (None: all stored weeks)
+            limit: Keywords returned
+            order: 'ctr' (keywords with at least `min_impressions`), 'clicks' or 'impressions'
+            today: Day the window ends in (default: today)
+
+        Returns:
+            pd.DataFrame with keyword, impressions, clicks, ctr, products and weeks columns
+        """
+        if order not in ('ctr', 'clicks', 'impressions'):
+            raise ValueError(f"Unknown order '{order}'")
+        since = '0000-00-00'
+        if weeks:
+            since = week_of((today or datetime.date.today()) - datetime.timedelta(weeks=weeks - 1))
+        # Rare keywords would top a CTR ranking by chance
+        min_impressions = min_impressions if order == 'ctr' else 0
+        rows = self._connection().execute(
+            "SELECT keyword, SUM(impressions) AS impressions, SUM(clicks) AS clicks, "
+            "SUM(clicks) / NULLIF(SUM(impressions), 0) AS ctr, SUM(products) AS products, COUNT(*) AS weeks "
+            "FROM keyword_weeks WHERE week >= ? GROUP BY keyword HAVING SUM(impressions) >= ? "
+            f"ORDER BY {order} DESC, keyword LIMIT ?",
+            (since, min_impressions, limit)
+        ).fetchall()
+        return pd.DataFrame(rows, columns=['keyword', 'impressions', 'clicks', 'ctr', 'products', 'weeks'])
+
+    def reports(self) -> pd.DataFrame:
+        """Imported reports, newest week first."""
+        rows = self._connection().execute(
+            "SELECT week, name, products, imported_at FROM reports ORDER BY week DESC, id DESC"
+        ).fetchall()
+        return pd.DataFrame(rows, columns=['week', 'name', 'products', 'imported_at'])
+
+    def clear(self) -> None:
+        """Delete all stored reports and totals."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM keyword_weeks")
+            conn.execute("DELETE FROM reports")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_keyword_store() -> KeywordStore:
+    """The process-wide keyword store (one database shared by all sessions)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KeywordStore()
+        return _store
@@ -0,0 +1,434 @@
+"""
+Row generation pipeline: prompt -> model -> cleanup -> validation -> AI polishing.
+Runs without Streamlit so it can be driven by the background job worker.
+"""
+
+import hashlib
+import json
+import math
+import re
+import pandas as pd
+
+from utils.prompt_builder import build_messages, build_polish_messages
+from utils.text_gen import generate_text, get_limiter, is_error_reply
+from utils.validator import (
+    validate_brand,
+    check_duplication,
+    calculate_seo_score,
+    fix_acronyms,
+    remove_filler_words,
+    remove_punctuation
+)
+
+# Polishing rounds per title when the SEO score is below 100
+MAX_POLISH_ATTEMPTS = 2
+
+# Extra requests per row for titles that were missing or rejected
+MAX_TOP_UP_ROUNDS = 2
+
+# Shorter "titles" are preamble or fragments, not titles
+MIN_TITLE_LENGTH = 10
+
+# Titles asked for in one request; identical rows generated together need several requests
+MAX_TITLES_PER_REQUEST = 10
+
+# Over-generation mode: candidates requested per wanted title; the best are kept without polishing
+OVERGENERATION_FACTOR = 3
+
+# Candidates asked for in one over-generation request (titles are short, so the reply stays small)
+MAX_CANDIDATES_PER_REQUEST = 20
+
+# Weight of diversity against SEO score when picking among candidates (maximal marginal relevance)
+DIVERSITY_WEIGHT = 0.3
+
+# Titles of one row more similar than this (difflib ratio) are duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Generation config keys that shape row fingerprints (besides the row, its product section and the keyword index)
+FINGERPRINT_SETTINGS = ('mode', 'extra_context', 'keyword_positions', 'starred_fields', 'num_titles', 'model_name',
+                        'overgenerate')
+
+# Reply schema requested from the model
+TITLES_JSON_FORMAT = '{"titles": ["<title 1>", "<title 2>", ...]}'
+
+
+def row_label(row) -> str:
+    """Short display label for a product row (its Main Keyword)."""
+    main_kw = row.get('Main Keyword', '未知产品')
+    if pd.isna(main_kw):
+        return '未知产品'
+    return str(main_kw)
+
+
+def prompt_args(config: dict, row) -> dict:
+    """
+    build_messages keyword arguments for one row, taken from a generation config.
+    Rows of a sheet compiled with compile_product_sections (config 'product_sections',
+    looked up by the row's index label) reuse their precompiled product section.
+    """
+    keyword_index = config.get('keyword_index')
+    performance_keywords = None
+    if keyword_index is not None:
+        performance_keywords = keyword_index.relevant(row.get('Main Keyword', ''), row.get('Core Keyword', ''))
+    sections = config.get('product_sections')
+    return dict(
+        mode=config['mode'],
+        extra_context=config.get('extra_context', ''),
+        keyword_positions=config.get('keyword_positions'),
+        starred_fields=config.get('starred_fields'),
+        performance_keywords=performance_keywords,
+        product_section=sections.get(row.name) if sections is not None else None
+    )
+
+
+def row_fingerprint(row, config: dict) -> str:
+    """
+    Content hash of everything that shapes a row's titles: the prompt built from
+    the row's columns plus the generation settings. Rows with an unchanged
+    fingerprint can reuse earlier results, wherever they moved in the sheet.
+    """
+    settings = [config['num_titles'], config['model_name']]
+    if config.get('overgenerate'):
+        settings.append('overgenerate')  # Only when set, so keys of the default mode stay unchanged
+    payload = json.dumps([build_messages(row, **prompt_args(config, row))] + settings, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def row_keys_for(rows, config: dict) -> dict:
+    """
+    Cache keys of (index, row) pairs: each row's fingerprint, with "#<n>" appended
+    for the n-th (n >= 2) row of the same fingerprint, so identical rows still keep
+    their own titles.
+
+    Returns:
+        dict: index -> key
+    """
+    seen = {}
+    keys = {}
+    for index, row in rows:
+        fingerprint = row_fingerprint(row, config)
+        seen[fingerprint] = seen.get(fingerprint, 0) + 1
+        keys[index] = fingerprint if seen[fingerprint] == 1 else f"{fingerprint}#{seen[fingerprint]}"
+    return keys
+
+
+def group_key(row_key: str) -> str:
+    """The fingerprint shared by identical rows (a row key without its occurrence suffix)."""
+    return row_key.split('#', 1)[0]
+
+
+def group_requests(group_size: int, num_titles: int, overgenerate: bool = False) -> int:
+    """First-round requests needed for a group of identical rows."""
+    if overgenerate:
+        return math.ceil(group_size * num_titles * OVERGENERATION_FACTOR / MAX_CANDIDATES_PER_REQUEST)
+    return math.ceil(group_size * num_titles / MAX_TITLES_PER_REQUEST)
+
+
+def first_request_titles(num_titles: int, overgenerate: bool = False) -> int:
+    """Titles asked for in a row's first request."""
+    if overgenerate:
+        return min(num_titles * OVERGENERATION_FACTOR, MAX_CANDIDATES_PER_REQUEST)
+    return min(num_titles, MAX_TITLES_PER_REQUEST)
+
+
+def titles_task(count: int, avoid_titles=None) -> str:
+    """Task instruction asking for `count` titles as a JSON object."""
+    task = (
+        f"Task: Generate {count} distinct, professional titles for this product.\n"
+        f"Output ONLY a JSON object of the form {TITLES_JSON_FORMAT} containing exactly {count} titles, "
+        f"with no numbering, notes or other text."
+    )
+    if avoid_titles:
+        existing = "\n".join(f"- {t}" for t in avoid_titles)
+        task += f"\nEach new title MUST be clearly different from these existing titles:\n{existing}"
+    return task
+
+
+def parse_titles(content: str) -> list:
+    """
+    Extracts titles from a model reply and validates them against the schema
+    {"titles": [str, ...]}.
+
+    Returns:
+        list: Valid title strings (empty if the reply does not match the schema)
+    """
+    # Tolerate markdown code fences or stray text around the object
+    start, end = content.find('{'), content.rfind('}')
+    if start == -1 or end <= start:
+        return []
+    try:
+        data = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(data, dict) or not isinstance(data.get('titles'), list):
+        return []
+
+    titles = []
+    for item in data['titles']:
+        if not isinstance(item, str):
+            continue
+        title = re.sub(r'^\d+\.?\s*', '', item.strip())  # Numbering despite instructions
+        if len(title) >= MIN_TITLE_LENGTH:
+            titles.append(title)
+    return titles
+
+
+def polish_title(title: str, seo_score: int, seo_notes: str, brand, main_kw, core_kw, api_key: str, model_name: str,
+                 usage=None, limiter=None):
+    """
+    AI self-correction loop: asks the model to fix the faults found by the SEO scorer.
+
+    Returns:
+        tuple: (title, seo_score, seo_notes) after at most MAX_POLISH_ATTEMPTS rounds
+    """
+    attempts = 0
+    while seo_score < 100 and attempts < MAX_POLISH_ATTEMPTS:
+        attempts += 1
+        polish_messages = build_polish_messages(title, seo_notes, brand, main_kw, core_kw)
+        if usage is not None:
+            usage.add_polish()
+        polished_title = generate_text(polish_messages, api_key, model_name, usage=usage, limiter=limiter).strip()
+        polished_title = re.sub(r'^["\']|["\']$', '', polished_title)  # Remove quotes
+
+        # Re-Validate
+        new_score, new_notes = calculate_seo_score(polished_title, brand, main_kw, core_kw)
+
+        if new_score >= seo_score:
+            title = polished_title
+            seo_score = new_score
+            seo_notes = f"[Polished V{attempts}] {new_notes}"
+            if seo_score == 100:
+                break
+    return title, seo_score, seo_notes
+
+
+def select_diverse(candidates: list, count: int, chosen=()) -> list:
+    """
+    Greedy maximal-marginal-relevance pick: repeatedly takes the candidate with the
+    best (1 - DIVERSITY_WEIGHT) x SEO score - DIVERSITY_WEIGHT x similarity to the
+    closest title chosen so far. Near-duplicates of chosen titles (see
+    check_duplication) are never picked.
+
+    Args:
+        candidates: Dicts with 'title' and 'score' (0-100)
+        count: Titles to pick
+        chosen: Titles picked before (e.g. in earlier rounds)
+
+    Returns:
+        list: The picked candidates, best first
+    """
+    remaining = list(candidates)
+    closest = [check_duplication(c['title'], list(chosen))[1] for c in remaining]
+    picked = []
+    while remaining and len(picked) < count:
+        values = [(1 - DIVERSITY_WEIGHT) * c['score'] / 100 - DIVERSITY_WEIGHT * sim for c, sim in zip(remaining, closest)]
+        best = max(range(len(remaining)), key=values.__getitem__)
+        candidate, similarity = remaining.pop(best), closest.pop(best)
+        if similarity > DUPLICATE_THRESHOLD:
+            continue
+        picked.append(candidate)
+        closest = [max(sim, check_duplication(c['title'], [candidate['title']])[1]) for c, sim in zip(remaining, closest)]
+    return picked
+
+
+def clean_generated_title(title: str, brand) -> str:
+    """Post-AI cleanup and normalization of one generated title, with the brand enforced."""
+    title = remove_punctuation(title)  # Remove commas/periods FIRST
+    title = remove_filler_words(title)
+    title = fix_acronyms(title)
+    title, _ = validate_brand(title, brand)
+    return title
+
+
+def result_row(index, brand, main_kw, core_kw, title: str, seo_score: int, notes: str, similar: bool) -> dict:
+    """One row of the results table."""
+    return {
+        "原行号 (Row ID)": index + 1,
+        "品牌 (Brand)": brand,
+        "主词 (Main Keyword)": main_kw,
+        "核心词 (Core Keyword)": core_kw,
+        "AI 生成标题 (AI Suggestions)": title,
+        "SEO 得分": seo_score,
+        "扣分原因": notes,
+        "疑似重复": bool(similar)
+    }
+
+
+def add_to_history(history_manager, titles: list, brand) -> None:
+    """
+    Adds a finished group's titles, as (index, title) pairs, to the history. Called
+    only once all of the group's requests succeeded, so a failed group leaves no
+    titles behind that its retry would be deduplicated against.
+    """
+    for index, title in titles:
+        history_manager.add_title(title, brand=brand, product_id=f"Row-{index+1}")
+
+
+def generate_row_titles(index, row, config: dict, history_manager, usage=None) -> list:
+    """
+    Generates, cleans, validates and polishes titles for one product row.
+    See generate_group_titles.
+
+    Returns:
+        list: Result rows (dicts) ready for the results table
+    """
+    return generate_group_titles([index], row, config, history_manager, usage)[index]
+
+
+def generate_group_titles(indices: list, row, config: dict, history_manager, usage=None) -> dict:
+    """
+    Generates, cleans, validates and polishes titles for a group of identical
+    product rows (rows whose prompts are the same) with shared requests: the group
+    asks for `num_titles` distinct titles per member and hands them out in turn.
+    When fewer titles survive validation, small top-up requests ask for only the
+    missing count. A failed request (top-ups included) raises RuntimeError, so the
+    group's rows are reported as failed and can be retried instead of finishing
+    short of titles; the group's titles reach the history only once it succeeded.
+
+    Args:
+        indices: Row indices of the group's members in the uploaded DataFrame (0-based)
+        row: The product data row (pd.Series) the members share
+        config: Generation settings with keys 'mode', 'keyword_positions', 'starred_fields',
+            'num_titles', 'api_key', 'model_name', 'extra_context' and optionally
+            'keyword_index' (KeywordIndex of a performance report),
+            'product_sections' (compile_product_sections of the sheet),
+            'adaptive_concurrency' (API calls wait for the account's AdaptiveLimiter) and
+            'overgenerate' (rank extra candidates locally instead of polishing, see _overgenerate_group)
+        history_manager: TitleHistoryManager used for cross-library deduplication
+        usage: Optional TokenUsage accumulating the tokens of every API call for the group
+
+    Returns:
+        dict: index -> result rows (dicts) ready for the results table
+    """
+    brand = row.get('Brand', '')
+    main_kw = row.get('Main Keyword', '')
+    core_kw = row.get('Core Keyword', '')
+    api_key = config['api_key']
+    model_name = config['model_name']
+    limiter = get_limiter(api_key, model_name) if config.get('adaptive_concurrency') else None
+    if config.get('overgenerate'):
+        return _overgenerate_group(indices, row, config, history_manager, usage, limiter)
+    wanted = config['num_titles'] * len(indices)
+
+    message_args = prompt_args(config, row)
+
+    accepted_titles = []
+    results = {index: [] for index in indices}
+    accepted_count = 0
+    # (index, title) of the results, added to the history once every request has succeeded
+    history_titles = []
+    # Everything the model produced for this group, so later requests don't repeat titles
+    seen_titles = []
+
+    for round_no in range(group_requests(len(indices), config['num_titles']) + MAX_TOP_UP_ROUNDS):
+        missing = wanted - accepted_count
+        if missing <= 0:
+            break
+
+        # Call API (first rounds ask for all titles, top-ups only for the missing ones)
+        # The system message is identical for every row of the job; only the user message varies
+        task = titles_task(min(missing, MAX_TITLES_PER_REQUEST), seen_titles if round_no else None)
+        messages = build_messages(row, task=task, **message_args)
+        reply = generate_text(messages, api_key, model_name, json_mode=True, usage=usage, limiter=limiter)
+        if is_error_reply(reply):
+            # Rows stay unprocessed and can be retried, rather than finishing short of titles
+            raise RuntimeError(reply if not round_no else f"{reply} (已生成 {accepted_count}/{wanted} 条)")
+        candidates = parse_titles(reply)
+        seen_titles.extend(candidates)
+
+        for clean_title in candidates:
+            if accepted_count >= wanted:
+                break
+
+            # 0-1. Post-AI Cleanup & Normalization, Brand Validation
+            clean_title = clean_generated_title(clean_title, brand)
+
+            # 2. Duplicate Detection (Batch + History)
+            # Check batch dupes
+            is_dup_batch, _ = check_duplication(clean_title, accepted_titles, DUPLICATE_THRESHOLD)
+            if is_dup_batch: continue
+
+            # Check history dupes (Cross-Library)
+            is_dup_hist, score_hist, sim_title = history_manager.check_similarity(clean_title, threshold=DUPLICATE_THRESHOLD)
+
+            # Filter near-identicals (> 0.95), otherwise just warn in notes
+            dup_note = ""
+            if is_dup_hist:
+                if score_hist > 0.95:
+                    continue  # Skip identicals
+                dup_note = f" (与历史标题相似度 {score_hist:.0%})"
+
+            accepted_titles.append(clean_title)
+
+            # 3. SEO Scoring + AI Polishing
+            seo_score, seo_notes = calculate_seo_score(clean_title, brand, main_kw, core_kw)
+            clean_title, seo_score, seo_notes = polish_title(
+                clean_title, seo_score, seo_notes, brand, main_kw, core_kw, api_key, model_name, usage, limiter
+            )
+
+            # Members take turns, so each gets an even share of the group's titles
+            index = indices[accepted_count % len(indices)]
+            accepted_count += 1
+            results[index].append(result_row(index, brand, main_kw, core_kw, clean_title, seo_score,
+                                             seo_notes + dup_note, is_dup_hist))
+            history_titles.append((index, clean_title))
+
+    add_to_history(history_manager, history_titles, brand)
+    return results
+
+
+def _overgenerate_group(indices: list, row, config: dict, history_manager, usage, limiter) -> dict:
+    """
+    generate_group_titles in over-generation mode: each request asks for
+    OVERGENERATION_FACTOR candidates per missing title; all of them are cleaned and
+    scored locally, and the best varied ones (select_diverse) are kept as they are,
+    without polishing requests.
+    """
+    brand = row.get('Brand', '')
+    main_kw = row.get('Main Keyword', '')
+    core_kw = row.get('Core Keyword', '')
+    wanted = config['num_titles'] * len(indices)
+    message_args = prompt_args(config, row)
+    first_rounds = group_requests(len(indices), config['num_titles'], overgenerate=True)
+
+    results = {index: [] for index in indices}
+    picked = []
+    pool = []         # Scored candidates not yet ranked
+    seen_titles = []  # Everything the model produced for this group
+
+    for round_no in range(first_rounds + MAX_TOP_UP_ROUNDS):
+        missing = wanted - len(picked)
+        if missing <= 0:
+            break
+        count = min(missing * OVERGENERATION_FACTOR - len(pool), MAX_CANDIDATES_PER_REQUEST)
+        messages = build_messages(row, task=titles_task(count, seen_titles if round_no else None), **message_args)
+        reply = generate_text(messages, config['api_key'], config['model_name'], json_mode=True, usage=usage,
+                              limiter=limiter)
+        if is_error_reply(reply):
+            # Rows stay unprocessed and can be retried, rather than finishing short of titles
+            raise RuntimeError(reply if not round_no else f"{reply} (已生成 {len(picked)}/{wanted} 条)")
+        candidates = parse_titles(reply)
+        seen_titles.extend(candidates)
+
+        for title in candidates:
+            title = clean_generated_title(title, brand)
+            is_dup_hist, score_hist, _ = history_manager.check_similarity(title, threshold=DUPLICATE_THRESHOLD)
+            if is_dup_hist and score_hist > 0.95:
+                continue  # Skip identicals
+            seo_score, seo_notes = calculate_seo_score(title, brand, main_kw, core_kw)
+            dup_note = f" (与历史标题相似度 {score_hist:.0%})" if is_dup_hist else ""
+            pool.append({'title': title, 'score': seo_score, 'notes': seo_notes + dup_note, 'similar': is_dup_hist})
+
+        # The first rounds gather the whole candidate pool before it is ranked
+        if len(pool) < missing * OVERGENERATION_FACTOR and round_no + 1 < first_rounds:
+            continue
+        for candidate in select_diverse(pool, missing, [c['title'] for c in picked]):
+            # Members take turns, so each gets an even share of the group's titles
+            index = indices[len(picked) % len(indices)]
+            picked.append(candidate)
+            results[index].append(result_row(index, brand, main_kw, core_kw, candidate['title'], candidate['score'],
+                                             candidate['notes'], candidate['similar']))
+        pool = []
+
+    add_to_history(history_manager, [(indices[i % len(indices)], c['title']) for i, c in enumerate(picked)], brand)
+    return results
@@ -0,0 +1,144 @@
+"""
+Job Profiler - opt-in CPU and memory profile of one generation job.
+
+The job thread and each row worker thread run under their own cProfile profiler,
+merged when the job ends; tracemalloc snapshots taken at the start and the end show
+where the job allocated memory. Profiling slows Python code noticeably, so it is
+off unless enabled for a job in the settings or for every job with
+TITLE_GENIE_PROFILE=1. tracemalloc is process-wide: allocations of other jobs
+running at the same time are included in a job's snapshot.
+
+From Python 3.12, cProfile is built on sys.monitoring, which allows one active
+profiler per process and sees every thread. There the first profiler enabled
+(the job thread's) records the row threads too, and threads that cannot enable
+their own profiler run unprofiled. Of two profiled jobs running at the same
+time, only the one started first gets CPU hotspots.
+"""
+
+import contextlib
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from typing import Optional
+
+# Profile every job, whatever its settings
+PROFILE_ALL_JOBS = os.getenv("TITLE_GENIE_PROFILE", "") not in ("", "0")
+
+# Rows shown in the hotspot and allocation tables
+TOP_HOTSPOTS = 25
+TOP_ALLOCATIONS = 25
+
+# Allocation sites are grouped by the innermost frame only (cheapest to record)
+TRACEMALLOC_FRAMES = 1
+
+# Jobs currently using tracemalloc; it is stopped when the last one finishes
+_tracing = {'jobs': 0, 'owned': False}
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing() -> None:
+    with _tracing_lock:
+        if not _tracing['jobs'] and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing['owned'] = True
+        _tracing['jobs'] += 1
+
+
+def _stop_tracing() -> None:
+    with _tracing_lock:
+        _tracing['jobs'] -= 1
+        if not _tracing['jobs'] and _tracing['owned']:
+            tracemalloc.stop()
+            _tracing['owned'] = False
+
+
+def _short_path(filename: str) -> str:
+    """Path relative to the working directory when inside it (keeps tables narrow)."""
+    try:
+        relative = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if relative.startswith('..') else relative
+
+
+class JobProfiler:
+    """CPU profile (one cProfile profiler per thread) and memory snapshots of one job."""
+
+    def __init__(self):
+        self._profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._before = None
+
+    def start(self) -> None:
+        """Start memory tracing; call once, before the job's work."""
+        _start_tracing()
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Profile the calling thread for the duration of the block."""
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: another profiler is active (see the module docstring)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def finish(self, path: Optional[str] = None) -> dict:
+        """
+        Stop memory tracing and summarize the job.
+
+        Args:
+            path: Where to write the merged profile (pstats format), or None
+
+        Returns:
+            dict with 'hotspots' (functions by own time), 'allocations' (allocation
+            sites by memory growth), 'peak_kb' and 'profile_path' (None if not written)
+        """
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        _stop_tracing()
+
+        with self._lock:
+            profiles = [p for p in self._profiles if p.getstats()]
+        hotspots, profile_path = [], None
+        if profiles:
+            stats = pstats.Stats(*profiles)
+            rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:TOP_HOTSPOTS]
+            hotspots = [{
+                'function': name if filename == '~' else f"{name} ({_short_path(filename)}:{line})",  # '~': built-ins
+                'calls': calls,
+                'own_seconds': own,
+                'total_seconds': total,
+            } for (filename, line, name), (_, calls, own, total, _) in rows]
+            if path:
+                try:
+                    stats.dump_stats(path)
+                    profile_path = path
+                except OSError:
+                    pass
+
+        # Module imports and tracemalloc itself are not the job's memory
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib.*>")]
+        growth = after.filter_traces(ignore).compare_to(self._before.filter_traces(ignore), 'lineno')
+        allocations = [{
+            'location': f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            'size_kb': stat.size / 1024,
+            'growth_kb': stat.size_diff / 1024,
+            'blocks': stat.count,
+        } for stat in sorted(growth, key=lambda s: -s.size_diff)[:TOP_ALLOCATIONS]]
+
+        return {'hotspots': hotspots, 'allocations': allocations, 'peak_kb': peak / 1024, 'profile_path': profile_path}
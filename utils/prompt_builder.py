@@ -1,64 +1,27 @@
+import functools
+import re
+
 import pandas as pd
 
-def build_prompt(row, mode="Mode A", extra_context="", keyword_positions=None, starred_fields=None):
-    """
-    Constructs the prompt for Qwen based on the product data row and selected mode.
-    keyword_positions: dict like {'Brand': '前', 'Main Keyword': '中', ...}
-    starred_fields: list of field names that MUST be included.
-    """
-    
-    # Mandatory Keys
-    brand = row.get('Brand', '')
-    main_kw = row.get('Main Keyword', '')
-    core_kw = row.get('Core Keyword', '')
-    
-    # Context
-    context_items = []
-    
-    if extra_context:
-        context_items.append(f"--- HISTORICAL PERFORMANCE INSIGHTS ---\n{extra_context}\n---------------------------------------")
-        
-    for key, val in row.items():
-        if key not in ['Brand', 'Main Keyword', 'Core Keyword', 'Generated Titles', 'Original Row ID'] and pd.notna(val) and str(val).strip() != '':
-            context_items.append(f"- {key}: {val}")
-    context_str = "\n".join(context_items)
-    
-    # Keyword Positioning Rules
-    pos_rules = []
-    if keyword_positions:
-        # Map generic names to actual values for clarity in prompt
-        # We use the terms "Brand", "Main Keyword", "Core Keyword" as placeholders in instruction
-        
-        for kw_type, pos in keyword_positions.items():
-            kw_val = row.get(kw_type, '')
-            if not kw_val: continue
-            
-            if pos == "前 (Front)":
-                pos_rules.append(f"- The {kw_type} '{kw_val}' MUST appear at the VERY BEGINNING (first 30 characters).")
-            elif pos == "中 (Middle)":
-                pos_rules.append(f"- The {kw_type} '{kw_val}' should appear in the MIDDLE section of the title.")
-            elif pos == "尾 (End)":
-                pos_rules.append(f"- The {kw_type} '{kw_val}' MUST appear at the VERY END of the title.")
-                
-    positioning_instruction = "\n".join(pos_rules) if pos_rules else ""
+ROLE_INSTRUCTION = "Role: You are an Alibaba International Station SEO expert specializing in high-converting product titles for global markets."
 
-    # Starred Fields Logic
-    starred_instruction = ""
-    if starred_fields:
-        starred_items = []
-        for field in starred_fields:
-            value = row.get(field, '')
-            if value and pd.notna(value):
-                starred_items.append(f'"{field}": "{value}"')
-        if starred_items:
-            starred_instruction = f"""
-**STARRED FIELDS (MUST INCLUDE - can be AI-optimized/extracted):**
-{chr(10).join(starred_items)}
-The content of these fields MUST be included in the generated titles. You may rephrase, extract key identifiers, or optimize the wording to fit better, but the CORE INFORMATION from these fields must be present.
-"""
+# Columns that are never passed to the model as product context
+NON_CONTEXT_COLUMNS = ['Brand', 'Main Keyword', 'Core Keyword', 'Generated Titles', 'Original Row ID']
+
+# Longest value (characters) of one context field; longer text is cut at a sentence or word boundary
+CONTEXT_FIELD_MAX_CHARS = 200
+
+# Starred fields must reach the titles, so they get more room
+STARRED_FIELD_MAX_CHARS = 400
 
-    # FEW-SHOT EXAMPLES (Mode B Focus)
-    few_shot_examples = """
+# All context lines of a row together; fields past this budget are left out (columns in sheet order)
+CONTEXT_MAX_CHARS = 1200
+
+# Marks a value that was cut to its budget
+TRUNCATION_MARK = "…"
+
+# FEW-SHOT EXAMPLES (Mode B Focus)
+FEW_SHOT_EXAMPLES = """
 Examples of Good Titles (Natural & High CTR):
 1. TechNova Wireless Earbuds - Bluetooth 5.0 Headphones with Noise Cancelling & 24h Battery for Gym
 2. EcoLife Bamboo Toothbrush Pack of 4 - Biodegradable Soft Bristles for Sensitive Gums, Plastic-Free
@@ -70,14 +33,51 @@ Examples of BAD Titles (Do NOT do this):
 3. TechNova Wireless Earbuds Bluetooth 5.0 Headphones Noise Cancelling (Just keywords piled up)
 """
 
-    role_instruction = "Role: You are an Alibaba International Station SEO expert specializing in high-converting product titles for global markets."
+POLISH_SYSTEM_PROMPT = f"""{ROLE_INSTRUCTION}
+You will receive a title that needs optimization to reach a perfect SEO score (100), with its faults and mandatory keywords.
+
+Task: Rewrite the title to fix all faults.
+If it's too long, you MUST REMOVE non-essential descriptive words or specifications.
+The new title MUST:
+1. Start with the Brand followed by the Main Keyword
+2. Include the Core Keyword
+3. Be between 80 - 120 characters total (STRICT HARD LIMIT: DO NOT EXCEED 120).
+Output ONLY the new title.
+"""
+
+
+def build_system_prompt(mode="Mode A", extra_context="", keyword_positions=None):
+    """
+    The static part of the prompt: role, constraints, strategy and examples.
+    It only depends on the job settings, so every row of a job shares it as an
+    identical prefix (eligible for provider-side context caching), and it is
+    rendered once per distinct settings rather than once per row.
+    keyword_positions: dict like {'Brand': '前 (Front)', 'Main Keyword': '中 (Middle)', ...}
+    """
+    return _render_system_prompt(mode, extra_context, tuple((keyword_positions or {}).items()))
+
+
+@functools.lru_cache(maxsize=32)
+def _render_system_prompt(mode, extra_context, keyword_positions):
+    # Keyword Positioning Rules (values are given per row in the user message)
+    pos_rules = []
+    if keyword_positions:
+        for kw_type, pos in keyword_positions:
+            if pos == "前 (Front)":
+                pos_rules.append(f"- The {kw_type} MUST appear at the VERY BEGINNING (first 30 characters).")
+            elif pos == "中 (Middle)":
+                pos_rules.append(f"- The {kw_type} should appear in the MIDDLE section of the title.")
+            elif pos == "尾 (End)":
+                pos_rules.append(f"- The {kw_type} MUST appear at the VERY END of the title.")
+
+    positioning_instruction = "\n".join(pos_rules) if pos_rules else ""
 
     constraints = f"""
 CRITICAL CONSTRAINTS (Strict Compliance Required):
 
 1. **Length**: 80 - 120 characters limits. **THIS IS A HARD LIMIT. IF THE TITLE EXCEEDS 120 CHARACTERS, IT WILL FAIL. PRUNE SPECIFICATIONS IF NECESSARY.**
 
-2. **Mandatory Keywords**: strictly include "{brand}", "{main_kw}", and "{core_kw}".
+2. **Mandatory Keywords**: strictly include the Brand, the Main Keyword and the Core Keyword given in the product data.
 
 3. **Keyword Positioning**:
 {positioning_instruction}
@@ -86,28 +86,26 @@ CRITICAL CONSTRAINTS (Strict Compliance Required):
    - **ABSOLUTELY NO COMMAS (,) or PERIODS (.) or EXCLAMATION MARKS (!)**.
    - Use ONLY hyphens (-) to separate distinct thought blocks.
    - Use spaces to separate words.
-   - Example: "{brand} {main_kw} - {core_kw} with High Performance"
+   - Example: "[Brand] [Main Keyword] - [Core Keyword] with High Performance"
 
-5. **Format**: 
-    - Capitalize First Letters (Title Case). 
+5. **Format**:
+    - Capitalize First Letters (Title Case).
     - **ACRONYMS**: Always uppercase standard acronyms (e.g., POS, LED, LCD, CPU, RAM, OS).
 
-6. **Readability & Quality**: 
+6. **Readability & Quality**:
     - **NO Redundancy**: Do not repeat the same keyword phrase twice.
-    - **Fluidity**: Use natural English flow. 
+    - **Fluidity**: Use natural English flow.
     - **NO Spam Words**: Avoid "New", "Hot Sale", "Best", "Cheap".
-    
-{starred_instruction}
+
+7. **STARRED FIELDS**: If the product data lists starred fields, their content MUST be included in the generated titles. You may rephrase, extract key identifiers, or optimize the wording to fit better, but the CORE INFORMATION from these fields must be present.
 """
 
     if mode == "Mode A": # Strict
-        strategy = f"""
+        strategy = """
 Strategy: STRICT STRUCTURE
 Structure: [Brand] + [Main Keyword] + [Key Specs/Attributes] + [Core Keyword]
 (Adjust structure ONLY IF Positioning Rules above require it)
-
-Context:
-{context_str}
+Use the product Context to fill in the Key Specs/Attributes.
 
 Task: Generate title strictly following the structure and constraints.
 """
@@ -115,19 +113,198 @@ Task: Generate title strictly following the structure and constraints.
         strategy = f"""
 Strategy: COMMERCIAL & CONVERSATIONAL
 Target Audience: Global B2B buyers seeking professional product solutions.
-Context (Use these variables to enrich the title):
-{context_str}
+Use the variables in the product Context to enrich the title.
 
-{few_shot_examples}
+{FEW_SHOT_EXAMPLES}
 
 Instruction:
-1. Start exactly according to the positioning rules (default to "{brand} {main_kw}" if no rules).
-2. Integrate "{core_kw}" and other key attributes naturally.
+1. Start exactly according to the positioning rules (default to "[Brand] [Main Keyword]" if no rules).
+2. Integrate the Core Keyword and other key attributes naturally.
 3. **DIVERSITY**: When generating multiple titles, ensure each title focuses on a DIFFERENT aspect (Tech Specs, Usage, Benefits).
 4. Use commercial adjectives (e.g., "Advanced", "Smart", "Efficient") but NO SPAM WORDS.
 5. Ensure the total length is between 80-120 characters.
 """
 
-    return f"{role_instruction}\n{constraints}\n{strategy}"
+    insights = ""
+    if extra_context:
+        insights = f"\n--- HISTORICAL PERFORMANCE INSIGHTS ---\n{extra_context}\n---------------------------------------\n"
+
+    return f"{ROLE_INSTRUCTION}\n{constraints}\n{strategy}{insights}"
+
+
+_SENTENCE_END = re.compile(r'^(.*[.;!?。；！？])', re.S)
+_LAST_WORD = re.compile(r'\s+\S*$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """
+    Cuts text longer than `limit` characters, preferably after the last full
+    sentence (if that keeps at least half the budget), otherwise after the last
+    whole word, and marks the cut with TRUNCATION_MARK.
+    """
+    if len(text) <= limit:
+        return text
+    head = text[:limit - len(TRUNCATION_MARK)]
+    sentence = _SENTENCE_END.match(head)
+    if sentence and len(sentence.group(1)) >= limit // 2:
+        return sentence.group(1) + TRUNCATION_MARK
+    return _LAST_WORD.sub('', head).rstrip(' ,;:-/') + TRUNCATION_MARK
+
+
+def _field_text(value, limit: int) -> str:
+    """A cell as a single-line string cut to `limit` ('' if the cell is empty)."""
+    if not isinstance(value, str) and pd.isna(value):
+        return ''
+    return truncate_text(_WHITESPACE.sub(' ', str(value)).strip(), limit)
+
+
+def _field_values(column: pd.Series, limit: int) -> pd.Series:
+    """_field_text of a whole column (only values over the budget are cut one by one)."""
+    values = column.where(column.notna(), '').astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
+    long = values.str.len() > limit
+    if long.any():
+        values = values.copy()
+        values[long] = values[long].map(lambda text: truncate_text(text, limit))
+    return values
+
+
+def _append_lines(lines: pd.Series, line: pd.Series, keep: pd.Series) -> pd.Series:
+    """Adds `line` as a new line to `lines` where `keep` is set."""
+    joined = lines.where(lines == '', lines + "\n") + line
+    return joined.where(keep, lines)
+
+
+def compile_product_sections(df: pd.DataFrame, starred_fields=None, field_budgets=None) -> pd.Series:
+    """
+    The product data part of every row's user message, built column by column for
+    the whole sheet: mandatory keywords, starred fields and the remaining columns
+    as context, each value within its character budget.
+
+    Args:
+        df: Product rows
+        starred_fields: Field names that MUST be included (listed separately, not repeated as context)
+        field_budgets: Optional column -> max characters, overriding CONTEXT_FIELD_MAX_CHARS
+            and STARRED_FIELD_MAX_CHARS per column
+
+    Returns:
+        pd.Series: index -> product section text
+    """
+    field_budgets = field_budgets or {}
+    empty = pd.Series('', index=df.index, dtype=object)
+
+    def mandatory(name):
+        return df[name].astype(str) if name in df.columns else empty
+
+    sections = ("Product Data:\n- Brand: " + mandatory('Brand') + "\n- Main Keyword: " + mandatory('Main Keyword')
+                + "\n- Core Keyword: " + mandatory('Core Keyword'))
+
+    # Starred Fields Logic
+    starred = [f for f in dict.fromkeys(starred_fields or []) if f in df.columns]
+    starred_lines = empty
+    for field in starred:
+        values = _field_values(df[field], field_budgets.get(field, STARRED_FIELD_MAX_CHARS))
+        starred_lines = _append_lines(starred_lines, f'"{field}": "' + values + '"', values != '')
+    sections = sections.where(starred_lines == '', sections + "\n\n**STARRED FIELDS (MUST INCLUDE):**\n" + starred_lines)
+
+    # Context: columns in sheet order until the row's context budget is spent
+    context_lines = empty
+    used = pd.Series(0, index=df.index)
+    for column in df.columns:
+        if column in NON_CONTEXT_COLUMNS or column in starred:
+            continue
+        values = _field_values(df[column], field_budgets.get(column, CONTEXT_FIELD_MAX_CHARS))
+        line = f"- {column}: " + values
+        keep = (values != '') & (used + line.str.len() <= CONTEXT_MAX_CHARS)
+        context_lines = _append_lines(context_lines, line, keep)
+        used = used + line.str.len().where(keep, 0)
+    return sections.where(context_lines == '', sections + "\n\nContext:\n" + context_lines)
+
+
+def product_section_of(row, starred_fields=None, field_budgets=None) -> str:
+    """compile_product_sections for a single row (pd.Series)."""
+    field_budgets = field_budgets or {}
+    section = (f"Product Data:\n- Brand: {row.get('Brand', '')}\n- Main Keyword: {row.get('Main Keyword', '')}\n"
+               f"- Core Keyword: {row.get('Core Keyword', '')}")
+
+    starred = [f for f in dict.fromkeys(starred_fields or []) if f in row.index]
+    starred_lines = []
+    for field in starred:
+        value = _field_text(row[field], field_budgets.get(field, STARRED_FIELD_MAX_CHARS))
+        if value:
+            starred_lines.append(f'"{field}": "{value}"')
+    if starred_lines:
+        section += "\n\n**STARRED FIELDS (MUST INCLUDE):**\n" + "\n".join(starred_lines)
+
+    context_lines = []
+    used = 0
+    for column, value in row.items():
+        if column in NON_CONTEXT_COLUMNS or column in starred:
+            continue
+        value = _field_text(value, field_budgets.get(column, CONTEXT_FIELD_MAX_CHARS))
+        line = f"- {column}: {value}"
+        if value and used + len(line) <= CONTEXT_MAX_CHARS:
+            context_lines.append(line)
+            used += len(line)
+    if context_lines:
+        section += "\n\nContext:\n" + "\n".join(context_lines)
+    return section
+
+
+def build_user_prompt(row, starred_fields=None, task="", performance_keywords=None, product_section=None):
+    """
+    The per-row part of the prompt: product data (see product_section_of),
+    performance keywords and the task.
+    starred_fields: list of field names that MUST be included.
+    performance_keywords: this product's high-CTR keywords (see KeywordIndex.relevant).
+    product_section: The row's precompiled product section, if the sheet was compiled at once.
+    """
+    sections = [product_section if product_section is not None else product_section_of(row, starred_fields)]
+
+    # High-CTR keywords of similar products (only the few relevant to this row)
+    if performance_keywords:
+        words = ", ".join(k['keyword'].title() for k in performance_keywords)
+        sections.append(f"High-CTR Keywords (past performance of similar products, use those that fit naturally): {words}")
+
+    if task:
+        sections.append(task)
+
+    return "\n\n".join(sections)
+
+
+def build_messages(row, mode="Mode A", extra_context="", keyword_positions=None, starred_fields=None, task="",
+                   performance_keywords=None, product_section=None):
+    """
+    Constructs the chat messages for Qwen: a static system message shared by all
+    rows of a job, followed by a compact per-row user message.
+
+    Returns:
+        list: [{'role': 'system', ...}, {'role': 'user', ...}]
+    """
+    return [
+        {'role': 'system', 'content': build_system_prompt(mode, extra_context, keyword_positions)},
+        {'role': 'user', 'content': build_user_prompt(row, starred_fields, task, performance_keywords, product_section)},
+    ]
+
+
+def build_polish_messages(title, seo_notes, brand, main_kw, core_kw):
+    """Chat messages asking the model to fix the SEO faults of one title."""
+    user = f"""Current Title: "{title}"
+Current Character Count: {len(title)}
+Faults Identified: {seo_notes}
+Mandatory Keywords: Brand "{brand}", Main Keyword "{main_kw}", Core Keyword "{core_kw}"
+"""
+    return [
+        {'role': 'system', 'content': POLISH_SYSTEM_PROMPT},
+        {'role': 'user', 'content': user},
+    ]
+
 
-    return f"{role_instruction}\n{constraints}\n{strategy}"
+def build_prompt(row, mode="Mode A", extra_context="", keyword_positions=None, starred_fields=None):
+    """
+    Constructs the prompt for Qwen as one flat string (system and user parts joined).
+    keyword_positions: dict like {'Brand': '前', 'Main Keyword': '中', ...}
+    starred_fields: list of field names that MUST be included.
+    """
+    messages = build_messages(row, mode, extra_context, keyword_positions, starred_fields)
+    return "\n\n".join(m['content'] for m in messages)
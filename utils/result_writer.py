@@ -0,0 +1,148 @@
+"""
+Result Writer - streams a job's results to disk as rows finish.
+
+Each job writes, under OUTPUT_DIR:
+  <job id>.jsonl  one line per finished row: {"index": ..., "results": [...]}
+                  (the replay log that pages read when they fall behind)
+  <job id>.csv    the flat results table, readable while the job runs
+  <job id>.xlsx   converted from the CSV when the job ends
+Finished rows wait in a small buffer and are appended every FLUSH_ROWS rows or
+FLUSH_SECONDS seconds, so the job's own memory use does not grow with the job.
+The sessions showing a job still hold every result they have polled (the page's
+ResultsStore plus its per-session result cache), so a session's memory grows
+with the number of rows it has received.
+"""
+
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import List, Tuple
+
+from utils.results_store import DUPLICATE_COLUMN, RESULT_COLUMNS, ROW_ID_COLUMN, SCORE_COLUMN
+
+# Directory for job output files; TITLE_GENIE_OUTPUT_DIR overrides it
+OUTPUT_DIR = os.getenv("TITLE_GENIE_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "title_genie_outputs"))
+
+# Buffered rows are appended to disk when this many are waiting...
+FLUSH_ROWS = 50
+
+# ...or when a row finishes after the oldest one has waited this long
+FLUSH_SECONDS = 5.0
+
+# CSV rows converted to xlsx per chunk
+XLSX_CHUNK_ROWS = 50_000
+
+# Data rows per worksheet (Excel's limit is 1,048,576 rows including the header)
+XLSX_MAX_SHEET_ROWS = 1_000_000
+
+
+class ResultWriter:
+    """Buffered, append-only writer for one job's results. Safe to share between threads."""
+
+    def __init__(self, job_id: str, output_dir: str = None):
+        """
+        Args:
+            job_id: Used as the base name of the output files
+            output_dir: Directory for the files (default: OUTPUT_DIR)
+
+        Raises:
+            OSError: If the output files cannot be created
+        """
+        output_dir = output_dir or OUTPUT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, job_id)
+        self.log_path = base + ".jsonl"
+        self.csv_path = base + ".csv"
+        self.xlsx_path = base + ".xlsx"
+        self.written_rows = 0
+        self._buffer: List[Tuple[int, list]] = []
+        self._buffer_since = None
+        self._lock = threading.Lock()
+
+        open(self.log_path, 'w', encoding='utf-8').close()
+        with open(self.csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+            csv.writer(f).writerow(RESULT_COLUMNS)
+
+    def append(self, index, results: list) -> bool:
+        """
+        Queue one finished row's results.
+
+        Returns:
+            True when the buffer is due to be written with flush()
+        """
+        with self._lock:
+            if not self._buffer:
+                self._buffer_since = time.monotonic()
+            self._buffer.append((index, results))
+            return len(self._buffer) >= FLUSH_ROWS or time.monotonic() - self._buffer_since >= FLUSH_SECONDS
+
+    def flush(self) -> None:
+        """Append all buffered rows to the files."""
+        with self._lock:
+            if not self._buffer:
+                return
+            with open(self.log_path, 'a', encoding='utf-8') as log, \
+                    open(self.csv_path, 'a', encoding='utf-8', newline='') as table:
+                writer = csv.writer(table)
+                for index, results in self._buffer:
+                    log.write(json.dumps({'index': index, 'results': results}, ensure_ascii=False, default=str) + "\n")
+                    writer.writerows([r.get(c) for c in RESULT_COLUMNS] for r in results)
+            self.written_rows += len(self._buffer)
+            self._buffer = []
+
+    def read_rows(self, start: int, stop: int) -> List[Tuple[int, list]]:
+        """(index, results) of the finished rows start..stop-1 (in finishing order) from the log."""
+        rows = []
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for position, line in enumerate(f):
+                if position >= stop:
+                    break
+                if position >= start:
+                    entry = json.loads(line)
+                    rows.append((entry['index'], entry['results']))
+        return rows
+
+    def close(self) -> None:
+        """Write what is left and convert the CSV to xlsx."""
+        self.flush()
+        write_xlsx(self.csv_path, self.xlsx_path)
+
+
+def write_xlsx(csv_path: str, xlsx_path: str) -> None:
+    """Convert a results CSV to xlsx chunk by chunk (write-only workbook, so memory stays flat)."""
+    import pandas as pd
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = XLSX_MAX_SHEET_ROWS
+    for chunk in pd.read_csv(csv_path, encoding='utf-8-sig', chunksize=XLSX_CHUNK_ROWS, dtype=object,
+                             keep_default_na=False):
+        columns = list(chunk.columns)
+        for row in chunk.itertuples(index=False):
+            if sheet_rows >= XLSX_MAX_SHEET_ROWS:
+                ws = wb.create_sheet(f"Results {len(wb.worksheets) + 1}" if wb.worksheets else "Results")
+                ws.append(columns)
+                sheet_rows = 0
+            ws.append([_excel_value(column, value) for column, value in zip(columns, row)])
+            sheet_rows += 1
+    if ws is None:
+        wb.create_sheet("Results").append(RESULT_COLUMNS)
+    wb.save(xlsx_path)
+
+
+def _excel_value(column: str, value: str):
+    """CSV cell back to the value the results table holds (row ids and scores are numbers)."""
+    if value == "":
+        return None
+    if column == DUPLICATE_COLUMN:
+        return value == "True"
+    if column in (ROW_ID_COLUMN, SCORE_COLUMN):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
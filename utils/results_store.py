@@ -0,0 +1,178 @@
+"""
+Results Store - append-friendly columnar storage for generated titles.
+Keeps one list per column and only materializes the requested page as a
+DataFrame, so the results table stays responsive for very large jobs.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional, Tuple
+
+ROW_ID_COLUMN = "原行号 (Row ID)"
+TITLE_COLUMN = "AI 生成标题 (AI Suggestions)"
+SCORE_COLUMN = "SEO 得分"
+NOTES_COLUMN = "扣分原因"
+DUPLICATE_COLUMN = "疑似重复"
+
+RESULT_COLUMNS = [
+    ROW_ID_COLUMN,
+    "品牌 (Brand)",
+    "主词 (Main Keyword)",
+    "核心词 (Core Keyword)",
+    TITLE_COLUMN,
+    SCORE_COLUMN,
+    NOTES_COLUMN,
+    DUPLICATE_COLUMN,
+]
+
+# Score bands offered by the results filter: label -> (min, max) inclusive
+SCORE_BANDS = {
+    "全部": None,
+    "100": (100, 100),
+    "90-99": (90, 99),
+    "60-89": (60, 89),
+    "<60": (0, 59),
+}
+
+
+class ResultsStore:
+    """
+    Columnar store of result rows. Each record keeps a stable id (its position
+    in the column lists); deleting a record only marks it dead.
+    """
+
+    def __init__(self):
+        self._columns = {c: [] for c in RESULT_COLUMNS}
+        self._alive: List[bool] = []
+        self._alive_count = 0
+        # Records already flagged by the cross-row near-duplicate pass
+        self._cross_row_flagged = set()
+        # Bumped on every change, so exports built from the store can be reused until it changes
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._alive_count
+
+    def append(self, rows: Iterable[dict]) -> None:
+        """Append result rows (dicts keyed by RESULT_COLUMNS; missing keys become None)."""
+        rows = list(rows)
+        if not rows:
+            return
+        for col, values in self._columns.items():
+            values.extend(r.get(col) for r in rows)
+        self._alive.extend([True] * len(rows))
+        self._alive_count += len(rows)
+        self.version += 1
+
+    def query(self, row_id: Optional[int] = None, score_band: Optional[Tuple[int, int]] = None,
+              duplicates: Optional[bool] = None, sort_by: Optional[str] = None,
+              ascending: bool = True, hide_cross_row: bool = False) -> np.ndarray:
+        """
+        Record ids matching the filters, in display order.
+
+        Args:
+            row_id: Only records generated for this input row
+            score_band: (min, max) SEO score, inclusive
+            duplicates: True for flagged records only, False to exclude them
+            sort_by: Column to sort by (stable; insertion order otherwise)
+            ascending: Sort direction
+            hide_cross_row: Leave out titles flagged by mark_near_duplicates
+        """
+        mask = np.zeros(len(self._alive), dtype=bool)
+        mask[self._live_ids(hide_cross_row)] = True
+        if row_id is not None:
+            mask &= pd.to_numeric(pd.Series(self._columns[ROW_ID_COLUMN]), errors='coerce').to_numpy() == row_id
+        if score_band is not None:
+            scores = pd.to_numeric(pd.Series(self._columns[SCORE_COLUMN]), errors='coerce').to_numpy()
+            mask &= (scores >= score_band[0]) & (scores <= score_band[1])
+        if duplicates is not None:
+            flags = pd.Series(self._columns[DUPLICATE_COLUMN]).fillna(False).astype(bool).to_numpy()
+            mask &= flags if duplicates else ~flags
+
+        ids = np.flatnonzero(mask)
+        if sort_by in self._columns and len(ids):
+            keys = pd.Series(self._columns[sort_by]).iloc[ids].reset_index(drop=True)
+            order = keys.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            ids = ids[order]
+        return ids
+
+    def page(self, ids: np.ndarray, page: int, page_size: int) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Materialize one page of records.
+
+        Returns:
+            (page DataFrame, record ids of its rows in order)
+        """
+        page_ids = ids[page * page_size:(page + 1) * page_size]
+        frame = pd.DataFrame({c: [values[i] for i in page_ids] for c, values in self._columns.items()})
+        return frame, page_ids
+
+    def apply_edits(self, page_ids: np.ndarray, editor_state: dict) -> None:
+        """
+        Apply an st.data_editor change set to the store.
+
+        Args:
+            page_ids: Record ids of the rows shown in the editor, in order
+            editor_state: The editor's session state ({'edited_rows', 'added_rows', 'deleted_rows'})
+        """
+        for pos, changes in editor_state.get('edited_rows', {}).items():
+            record = int(page_ids[int(pos)])
+            for col, value in changes.items():
+                if col in self._columns:
+                    self._columns[col][record] = value
+
+        for pos in editor_state.get('deleted_rows', []):
+            record = int(page_ids[int(pos)])
+            if self._alive[record]:
+                self._alive[record] = False
+                self._alive_count -= 1
+
+        self.append(editor_state.get('added_rows', []))
+        self.version += 1
+
+    def mark_near_duplicates(self, threshold: Optional[float] = None) -> int:
+        """
+        Cross-row near-duplicate pass over all live titles (see utils.dedup).
+        In each cluster the best-scoring title is kept; the others are flagged
+        with a note naming the kept title's row. Flagged titles stay in the store
+        (and in the result cache and title history); views that drop them filter
+        them out with hide_cross_row.
+
+        Returns:
+            int: Number of titles newly flagged
+        """
+        from utils.dedup import find_near_duplicates, DEFAULT_THRESHOLD
+
+        ids = self._live_ids()
+        titles = [str(self._columns[TITLE_COLUMN][i] or '') for i in ids]
+        scores = pd.to_numeric(pd.Series(self._columns[SCORE_COLUMN]), errors='coerce').to_numpy()[ids]
+        representative, is_duplicate = find_near_duplicates(titles, scores, threshold or DEFAULT_THRESHOLD)
+
+        changed = 0
+        for pos in np.flatnonzero(is_duplicate):
+            record = int(ids[pos])
+            if record in self._cross_row_flagged:
+                continue
+            keeper_row = self._columns[ROW_ID_COLUMN][int(ids[representative[pos]])]
+            self._columns[DUPLICATE_COLUMN][record] = True
+            self._columns[NOTES_COLUMN][record] = f"{self._columns[NOTES_COLUMN][record] or ''} (与第 {keeper_row} 行标题近似重复)"
+            self._cross_row_flagged.add(record)
+            changed += 1
+        if changed:
+            self.version += 1
+        return changed
+
+    def cross_row_count(self) -> int:
+        """Live titles flagged by the cross-row near-duplicate pass."""
+        return sum(1 for record in self._cross_row_flagged if self._alive[record])
+
+    def _live_ids(self, hide_cross_row: bool = False) -> np.ndarray:
+        mask = np.fromiter(self._alive, dtype=bool, count=len(self._alive))
+        if hide_cross_row and self._cross_row_flagged:
+            mask[list(self._cross_row_flagged)] = False
+        return np.flatnonzero(mask)
+
+    def to_frame(self, hide_cross_row: bool = False) -> pd.DataFrame:
+        """All live records as a DataFrame (for export), optionally without cross-row near-duplicates."""
+        ids = self._live_ids(hide_cross_row)
+        return self.page(ids, 0, max(len(ids), 1))[0]
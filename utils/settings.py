@@ -0,0 +1,230 @@
+"""
+User settings - one typed settings object per session, saved write-behind.
+
+Settings are read from browser localStorage once per session (or from a server-side
+JSON file when the browser component is unavailable). Changing a setting only updates
+the object in memory; the app writes it back from a script run at most once every
+SAVE_DEBOUNCE_SECONDS, so moving a slider does not cost a component round trip.
+A changed API key is flushed at once (flush(force=True)), so it survives closing
+the tab right after entering it.
+"""
+
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, fields
+
+# localStorage key holding the settings JSON
+LOCAL_STORAGE_KEY = "title_genie_config"
+
+# Server-side settings file used when browser storage is unavailable
+SETTINGS_FILE = os.getenv("TITLE_GENIE_SETTINGS_FILE", os.path.join(os.path.expanduser("~"), ".title_genie", "settings.json"))
+
+# Minimum seconds between two writes; changes in between are written together
+SAVE_DEBOUNCE_SECONDS = 2.0
+
+# Script runs that try to read browser storage before it is taken as empty
+# (the component may answer only on a later run)
+BROWSER_LOAD_ATTEMPTS = 3
+
+# Settings never written to the server-side file (it is shared by every session)
+BROWSER_ONLY_FIELDS = ('api_key',)
+
+MODEL_OPTIONS = ["qwen-flash", "qwen-plus", "qwen-turbo", "qwen-max"]
+POSITION_OPTIONS = ["前 (Front)", "中 (Middle)", "尾 (End)"]
+MODE_OPTIONS = ("Mode A (严格模式)", "Mode B (营销模式)")
+CROSS_ROW_DEDUP_OPTIONS = {"标记 (Flag)": "flag", "删除 (Drop)": "drop", "关闭 (Off)": "off"}
+
+# Rows of one job processed in parallel (each row is one API round trip plus polishing;
+# identical rows are processed together as one group)
+DEFAULT_ROW_CONCURRENCY = 3
+
+# Inclusive slider ranges
+NUM_TITLES_RANGE = (1, 10)
+CONCURRENCY_RANGE = (1, 8)
+
+
+@dataclass
+class Settings:
+    """Generation settings of one user."""
+    api_key: str = ""
+    model_name: str = MODEL_OPTIONS[0]
+    pos_brand: str = POSITION_OPTIONS[0]
+    pos_main: str = POSITION_OPTIONS[0]
+    pos_core: str = POSITION_OPTIONS[2]
+    selected_mode_label: str = MODE_OPTIONS[1]
+    num_titles: int = 5
+    overgenerate: bool = False
+    concurrency: int = DEFAULT_ROW_CONCURRENCY
+    adaptive_concurrency: bool = True
+    cross_row_dedup: str = next(iter(CROSS_ROW_DEDUP_OPTIONS))
+    profile_jobs: bool = False
+
+    @property
+    def mode(self) -> str:
+        return "Mode A" if "Mode A" in self.selected_mode_label else "Mode B"
+
+    @property
+    def keyword_positions(self) -> dict:
+        return {"Brand": self.pos_brand, "Main Keyword": self.pos_main, "Core Keyword": self.pos_core}
+
+    @property
+    def dedup_action(self) -> str:
+        return CROSS_ROW_DEDUP_OPTIONS[self.cross_row_dedup]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Settings":
+        """Settings from stored JSON; unknown keys are ignored and invalid values fall back to defaults."""
+        settings = cls()
+        for name, value in (data or {}).items():
+            if _valid(name, value):
+                setattr(settings, name, value)
+        return settings
+
+    def to_dict(self, browser: bool = True) -> dict:
+        data = asdict(self)
+        if not browser:
+            for name in BROWSER_ONLY_FIELDS:
+                data.pop(name, None)
+        return data
+
+
+_CHOICES = {
+    'model_name': MODEL_OPTIONS,
+    'pos_brand': POSITION_OPTIONS,
+    'pos_main': POSITION_OPTIONS,
+    'pos_core': POSITION_OPTIONS,
+    'selected_mode_label': MODE_OPTIONS,
+    'cross_row_dedup': list(CROSS_ROW_DEDUP_OPTIONS),
+}
+_RANGES = {'num_titles': NUM_TITLES_RANGE, 'concurrency': CONCURRENCY_RANGE}
+_FIELDS = {f.name for f in fields(Settings)}
+
+
+def _valid(name: str, value) -> bool:
+    if name not in _FIELDS:
+        return False
+    if name in _CHOICES:
+        return value in _CHOICES[name]
+    if name in _RANGES:
+        low, high = _RANGES[name]
+        return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+    return isinstance(value, type(getattr(Settings, name)))
+
+
+class SettingsStore:
+    """
+    A session's Settings with write-behind persistence.
+
+    Call load() on every script run (it reads storage only until the settings have
+    been read), change settings with update(), and call flush() at the end of a run.
+    """
+
+    def __init__(self, path: str = SETTINGS_FILE):
+        self.path = path
+        self.settings = Settings()
+        self.loaded = False
+        self._load_attempts = 0
+        self._changed = set()     # Fields set in this session, kept over late-loaded values
+        self._dirty = False
+        self._last_saved = 0.0
+
+    def load(self, storage=None) -> bool:
+        """
+        Read the stored settings, once per session.
+
+        Args:
+            storage: Browser localStorage component, or None to use the server-side file
+
+        Returns:
+            True if settings were read in this call
+        """
+        if self.loaded:
+            return False
+        data = _read_browser(storage) if storage else _read_file(self.path)
+        self._load_attempts += 1
+        if data is None and storage and self._load_attempts < BROWSER_LOAD_ATTEMPTS:
+            return False
+        self.loaded = True
+        if not data:
+            return False
+        stored = Settings.from_dict(data)
+        for name in _FIELDS - self._changed:
+            setattr(self.settings, name, getattr(stored, name))
+        return True
+
+    def update(self, **changes) -> bool:
+        """
+        Change settings in memory; they are written by a later flush().
+
+        Returns:
+            True if any value changed
+        """
+        changed = False
+        for name, value in changes.items():
+            if not _valid(name, value):
+                raise ValueError(f"Invalid setting {name}={value!r}")
+            if getattr(self.settings, name) != value:
+                setattr(self.settings, name, value)
+                self._changed.add(name)
+                changed = True
+        if changed:
+            self._dirty = True
+        return changed
+
+    def flush(self, storage=None, force: bool = False) -> bool:
+        """
+        Write pending changes if the debounce interval has passed (or `force`).
+
+        Args:
+            storage: Browser localStorage component, or None to write the server-side file
+
+        Returns:
+            True if the settings were written
+        """
+        if not self._dirty or (not force and time.monotonic() - self._last_saved < SAVE_DEBOUNCE_SECONDS):
+            return False
+        if storage:
+            try:
+                storage.setItem(LOCAL_STORAGE_KEY, json.dumps(self.settings.to_dict()))
+            except Exception:
+                return False
+        else:
+            _write_file(self.path, self.settings.to_dict(browser=False))
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        # Nothing stored yet would override what this session has written
+        self.loaded = True
+        return True
+
+
+def _read_browser(storage):
+    try:
+        data = storage.getItem(LOCAL_STORAGE_KEY)
+        if data:
+            return json.loads(data) if isinstance(data, str) else data
+    except Exception:
+        pass
+    return None
+
+
+def _read_file(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_file(path: str, data: dict) -> None:
+    """Atomic write (temp file + rename), so a crash never leaves half a file."""
+    try:
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # Settings stay in the session; the next change tries again
@@ -0,0 +1,283 @@
+"""
+Term Dictionary - acronyms, brand spellings, spam words and stopwords in one matcher.
+
+Terms are compiled into a word-level trie: a title is split into words once, and
+every word position walks the trie only as far as the words in the title allow.
+Matching cost per title therefore depends on the title, not on how many terms the
+dictionary holds, so category-specific lists of thousands of terms stay cheap.
+Terms match whole words, case-insensitively; multi-word terms also need the same
+separators as the title ("hot sale", "wi-fi").
+
+The built-in terms can be extended with a CSV/Excel file of `term` and `category`
+columns. TITLE_GENIE_TERMS_FILE, loaded at startup, is the only source of the
+process-wide dictionary; files uploaded in the app build a dictionary for that
+session only (load_terms), which the session's checks use through use_terms.
+"""
+
+import contextlib
+import os
+import re
+import threading
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# Term categories
+ACRONYM = "acronym"      # Always written as given (e.g. "LED", "4G")
+BRAND = "brand"          # Brand capitalization (e.g. "iPhone", "TechNova")
+SPAM = "spam"            # Words that cost points in the SEO score
+STOPWORD = "stopword"    # Words ignored when extracting performance keywords
+
+CATEGORIES = (ACRONYM, BRAND, SPAM, STOPWORD)
+
+# Categories whose spelling is enforced in titles by apply_casing
+CASING_CATEGORIES = (ACRONYM, BRAND)
+
+DEFAULT_ACRONYMS = [
+    "POS", "LCD", "LED", "CPU", "RAM", "OS", "USB", "QR", "RFID", "VPC",
+    "NFC", "GPRS", "4G", "5G", "LTE", "SDK", "API", "OEM", "ODM", "IP", "IOS", "ANDROID"
+]
+
+DEFAULT_SPAM_WORDS = ["new", "hot sale", "best", "cheap"]
+
+DEFAULT_STOPWORDS = ['with', 'for', 'and', 'the', 'new', 'hot', 'sale', 'wholesale', 'china', 'high', 'quality']
+
+# Extra terms loaded at startup (CSV or Excel with term/category columns)
+TERMS_FILE = os.getenv("TITLE_GENIE_TERMS_FILE")
+
+_WORD = re.compile(r'\w+')
+
+
+class TermMatch(NamedTuple):
+    """A term found in a text: character span, the term as written in the dictionary, its category and id."""
+    start: int
+    end: int
+    term: str
+    category: str
+    term_id: int
+
+
+class _Node:
+    """Trie node. Levels alternate: word nodes lead on by separator, separator nodes by word."""
+
+    __slots__ = ('next', 'terms')
+
+    def __init__(self):
+        self.next = {}
+        self.terms = None  # category -> (term_id, term), on nodes where a term ends
+
+
+def split_term(term: str) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Lowercase words of a term and the separators between them, or None if the term
+    does not start and end with a word character (it could not match on word boundaries).
+    """
+    term = term.strip()
+    words = list(_WORD.finditer(term))
+    if not words or words[0].start() != 0 or words[-1].end() != len(term):
+        return None
+    separators = [term[a.end():b.start()].lower() for a, b in zip(words, words[1:])]
+    return [w.group().lower() for w in words], separators
+
+
+class TermDictionary:
+    """Terms by category, compiled into one word-level trie."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        """
+        Args:
+            entries: (term, category) pairs; invalid ones are skipped (see add)
+        """
+        self._root = _Node()
+        self.entries: List[Tuple[str, str]] = []
+        for term, category in entries:
+            self.add(term, category)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, term: str, category: str) -> bool:
+        """
+        Add a term. Adding a term again replaces its spelling within the category.
+
+        Returns:
+            False if the category is unknown or the term has no word characters at its ends.
+        """
+        term = str(term).strip()
+        parts = split_term(term)
+        if category not in CATEGORIES or parts is None:
+            return False
+        words, separators = parts
+        node = self._root.next.setdefault(words[0], _Node())
+        for separator, word in zip(separators, words[1:]):
+            node = node.next.setdefault(separator, _Node()).next.setdefault(word, _Node())
+        if node.terms is None:
+            node.terms = {}
+        term_id = node.terms[category][0] if category in node.terms else len(self.entries)
+        if category not in node.terms:
+            self.entries.append((term, category))
+        else:
+            self.entries[term_id] = (term, category)
+        node.terms[category] = (term_id, term)
+        return True
+
+    def terms(self, category: str) -> List[str]:
+        """Terms of one category, in the order they were added."""
+        return [term for term, c in self.entries if c == category]
+
+    def is_term(self, word: str, category: str) -> bool:
+        """Whether a single word is a term of the category."""
+        node = self._root.next.get(word.lower())
+        return node is not None and node.terms is not None and category in node.terms
+
+    def _walk(self, text: str, words: list, i: int, categories) -> List[TermMatch]:
+        """Every term of `categories` starting at word i, shortest first."""
+        found = []
+        node = self._root.next.get(words[i].group().lower())
+        j = i
+        while node is not None:
+            if node.terms:
+                found.extend(
+                    TermMatch(words[i].start(), words[j].end(), term, category, term_id)
+                    for category, (term_id, term) in node.terms.items() if category in categories
+                )
+            if j + 1 >= len(words) or not node.next:
+                break
+            separator = node.next.get(text[words[j].end():words[j + 1].start()].lower())
+            j += 1
+            node = separator.next.get(words[j].group().lower()) if separator else None
+        return found
+
+    def find_all(self, text: str, categories=CATEGORIES) -> List[TermMatch]:
+        """All occurrences of terms of the given categories, overlapping ones included."""
+        words = list(_WORD.finditer(text))
+        matches = []
+        for i in range(len(words)):
+            matches.extend(self._walk(text, words, i, categories))
+        return matches
+
+    def distinct_terms(self, text: str, category: str) -> List[str]:
+        """Terms of one category occurring in the text, each once, in dictionary order."""
+        found = {m.term_id: m.term for m in self.find_all(text, (category,))}
+        return [found[term_id] for term_id in sorted(found)]
+
+    def apply_casing(self, text: str, categories=CASING_CATEGORIES) -> str:
+        """
+        Rewrite terms of the given categories with their dictionary spelling
+        (leftmost-longest matches, so "4G LTE" wins over "4G").
+        """
+        words = list(_WORD.finditer(text))
+        pieces = []
+        position = 0
+        i = 0
+        while i < len(words):
+            found = self._walk(text, words, i, categories)
+            if not found:
+                i += 1
+                continue
+            match = max(found, key=lambda m: (m.end, -m.term_id))
+            pieces.append(text[position:match.start])
+            pieces.append(match.term)
+            position = match.end
+            while i < len(words) and words[i].start() < match.end:
+                i += 1
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+def default_entries() -> List[Tuple[str, str]]:
+    """The built-in (term, category) pairs."""
+    return ([(t, ACRONYM) for t in DEFAULT_ACRONYMS] + [(t, SPAM) for t in DEFAULT_SPAM_WORDS]
+            + [(t, STOPWORD) for t in DEFAULT_STOPWORDS])
+
+
+def read_term_file(file) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    (term, category) pairs of a CSV or Excel file with `term` and `category` columns.
+
+    Returns:
+        (entries, number of rows skipped for an unknown category or an empty term)
+
+    Raises:
+        ValueError: If the file cannot be read or lacks the columns.
+    """
+    import pandas as pd
+
+    name = file if isinstance(file, str) else getattr(file, 'name', '')
+    try:
+        if str(name).lower().endswith('.csv'):
+            df = pd.read_csv(file, dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_excel(file, dtype=str).fillna('')
+    except Exception as e:
+        raise ValueError(f"Error reading term file: {e}")
+
+    columns = {str(c).strip().lower(): c for c in df.columns}
+    if 'term' not in columns or 'category' not in columns:
+        raise ValueError("Term file needs 'term' and 'category' columns.")
+    terms = df[columns['term']].astype(str).str.strip()
+    categories = df[columns['category']].astype(str).str.strip().str.lower()
+    valid = (terms != '') & categories.isin(CATEGORIES)
+    return list(zip(terms[valid], categories[valid])), int((~valid).sum())
+
+
+_terms: Optional[TermDictionary] = None
+_terms_lock = threading.Lock()
+
+# Dictionary of the session whose work runs on the current thread (see use_terms)
+_active = threading.local()
+
+
+def get_terms() -> TermDictionary:
+    """
+    The dictionary in effect on this thread: the session's own one inside use_terms,
+    otherwise the process-wide one (built-in terms plus TERMS_FILE).
+    """
+    session = getattr(_active, 'terms', None)
+    if session is not None:
+        return session
+    return process_terms()
+
+
+def process_terms() -> TermDictionary:
+    """The process-wide dictionary: built-in terms plus TERMS_FILE."""
+    global _terms
+    if _terms is None:
+        with _terms_lock:
+            if _terms is None:
+                entries = default_entries()
+                if TERMS_FILE and os.path.exists(TERMS_FILE):
+                    entries += read_term_file(TERMS_FILE)[0]
+                _terms = TermDictionary(entries)
+    return _terms
+
+
+def set_thread_terms(terms: Optional[TermDictionary]) -> None:
+    """Make `terms` (None: the process-wide dictionary) the one get_terms returns on this thread."""
+    _active.terms = terms
+
+
+@contextlib.contextmanager
+def use_terms(terms: Optional[TermDictionary]):
+    """Run a block with a session's dictionary (None: the process-wide one) in effect on this thread."""
+    previous = getattr(_active, 'terms', None)
+    _active.terms = terms
+    try:
+        yield
+    finally:
+        _active.terms = previous
+
+
+def load_terms(file, base: Optional[TermDictionary] = None) -> Tuple[TermDictionary, dict]:
+    """
+    A session dictionary: `base` (default: the process-wide dictionary) plus the terms
+    of a CSV/Excel file. Other sessions and the process-wide dictionary are unchanged.
+
+    Returns:
+        (dictionary, dict with 'added' (valid terms read) and 'skipped' (rows rejected) counts)
+
+    Raises:
+        ValueError: If the file cannot be read.
+    """
+    entries, skipped = read_term_file(file)
+    valid = [(term, category) for term, category in entries if split_term(term) is not None]
+    base = base or process_terms()
+    return TermDictionary(base.entries + valid), {'added': len(valid), 'skipped': skipped + len(entries) - len(valid)}
@@ -1,18 +1,201 @@
-import dashscope
 from http import HTTPStatus
+import hashlib
 import os
+import random
+import threading
+import time
 
 # Default model, can be overridden
 DEFAULT_MODEL = "qwen-flash"
 
-def generate_text(prompt: str, api_key: str = None, model: str = DEFAULT_MODEL) -> str:
+# Transient API failures (throttling, server errors) are retried with exponential backoff
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = float(os.getenv("TITLE_GENIE_RETRY_DELAY", "1.0"))  # Seconds, doubled per attempt
+
+# Statuses meaning the account or service is overloaded (shrink the adaptive concurrency limit)
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Adaptive concurrency (see AdaptiveLimiter): the limit stays between 1 and this
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("TITLE_GENIE_MAX_CONCURRENCY", "16"))
+ADAPTIVE_INITIAL_CONCURRENCY = 2
+
+# Completed calls per concurrency slot in one throughput measurement window
+ADAPTIVE_WINDOW_CALLS = 3
+
+# An added slot is kept only if it raised throughput by at least this fraction
+ADAPTIVE_MIN_GAIN = 0.05
+
+# A call slower than this multiple of the usual latency counts as congestion
+ADAPTIVE_LATENCY_SPIKE = 2.5
+
+# The limit is multiplied by this on throttling or a latency spike
+ADAPTIVE_DECREASE = 0.5
+
+# Seconds without probing a higher limit after an added slot brought no gain
+ADAPTIVE_HOLD_SECONDS = 60.0
+
+# Weight of the newest call in the running latency average
+LATENCY_EWMA_WEIGHT = 0.1
+
+# generate_text reports failures as text starting with one of these
+ERROR_PREFIXES = ("Error", "Exception during generation")
+
+def is_error_reply(text: str) -> bool:
+    """True if `text` is a failure message from generate_text rather than model output."""
+    return text.startswith(ERROR_PREFIXES)
+
+class TokenUsage:
+    """Running totals of API calls, retries, call time and reported tokens; safe to share between threads."""
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.calls = 0
+        self.retries = 0
+        self.polish_calls = 0
+        self.call_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, input_tokens: int, output_tokens: int, seconds: float = 0.0) -> None:
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.calls += 1
+            self.call_seconds += seconds
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def add_polish(self) -> None:
+        """Count one polishing request (its tokens are added by generate_text)."""
+        with self._lock:
+            self.polish_calls += 1
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for generation calls that share one quota (API key and model);
+    safe to share between threads and jobs.
+
+    Calls wait for a free slot. After every ADAPTIVE_WINDOW_CALLS x limit completed calls,
+    throughput is measured: if the limit was fully used, one slot is added; if the last
+    added slot did not raise throughput by ADAPTIVE_MIN_GAIN it is taken back and probing
+    pauses for ADAPTIVE_HOLD_SECONDS. Throttling or a latency spike multiplies the limit
+    by ADAPTIVE_DECREASE at once (at most once per typical call duration, so one burst
+    of failures counts once).
+    """
+
+    def __init__(self, max_limit: int = ADAPTIVE_MAX_CONCURRENCY, initial: int = ADAPTIVE_INITIAL_CONCURRENCY):
+        self.max_limit = max(1, max_limit)
+        self.limit = max(1, min(initial, self.max_limit))
+        self.in_flight = 0
+        self.latency = None          # Running average of call seconds
+        self.calls_per_minute = None  # Throughput of the last measurement window
+        self.decreases = 0
+        self._level_rates = {}  # limit -> calls per minute measured at it
+        self._hold_until = 0.0
+        self._probing = False   # The limit was raised at the end of the last window
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now: float) -> None:
+        self._window_start = now
+        self._window_calls = 0
+        self._saturated = False
+
+    def acquire(self) -> None:
+        """Wait for a free slot and take it."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._saturated = True
+                self._cond.wait()
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+
+    def release(self, seconds: float, throttled: bool = False) -> None:
+        """Give back a slot, reporting how long the call took and whether it was throttled."""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            spike = self.latency is not None and seconds > self.latency * ADAPTIVE_LATENCY_SPIKE
+            # Spikes also feed the average, so a lasting slowdown becomes the new normal
+            self.latency = seconds if self.latency is None else (
+                (1 - LATENCY_EWMA_WEIGHT) * self.latency + LATENCY_EWMA_WEIGHT * seconds)
+            if throttled or spike:
+                self._decrease(now)
+            else:
+                self._measure(now)
+            self._cond.notify_all()
+
+    def _decrease(self, now: float) -> None:
+        if now - self._last_decrease < (self.latency or 0.0):
+            return
+        self.limit = max(1, int(self.limit * ADAPTIVE_DECREASE))
+        self.decreases += 1
+        self._last_decrease = now
+        # Rates measured above the new limit describe conditions that no longer hold
+        self._level_rates = {level: rate for level, rate in self._level_rates.items() if level <= self.limit}
+        self._probing = False
+        self._reset_window(now)
+
+    def _measure(self, now: float) -> None:
+        self._window_calls += 1
+        if self._window_calls < ADAPTIVE_WINDOW_CALLS * self.limit:
+            return
+        rate = self._window_calls / max(now - self._window_start, 1e-6) * 60
+        self.calls_per_minute = rate
+        self._level_rates[self.limit] = rate
+        below = self._level_rates.get(self.limit - 1)
+        probing, self._probing = self._probing, False
+        if probing and self._saturated and below is not None and rate < below * (1 + ADAPTIVE_MIN_GAIN):
+            # Only the slot just added is judged, so a drop in demand can't walk the limit down
+            self.limit -= 1
+            self._hold_until = now + ADAPTIVE_HOLD_SECONDS
+        elif self._saturated and now >= self._hold_until and self.limit < self.max_limit:
+            self.limit += 1
+            self._probing = True
+        self._reset_window(now)
+
+    def snapshot(self) -> dict:
+        """Current limit, calls in flight, average latency, last measured calls/min and decreases."""
+        with self._cond:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'latency': self.latency,
+                    'calls_per_minute': self.calls_per_minute, 'decreases': self.decreases}
+
+# Adaptive limiters in this process: (API key hash, model) -> AdaptiveLimiter
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(api_key: str, model: str) -> AdaptiveLimiter:
+    """The process-wide adaptive limiter of an account's calls to one model (shared by all jobs)."""
+    key = (hashlib.sha1((api_key or "").encode('utf-8')).hexdigest(), model)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveLimiter()
+        return _limiters[key]
+
+def generate_text(prompt, api_key: str = None, model: str = DEFAULT_MODEL, json_mode: bool = False,
+                  usage: TokenUsage = None, limiter: AdaptiveLimiter = None) -> str:
     """
     Calls DashScope API to generate text based on the prompt.
     
     Args:
-        prompt (str): The input prompt.
+        prompt (str | list): The input prompt, or chat messages
+            ([{'role': 'system', 'content': ...}, {'role': 'user', 'content': ...}]).
+            A static system message lets DashScope reuse its cached prefix across requests.
         api_key (str): DashScope API Key. If None, checks env var DASHSCOPE_API_KEY.
         model (str): The model name to use.
+        json_mode (bool): Ask the model for a JSON object reply (the prompt must mention JSON).
+        usage (TokenUsage): Optional accumulator for the tokens this call consumed.
+        limiter (AdaptiveLimiter): Optional concurrency limit each API request waits for
+            (see get_limiter).
         
     Returns:
         str: The generated text content.
@@ -25,19 +208,58 @@ def generate_text(prompt: str, api_key: str = None, model: str = DEFAULT_MODEL)
     if not api_key:
         return "Error: API Key is missing. Please provide it in the sidebar or .env file."
 
-    dashscope.api_key = api_key
-    
     try:
-        response = dashscope.Generation.call(
-            model=model,
-            prompt=prompt,
-            result_format='message',  # Use message format for chat models
-        )
-        
-        if response.status_code == HTTPStatus.OK:
-            return response.output.choices[0].message.content
-        else:
-            return f"Error {response.code}: {response.message}"
-            
+        return _call_api(prompt, api_key, model, json_mode, usage, limiter)
     except Exception as e:
         return f"Exception during generation: {str(e)}"
+
+def _call_api(prompt, api_key: str, model: str, json_mode: bool, usage: TokenUsage, limiter: AdaptiveLimiter) -> str:
+    """One generation request, with retries of throttling and transient server errors."""
+    import dashscope  # Deferred: heavy import, only needed once generation starts
+    
+    extra_args = {}
+    if isinstance(prompt, list):
+        extra_args['messages'] = prompt
+    else:
+        extra_args['prompt'] = prompt
+    if json_mode:
+        extra_args['response_format'] = {'type': 'json_object'}
+
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+        started = time.perf_counter()
+        throttled = False
+        try:
+            try:
+                # The key goes with each call: dashscope.api_key is process-wide and jobs of
+                # different users run at the same time
+                response = dashscope.Generation.call(
+                    api_key=api_key,
+                    model=model,
+                    result_format='message',  # Use message format for chat models
+                    **extra_args
+                )
+                throttled = response.status_code in THROTTLE_STATUS_CODES
+            finally:
+                if limiter is not None:
+                    limiter.release(time.perf_counter() - started, throttled)
+
+            if response.status_code == HTTPStatus.OK:
+                if usage is not None and getattr(response, 'usage', None):
+                    usage.add(getattr(response.usage, 'input_tokens', 0) or 0, getattr(response.usage, 'output_tokens', 0) or 0,
+                              time.perf_counter() - started)
+                return response.output.choices[0].message.content
+            error = f"Error {response.code}: {response.message}"
+            if response.status_code not in RETRY_STATUS_CODES:
+                return error
+
+        except Exception as e:
+            error = f"Exception during generation: {str(e)}"
+
+        # Back off (with jitter, so parallel rows don't retry in lockstep) and try again
+        if attempt < MAX_RETRIES:
+            if usage is not None:
+                usage.add_retry()
+            time.sleep(RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+    return error
@@ -1,54 +1,185 @@
 """
 Title History Manager - Manages historical title database for cross-library deduplication.
-Supports both file-based storage (local) and browser localStorage (cloud).
+Supports file-based storage (local), browser localStorage (cloud) and a SQLite
+store shared by all sessions of a multi-user server.
 """
 
+import base64
+import codecs
 import json
 import os
 import difflib
+import threading
+import zlib
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Callable, Iterator, List, Tuple, Optional
 
-# Default path for the history file (used for local development)
-DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "title_history.json")
+# Default path for the history file (used for local development); TITLE_GENIE_HISTORY_PATH overrides it
+DEFAULT_HISTORY_PATH = os.getenv(
+    "TITLE_GENIE_HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "title_history.json")
+)
 
-# LocalStorage key for browser storage
+# SQLite database shared by all sessions of a server (see utils/history_db.py); unset keeps per-session storage
+DEFAULT_HISTORY_DB = os.getenv("TITLE_GENIE_HISTORY_DB")
+
+# LocalStorage key for browser storage (holds the sync manifest; chunks use "<key>_<n>")
 LOCALSTORAGE_KEY = "title_genie_history"
 
+# Records per compressed localStorage chunk. Only the last (open) chunk is rewritten on sync.
+LOCALSTORAGE_CHUNK_RECORDS = 500
+
+# Stay below the ~5 MB per-origin browser quota; beyond this the file store takes over.
+LOCALSTORAGE_BUDGET_BYTES = 4 * 1024 * 1024
+
+# Rows read per chunk during bulk import
+IMPORT_CHUNK_ROWS = 50_000
+
+# Bytes read at a time while checking whether an imported CSV is UTF-8
+CSV_ENCODING_BLOCK_BYTES = 1024 * 1024
+
+# Titles longer than this in an import are treated as malformed cells
+IMPORT_MAX_TITLE_LENGTH = 300
+
+# At most this many rejected rows are listed individually in an import report
+IMPORT_MAX_REJECTED_LISTED = 1000
+
+# Column names tried (case-insensitive) when the requested title column is missing
+TITLE_COLUMN_CANDIDATES = ['title', 'product name', 'product title', '标题']
+
+
+def normalize_title_key(title: str) -> str:
+    """Key used for exact-duplicate detection: lowercase with collapsed whitespace."""
+    return " ".join(str(title).split()).lower()
+
+
+def _encode_chunk(records: List[dict]) -> str:
+    """Compress a list of history records into an ASCII-safe localStorage value."""
+    slim = [{k: v for k, v in r.items() if k != 'title_lower'} for r in records]
+    raw = json.dumps(slim, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(zlib.compress(raw, 9)).decode('ascii')
+
+
+def _decode_chunk(value: str) -> List[dict]:
+    """Inverse of _encode_chunk. Restores the pre-computed lowercase title."""
+    records = json.loads(zlib.decompress(base64.b64decode(value)).decode('utf-8'))
+    for r in records:
+        r['title_lower'] = r['title'].lower()
+    return records
+
 
 class TitleHistoryManager:
     """
     Manages a persistent store of generated titles for cross-library deduplication.
-    Supports both file-based storage and browser localStorage.
+    Supports file-based storage, browser localStorage and a SQLite store shared
+    by all sessions of a server.
     """
     
-    def __init__(self, history_path: str = None, local_storage=None):
+    def __init__(self, history_path: str = None, local_storage=None, lazy_load: bool = False,
+                 history_db: str = None):
         """
         Initialize the manager.
         
         Args:
             history_path: Path to the JSON file storing title history (for local dev).
             local_storage: LocalStorage instance for browser storage (for cloud/web).
+            lazy_load: Defer reading the history until it is first used.
+            history_db: Path to a shared SQLite history (multi-user servers). Takes
+                precedence over the file and browser storage.
         """
         self.history_path = history_path or DEFAULT_HISTORY_PATH
         self.local_storage = local_storage
-        self.titles: List[dict] = []
-        self.load_history()
+        # Shared store: titles are appended to the database as they are added, and
+        # titles from other sessions are pulled in incrementally before each check
+        self._db = None
+        self._db_last_id = 0
+        # Guards loading, reloading, saving and shared-store refreshes (the manager is shared across sessions)
+        self._lock = threading.RLock()
+        # File-backed history: (mtime, size) of the file as last read or written here, and
+        # how many records it holds, to detect rewrites by other processes
+        self._file_state = None
+        self._saved_count = 0
+        history_db = history_db or DEFAULT_HISTORY_DB
+        if history_db:
+            from utils.history_db import HistoryDatabase
+            self._db = HistoryDatabase(history_db)
+            self.local_storage = None
+        self._titles: Optional[List[dict]] = None
+        # Browser sync state: how many records are already stored, and per-chunk record counts/sizes
+        self._synced_count = 0
+        self._chunk_counts: List[int] = []
+        self._chunk_sizes: List[int] = []
+        self._browser_full = False
+        self._write_seq = 0
+        # Exact-match index: normalized title key -> position in self.titles
+        self._title_index: dict = {}
+        if not lazy_load:
+            self.load_history()
+
+    @property
+    def titles(self) -> List[dict]:
+        """History records, loaded from storage on first access when lazy_load is set."""
+        if self._titles is None:
+            self.load_history()
+        return self._titles
+
+    @titles.setter
+    def titles(self, value: List[dict]) -> None:
+        self._titles = value
+
+    def ensure_loaded(self) -> None:
+        """Load the history now if loading was deferred (e.g. before sharing it across threads)."""
+        if self._titles is None:
+            with self._lock:
+                if self._titles is None:
+                    self.load_history()
     
     def load_history(self) -> None:
-        """Load title history from storage (browser localStorage or file)."""
+        """Load title history from storage (shared store, browser localStorage or file)."""
+        self._load_titles()
+        self._rebuild_index()
+        self._saved_count = len(self.titles)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the file-backed history if another process rewrote the file since it
+        was read or saved here. Titles added here but not saved yet are kept.
+
+        Returns:
+            True if the history was reloaded.
+        """
+        if self._db or self._titles is None or (self.local_storage and not self._browser_full):
+            return False
+        if _file_signature(self.history_path) == self._file_state:
+            return False
+        with self._lock:
+            # Checked again: another thread may have reloaded while this one waited
+            if _file_signature(self.history_path) == self._file_state:
+                return False
+            pending = self.titles[self._saved_count:]
+            self.load_history()
+            for record in pending:
+                key = normalize_title_key(record['title'])
+                if key not in self._title_index:
+                    self._title_index[key] = len(self.titles)
+                    self.titles.append(record)
+        return True
+
+    def _load_titles(self) -> None:
+        if self._db:
+            self._load_from_db()
+            return
+
         # Try browser localStorage first
         if self.local_storage:
             try:
-                data = self.local_storage.getItem(LOCALSTORAGE_KEY)
-                if data:
-                    parsed = json.loads(data) if isinstance(data, str) else data
-                    self.titles = parsed.get('titles', [])
+                if self._load_from_browser():
                     return
             except Exception:
                 pass
         
         # Fallback to file-based storage
+        self._file_state = _file_signature(self.history_path)
         if os.path.exists(self.history_path):
             try:
                 with open(self.history_path, 'r', encoding='utf-8') as f:
@@ -58,30 +189,184 @@ class TitleHistoryManager:
                 self.titles = []
         else:
             self.titles = []
-    
-    def save_history(self) -> None:
-        """Save title history to storage (browser localStorage or file)."""
-        data = {
+
+    def _load_from_db(self) -> None:
+        """Read the whole shared history, seeding a new database from the JSON file once."""
+        if self._db.count() == 0 and os.path.exists(self.history_path):
+            try:
+                with open(self.history_path, 'r', encoding='utf-8') as f:
+                    self._db.append([_db_record(r) for r in json.load(f).get('titles', [])])
+            except (json.JSONDecodeError, IOError, KeyError):
+                pass
+        self.titles, self._db_last_id = self._db.fetch_since(0)
+
+    def refresh(self) -> int:
+        """
+        Pull in titles other sessions added to the shared store since the last read.
+        No-op for file and browser storage.
+
+        Returns:
+            Number of new titles.
+        """
+        if not self._db:
+            return 0
+        self.ensure_loaded()
+        with self._lock:
+            records, self._db_last_id = self._db.fetch_since(self._db_last_id)
+            for record in records:
+                self._title_index.setdefault(normalize_title_key(record['title']), len(self.titles))
+                self.titles.append(record)
+        return len(records)
+
+    def _rebuild_index(self) -> None:
+        """Rebuild the exact-match index from the loaded titles."""
+        self._title_index = {}
+        for i, record in enumerate(self.titles):
+            self._title_index.setdefault(normalize_title_key(record['title']), i)
+
+    def _load_from_browser(self) -> bool:
+        """
+        Load history from the chunked localStorage layout.
+
+        Returns:
+            True if the browser holds the history, False if the file store should be used.
+        """
+        data = self.local_storage.getItem(LOCALSTORAGE_KEY)
+        if not data:
+            return False
+        manifest = json.loads(data) if isinstance(data, str) else data
+
+        # Legacy single-blob layout: load it, the next save migrates it to chunks
+        if 'titles' in manifest:
+            self.titles = manifest.get('titles', [])
+            return True
+
+        # History outgrew the browser quota earlier; the file store is authoritative
+        if manifest.get('overflow'):
+            self._browser_full = True
+            return False
+
+        titles, counts, sizes = [], [], []
+        for i in range(manifest.get('chunks', 0)):
+            value = self.local_storage.getItem(f"{LOCALSTORAGE_KEY}_{i}")
+            if not value:
+                break  # Missing tail chunk: keep what we have, it is re-synced on next save
+            records = _decode_chunk(value)
+            titles.extend(records)
+            counts.append(len(records))
+            sizes.append(len(value))
+
+        self.titles = titles
+        self._synced_count = len(titles)
+        self._chunk_counts = counts
+        self._chunk_sizes = sizes
+        return True
+
+    def _browser_set(self, item_key: str, value: str) -> None:
+        """Write one localStorage item. Each write needs its own component key within a script run."""
+        self._write_seq += 1
+        try:
+            self.local_storage.setItem(item_key, value, key=f"history_set_{self._write_seq}")
+        except TypeError:
+            self.local_storage.setItem(item_key, value)
+
+    def _sync_to_browser(self) -> bool:
+        """
+        Push records added since the last sync to localStorage.
+
+        New records are appended to the open chunk (rewritten) and to new sealed chunks,
+        then the manifest is updated. Earlier chunks are never resent.
+
+        Returns:
+            True on success, False if the browser quota would be exceeded.
+        """
+        # History shrank (e.g. cleared): start the chunk layout over
+        if len(self.titles) < self._synced_count:
+            self._synced_count = 0
+            self._chunk_counts = []
+            self._chunk_sizes = []
+        elif len(self.titles) == self._synced_count and self._chunk_counts:
+            return True  # Nothing new
+
+        chunk_index = len(self._chunk_counts)
+        start = self._synced_count
+        if self._chunk_counts and self._chunk_counts[-1] < LOCALSTORAGE_CHUNK_RECORDS:
+            # Reopen the last chunk so it fills up before a new one is started
+            chunk_index -= 1
+            start -= self._chunk_counts[-1]
+
+        counts = self._chunk_counts[:chunk_index]
+        sizes = self._chunk_sizes[:chunk_index]
+        writes = []
+        for offset in range(start, len(self.titles), LOCALSTORAGE_CHUNK_RECORDS):
+            records = self.titles[offset:offset + LOCALSTORAGE_CHUNK_RECORDS]
+            value = _encode_chunk(records)
+            writes.append((f"{LOCALSTORAGE_KEY}_{len(counts)}", value))
+            counts.append(len(records))
+            sizes.append(len(value))
+
+        manifest = {
+            'format': 2,
             'last_updated': datetime.now().isoformat(),
             'total_count': len(self.titles),
-            'titles': self.titles
+            'chunks': len(counts),
+            'bytes': sum(sizes),
         }
-        
+
+        if sum(sizes) > LOCALSTORAGE_BUDGET_BYTES:
+            # Near quota: hand over to the server-side store and tell future loads to use it
+            self._browser_full = True
+            manifest['overflow'] = True
+            manifest['chunks'] = 0
+            self._browser_set(LOCALSTORAGE_KEY, json.dumps(manifest))
+            return False
+
+        for item_key, value in writes:
+            self._browser_set(item_key, value)
+        self._browser_set(LOCALSTORAGE_KEY, json.dumps(manifest))
+
+        self._synced_count = len(self.titles)
+        self._chunk_counts = counts
+        self._chunk_sizes = sizes
+        return True
+    
+    def save_history(self) -> None:
+        """
+        Save title history to storage (browser localStorage or file).
+
+        In browser mode only the records added since the previous save are sent.
+        The shared store commits each title as it is added, so there is nothing to save.
+        """
+        if self._db:
+            return
+
         # Try browser localStorage first
-        if self.local_storage:
+        if self.local_storage and not self._browser_full:
             try:
-                self.local_storage.setItem(LOCALSTORAGE_KEY, json.dumps(data, ensure_ascii=False))
-                return  # Success, no need to try file
+                if self._sync_to_browser():
+                    return  # Success, no need to try file
             except Exception:
                 pass
         
-        # Fallback to file-based storage
-        try:
-            with open(self.history_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except (IOError, OSError, PermissionError):
-            # Silently handle errors (e.g., read-only filesystem on Streamlit Cloud)
-            pass
+        # Fallback to file-based storage. Written to a temporary file and renamed, so
+        # readers in other processes never see a half-written history.
+        with self._lock:
+            titles = list(self.titles)
+            data = {
+                'last_updated': datetime.now().isoformat(),
+                'total_count': len(titles),
+                'titles': titles
+            }
+            temp_path = f"{self.history_path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(temp_path, self.history_path)
+                self._file_state = _file_signature(self.history_path)
+                self._saved_count = len(titles)
+            except (IOError, OSError, PermissionError):
+                # Silently handle errors (e.g., read-only filesystem on Streamlit Cloud)
+                pass
     
     def add_title(self, title: str, brand: str = "", product_id: str = "") -> None:
         """
@@ -92,13 +377,21 @@ class TitleHistoryManager:
             brand: Brand name (optional)
             product_id: Product identifier (optional)
         """
-        self.titles.append({
+        record = {
             'title': title,
             'title_lower': title.lower(),  # Pre-compute for faster comparison
             'brand': brand,
             'product_id': product_id,
             'created_at': datetime.now().isoformat()
-        })
+        }
+        if self._db:
+            self._db.append([_db_record(record)])
+            self.refresh()
+            return
+        with self._lock:
+            # Index position and append together, so concurrent adds and reloads can't interleave
+            self._title_index.setdefault(normalize_title_key(title), len(self.titles))
+            self.titles.append(record)
     
     def add_titles(self, titles: List[str], brand: str = "", product_id: str = "") -> None:
         """
@@ -131,8 +424,14 @@ class TitleHistoryManager:
         Returns:
             Tuple of (is_duplicate, max_similarity_score, most_similar_title)
         """
+        self.refresh()
         if not self.titles:
             return False, 0.0, None
+
+        # Exact (normalized) match needs no fuzzy scan
+        exact = self._title_index.get(normalize_title_key(new_title))
+        if exact is not None:
+            return True, 1.0, self.titles[exact]['title']
         
         new_lower = new_title.lower()
         max_score = 0.0
@@ -148,17 +447,116 @@ class TitleHistoryManager:
         return max_score > threshold, max_score, most_similar
     
     def clear_history(self) -> None:
-        """Clear all title history."""
+        """Clear all title history (for every session when the store is shared)."""
+        if self._db:
+            self._db.clear()
         self.titles = []
+        self._saved_count = 0
+        self._title_index = {}
+        # An empty history fits in the browser again
+        self._browser_full = False
     
     def get_stats(self) -> dict:
         """Get statistics about the title history."""
+        if self._db:
+            self.refresh()
+            return {
+                'total_titles': len(self.titles),
+                'storage_mode': 'shared',
+                'history_path': self._db.path,
+                'browser_bytes': 0
+            }
+        in_browser = bool(self.local_storage) and not self._browser_full
         return {
             'total_titles': len(self.titles),
-            'storage_mode': 'browser' if self.local_storage else 'file',
-            'history_path': self.history_path if not self.local_storage else 'localStorage'
+            'storage_mode': 'browser' if in_browser else 'file',
+            'history_path': 'localStorage' if in_browser else self.history_path,
+            'browser_bytes': sum(self._chunk_sizes)
         }
     
+    def import_titles(self, file, title_column: str = 'title', chunk_rows: int = IMPORT_CHUNK_ROWS,
+                      progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> dict:
+        """
+        Bulk-import titles from a CSV or Excel file, chunk by chunk.
+
+        Each chunk is normalized and de-duplicated with vectorized pandas operations
+        (against itself and the existing history), then appended in one step. The
+        exact-match index grows with every chunk.
+
+        Args:
+            file: File path or file-like object (with a .name for uploads)
+            title_column: Name of the column containing titles (common names are also tried)
+            chunk_rows: Number of rows read per chunk
+            progress_callback: Called as progress_callback(rows_read, total_rows_or_None)
+
+        Returns:
+            dict with 'imported', 'duplicates', 'rejected' counts, 'rows_read' and
+            'rejected_rows' (list of {'row', 'reason', 'value'}, capped)
+
+        Raises:
+            ValueError: If the file cannot be read or has no title column.
+        """
+        import pandas as pd
+
+        report = {'imported': 0, 'duplicates': 0, 'rejected': 0, 'rows_read': 0, 'rejected_rows': []}
+        total_rows = None
+        self.refresh()
+
+        try:
+            for start_row, values, total_rows in _iter_title_chunks(file, title_column, chunk_rows):
+                titles = pd.Series(values, dtype=object)
+                # Spreadsheet row numbers: +1 for the header, +1 for 1-based counting
+                row_numbers = pd.RangeIndex(start_row + 2, start_row + 2 + len(titles))
+                titles.index = row_numbers
+
+                normalized = titles.fillna('').astype(str).str.replace(r'\s+', ' ', regex=True).str.strip()
+                empty = titles.isna() | (normalized == '')
+                too_long = ~empty & (normalized.str.len() > IMPORT_MAX_TITLE_LENGTH)
+                self._record_rejected(report, normalized[empty], '空标题')
+                self._record_rejected(report, normalized[too_long], f'超过 {IMPORT_MAX_TITLE_LENGTH} 字符')
+
+                valid = normalized[~(empty | too_long)]
+                keys = valid.str.lower()
+                known = keys.map(self._title_index.__contains__).astype(bool)
+                keep = ~keys.duplicated() & ~known
+                report['duplicates'] += int((~keep).sum())
+
+                new_titles = valid[keep].tolist()
+                new_keys = keys[keep].tolist()
+                created_at = datetime.now().isoformat()
+                records = [
+                    {'title': t, 'title_lower': k, 'brand': '', 'product_id': '', 'created_at': created_at}
+                    for t, k in zip(new_titles, new_keys)
+                ]
+                if self._db:
+                    # Another session may have added some of these meanwhile; the store skips them
+                    imported = self._db.append([_db_record(r) for r in records])
+                    report['duplicates'] += len(records) - imported
+                    self.refresh()
+                else:
+                    imported = len(records)
+                    base = len(self.titles)
+                    self.titles.extend(records)
+                    self._title_index.update(zip(new_keys, range(base, base + len(new_keys))))
+
+                report['imported'] += imported
+                report['rows_read'] += len(titles)
+                if progress_callback:
+                    progress_callback(report['rows_read'], total_rows)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Error importing titles: {e}")
+
+        return report
+
+    @staticmethod
+    def _record_rejected(report: dict, values, reason: str) -> None:
+        report['rejected'] += len(values)
+        room = IMPORT_MAX_REJECTED_LISTED - len(report['rejected_rows'])
+        for row, value in list(values.items())[:max(room, 0)]:
+            report['rejected_rows'].append({'row': int(row), 'reason': reason, 'value': str(value)[:80]})
+
     def import_from_csv(self, file_path: str, title_column: str = 'title') -> int:
         """
         Import titles from a CSV file.
@@ -170,18 +568,7 @@ class TitleHistoryManager:
         Returns:
             Number of titles imported
         """
-        import pandas as pd
-        try:
-            df = pd.read_csv(file_path)
-            if title_column in df.columns:
-                count = 0
-                for title in df[title_column].dropna():
-                    self.add_title(str(title))
-                    count += 1
-                return count
-            return 0
-        except Exception:
-            return 0
+        return self.import_titles(file_path, title_column)['imported']
     
     def import_from_excel(self, file, title_column: str = 'title') -> int:
         """
@@ -194,25 +581,136 @@ class TitleHistoryManager:
         Returns:
             Number of titles imported
         """
-        import pandas as pd
-        try:
-            df = pd.read_excel(file)
-            df.columns = df.columns.str.strip().str.lower()
-            
-            # Try common column names
-            possible_cols = [title_column.lower(), 'title', 'product name', 'product title', '标题']
-            found_col = None
-            for col in possible_cols:
-                if col in df.columns:
-                    found_col = col
-                    break
-            
-            if found_col:
-                count = 0
-                for title in df[found_col].dropna():
-                    self.add_title(str(title))
-                    count += 1
-                return count
-            return 0
-        except Exception:
-            return 0
+        return self.import_titles(file, title_column)['imported']
+
+
+_shared_managers = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_history(history_path: str = None, history_db: str = None) -> TitleHistoryManager:
+    """
+    The process-wide manager for a history file or shared store, created on first use
+    and loaded when first needed. Sessions share it instead of re-reading the history
+    on every rerun; a file rewritten by another process is reloaded.
+    """
+    key = (history_path or DEFAULT_HISTORY_PATH, history_db or DEFAULT_HISTORY_DB)
+    with _shared_lock:
+        manager = _shared_managers.get(key)
+        if manager is None:
+            manager = TitleHistoryManager(history_path, lazy_load=True, history_db=history_db)
+            _shared_managers[key] = manager
+    manager.reload_if_changed()
+    return manager
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _db_record(record: dict) -> dict:
+    """Shared-store row for a history record."""
+    return {
+        'title': record['title'],
+        'title_key': normalize_title_key(record['title']),
+        'brand': record.get('brand', ''),
+        'product_id': record.get('product_id', ''),
+        'created_at': record.get('created_at') or datetime.now().isoformat(),
+    }
+
+
+def _find_title_column(columns: List[str], title_column: str) -> int:
+    """Position of the title column among header cells, trying common names."""
+    normalized = [str(c).strip().lower() for c in columns]
+    for candidate in [title_column.lower()] + TITLE_COLUMN_CANDIDATES:
+        if candidate in normalized:
+            return normalized.index(candidate)
+    raise ValueError(f"No title column found (tried '{title_column}' and {TITLE_COLUMN_CANDIDATES}).")
+
+
+def _iter_title_chunks(file, title_column: str, chunk_rows: int) -> Iterator[Tuple[int, list, Optional[int]]]:
+    """
+    Stream the title column of a CSV/Excel file in chunks.
+
+    Yields:
+        (first_data_row_offset, list_of_cell_values, total_rows_or_None)
+    """
+    name = file if isinstance(file, str) else getattr(file, 'name', '')
+    if str(name).lower().endswith('.csv'):
+        yield from _iter_csv_chunks(file, title_column, chunk_rows)
+    else:
+        yield from _iter_excel_chunks(file, title_column, chunk_rows)
+
+
+def _csv_encoding(file) -> str:
+    """
+    'utf-8' if the whole file decodes as UTF-8, else 'latin1'. Checked before any
+    chunk is imported, so a bad byte late in the file can't restart an import
+    whose first chunks were already added.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    stream = open(file, 'rb') if isinstance(file, str) else file
+    try:
+        if hasattr(stream, 'seek'):
+            stream.seek(0)
+        while True:
+            block = stream.read(CSV_ENCODING_BLOCK_BYTES)
+            if not block:
+                decoder.decode(b'', final=True)
+                return 'utf-8'
+            decoder.decode(block if isinstance(block, bytes) else block.encode('utf-8'))
+    except UnicodeDecodeError:
+        return 'latin1'
+    finally:
+        if stream is not file:
+            stream.close()
+
+
+def _iter_csv_chunks(file, title_column: str, chunk_rows: int):
+    import pandas as pd
+
+    encoding = _csv_encoding(file)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    header = pd.read_csv(file, nrows=0, encoding=encoding).columns.tolist()
+    col = header[_find_title_column(header, title_column)]
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    reader = pd.read_csv(file, usecols=[col], dtype=str, keep_default_na=False,
+                         chunksize=chunk_rows, encoding=encoding)
+    offset = 0
+    for chunk in reader:
+        yield offset, chunk[col].tolist(), None
+        offset += len(chunk)
+
+
+def _iter_excel_chunks(file, title_column: str, chunk_rows: int):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Excel file is empty.")
+        col = _find_title_column(list(header), title_column)
+        total_rows = ws.max_row - 1 if ws.max_row else None
+
+        offset = 0
+        buffer = []
+        for row in rows:
+            buffer.append(row[col] if col < len(row) else None)
+            if len(buffer) >= chunk_rows:
+                yield offset, buffer, total_rows
+                offset += len(buffer)
+                buffer = []
+        if buffer:
+            yield offset, buffer, total_rows
+    finally:
+        wb.close()
@@ -2,6 +2,19 @@ import difflib
 import pandas as pd
 import re
 
+from utils.terms import SPAM, get_terms
+
+# Forbidden punctuation in titles (English and Chinese); hyphens and ampersands are allowed
+FORBIDDEN_PUNCTUATION_CHARS = ",，。.!！?？;；:："
+FORBIDDEN_PUNCTUATION = '[' + re.escape(FORBIDDEN_PUNCTUATION_CHARS) + ']'
+
+# Target title length in characters (inclusive)
+MIN_TITLE_CHARS = 80
+MAX_TITLE_CHARS = 120
+
+# Words repeated in a title count as redundancy only when at least this long
+REDUNDANT_WORD_MIN_LENGTH = 4
+
 def remove_punctuation(title):
     """
     Removes forbidden punctuation (commas, periods, exclamations, question marks).
@@ -9,7 +22,7 @@ def remove_punctuation(title):
     """
     # Remove commas, periods, exclamation marks, question marks, semicolons, colons
     # Both English and Chinese punctuation
-    title = re.sub(r'[,，。.!！?？;；:：]', ' ', title)
+    title = re.sub(FORBIDDEN_PUNCTUATION, ' ', title)
     # Collapse multiple spaces
     title = re.sub(r'\s+', ' ', title).strip()
     return title
@@ -20,8 +33,8 @@ def check_punctuation(title):
     Returns: (bool has_punctuation, list forbidden_chars_found)
     """
     # Find all occurrences of forbidden punctuation
-    forbidden = re.findall(r'[,，。.!！?？;；:：]', title)
-    return len(forbidden) > 0, list(set(forbidden))
+    forbidden = re.findall(FORBIDDEN_PUNCTUATION, title)
+    return len(forbidden) > 0, list(dict.fromkeys(forbidden))  # Unique, in order of appearance
 
 def validate_brand(title, brand):
     """
@@ -67,6 +80,7 @@ def check_duplication(new_title, existing_titles, threshold=0.8):
 def calculate_seo_score(title, brand, main_kw, core_kw):
     """
     Calculates a 0-100 SEO Health Score.
+    utils.audit.score_titles applies the same rules to whole columns at once.
     """
     score = 100
     reasons = []
@@ -74,14 +88,14 @@ def calculate_seo_score(title, brand, main_kw, core_kw):
     # 1. Length Check (Target: 80-120)
     # Penalize deviations
     length = len(title)
-    if length < 80:
-        penalty = min(20, (80 - length) * 1) # Lose 1 pt per char under, max 20
+    if length < MIN_TITLE_CHARS:
+        penalty = min(20, (MIN_TITLE_CHARS - length) * 1) # Lose 1 pt per char under, max 20
         score -= penalty
         reasons.append(f"太短 (-{penalty})")
-    elif length > 120:
-        penalty = min(50, (length - 120) * 3) # Even stricter: 3 pts per char over, max 50
+    elif length > MAX_TITLE_CHARS:
+        penalty = min(50, (length - MAX_TITLE_CHARS) * 3) # Even stricter: 3 pts per char over, max 50
         score -= penalty
-        reasons.append(f"太长({length}/120) (-{penalty})")
+        reasons.append(f"太长({length}/{MAX_TITLE_CHARS}) (-{penalty})")
         
     # 2. Keyword Check
     def contains_kw(text, kw):
@@ -107,11 +121,10 @@ def calculate_seo_score(title, brand, main_kw, core_kw):
         reasons.append("缺核心词 (-15)")
         
     # 3. Formatting/Spam Check
-    spam_words = ["new", "hot sale", "best", "cheap"]
-    for word in spam_words:
-        if re.search(r'\b' + re.escape(word) + r'\b', title, re.IGNORECASE):
-            score -= 5
-            reasons.append(f"含违禁词'{word}' (-5)")
+    # Spam terms come from the term dictionary (whole words, case-insensitive)
+    for word in get_terms().distinct_terms(title, SPAM):
+        score -= 5
+        reasons.append(f"含违禁词'{word}' (-5)")
             
     # 4. Starting Capital
     if title and title[0].islower():
@@ -128,12 +141,12 @@ def calculate_seo_score(title, brand, main_kw, core_kw):
     seen_words = set()
     repeated = []
     for w in words:
-        if len(w) > 3 and w in seen_words and w not in kw_words:
+        if len(w) >= REDUNDANT_WORD_MIN_LENGTH and w in seen_words and w not in kw_words:
             repeated.append(w)
         seen_words.add(w)
     
     if repeated:
-        unique_repeated = list(set(repeated))
+        unique_repeated = list(dict.fromkeys(repeated))  # In order of appearance
         penalty = len(unique_repeated) * 7
         score -= penalty
         reasons.append(f"含重复词 {unique_repeated} (-{penalty})")
@@ -150,17 +163,10 @@ def calculate_seo_score(title, brand, main_kw, core_kw):
 
 def fix_acronyms(title):
     """
-    Ensures common industry acronyms are always uppercase.
+    Ensures industry acronyms are always uppercase and brand names keep their casing,
+    as spelled in the term dictionary (one pass over the title).
     """
-    acronyms = [
-        "POS", "LCD", "LED", "CPU", "RAM", "OS", "USB", "QR", "RFID", "VPC", 
-        "NFC", "GPRS", "4G", "5G", "LTE", "SDK", "API", "OEM", "ODM", "IP", "IOS", "ANDROID"
-    ]
-    for ac in acronyms:
-        # Match case-insensitively but replace with uppercase if it's a whole word
-        pattern = re.compile(r'\b' + re.escape(ac) + r'\b', re.IGNORECASE)
-        title = pattern.sub(ac, title)
-    return title
+    return get_terms().apply_casing(title)
 
 def remove_filler_words(title):
     """
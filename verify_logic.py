@@ -1,10 +1,15 @@
+import io
 import pandas as pd
 import os
-from dotenv import load_dotenv
 from utils.prompt_builder import build_prompt
 from utils.file_handler import load_file
 
-load_dotenv()
+# Load environment variables (Local dev)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
 def verify_logic():
     print("--- 1. Creating Mock CSV ---")
@@ -147,6 +152,25 @@ def verify_logic():
     else:
         print("[FAILURE] Good title scored low.")
 
-import io
+    print("\n--- 8. Testing Cross-Row Near-Duplicates ---")
+    from utils.dedup import find_near_duplicates
+    _, is_duplicate = find_near_duplicates([good_title, good_title.lower(), "EcoLife Bamboo Toothbrush Pack of 4"])
+    if is_duplicate.tolist() == [False, True, False]:
+        print("[SUCCESS] Near-duplicate titles flagged.")
+    else:
+        print(f"[FAILURE] Near-duplicate flags wrong: {is_duplicate.tolist()}")
+
+    print("\n--- 9. Testing Catalog Audit (Vectorized Scoring) ---")
+    from utils.audit import score_titles
+    audit_titles = [good_title, title_no_brand, "TechNova, Wireless Earbuds! Cheap Cheap Headphones", ""]
+    audit_scores, audit_notes = score_titles(audit_titles, ["TechNova"] * 4, ["Wireless Earbuds"] * 4, ["Headphones"] * 4)
+    mismatches = [t for t, s, n in zip(audit_titles, audit_scores, audit_notes)
+                  if (s, n) != calculate_seo_score(t, "TechNova", "Wireless Earbuds", "Headphones")]
+    if not mismatches:
+        print("[SUCCESS] Vectorized audit matches calculate_seo_score.")
+    else:
+        print(f"[FAILURE] Vectorized audit differs for: {mismatches}")
+    print("\nThe full unit tests are in tests/ (run: python -m pytest tests).")
+
 if __name__ == "__main__":
     verify_logic()